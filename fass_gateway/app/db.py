@@ -9,6 +9,8 @@ def open_db(db_path: str) -> sqlite3.Connection:
     path.parent.mkdir(parents=True, exist_ok=True)
     conn = sqlite3.connect(path, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    # 新库在建表前开启增量 vacuum，retention 删除后可分批回收空间；旧库由 retention 按需转换。
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL;")
     conn.execute("PRAGMA journal_mode=WAL;")
     conn.execute("PRAGMA foreign_keys=ON;")
     conn.execute("PRAGMA busy_timeout=3000;")
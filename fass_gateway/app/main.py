@@ -1,3 +1,4 @@
+import asyncio
 from pathlib import Path
 
 from fastapi import FastAPI
@@ -18,12 +19,21 @@ from .routers.config_api import router as config_api_router
 from .routers.models_api import router as models_api_router
 from .routers.legacy_ollama_api import router as legacy_ollama_api_router
 from .services.task_runner import runner
+from .services.reembed import reembed_manager
+from .services.index_sync import index_sync_worker
+from .services.job_queue import job_queue
+from .services.trace_hub import hub as trace_hub
+from .services.trace_writer import trace_writer
+from .services.retention import retention_worker
+from .services.audit_log import audit_writer
+from .services.automation import JOB_DEAD_HANDLERS, JOB_HANDLERS
 from .services.provider_registry import registry
 from .services.model_registry import model_registry
 from .services.mcp_loader import load_builtin_tools
 from .services.self_heal import backup as self_heal_backup
 from .services.self_heal import integrity_check as self_heal_integrity_check
 from .services.self_heal import rollback_latest as self_heal_rollback_latest
+from .settings import settings
 
 
 app = FastAPI(title="FASS Gateway", version="0.1.0")
@@ -43,24 +53,52 @@ app.include_router(models_api_router)
 app.include_router(legacy_ollama_api_router)
 
 
+async def _startup_backup() -> None:
+    try:
+        await asyncio.to_thread(self_heal_backup, actor="startup", reason="startup")
+    except Exception:
+        pass
+
+
 @app.on_event("startup")
 async def _startup() -> None:
+    audit_writer.start()
+    # 启动时只做 quick_check（损坏则回滚到最新备份）；完整备份放到后台，不阻塞启动。
     try:
-        self_heal_backup(actor="startup", reason="startup")
-        check = self_heal_integrity_check()
+        check = await asyncio.to_thread(self_heal_integrity_check, quick=True)
         if not check.get("ok"):
-            self_heal_rollback_latest(actor="startup")
+            await asyncio.to_thread(self_heal_rollback_latest, actor="startup")
     except Exception:
         pass
+    # 旧库一次性转为 incremental auto_vacuum：全库 VACUUM 可能阻塞启动数分钟，默认关闭，
+    # 通常由运维在低峰期调用 convert_vacuum；显式开启时在后台任务启动前完成，避免与写入争锁。
+    if settings.retention_convert_vacuum:
+        try:
+            await retention_worker.convert_vacuum(min_free_pages=settings.retention_convert_min_free_pages)
+        except Exception:
+            pass
+    app.state.startup_backup = asyncio.create_task(_startup_backup())
     registry.load()
     model_registry.load()
     load_builtin_tools()
     runner.start()
+    index_sync_worker.start()
+    job_queue.start(JOB_HANDLERS, JOB_DEAD_HANDLERS)
+    trace_writer.start()
+    await trace_hub.start()
+    retention_worker.start()
 
 
 @app.on_event("shutdown")
 async def _shutdown() -> None:
     await runner.stop()
+    await index_sync_worker.stop()
+    await job_queue.stop()
+    await trace_writer.stop()
+    await trace_hub.stop()
+    await retention_worker.stop()
+    await reembed_manager.stop()
+    await audit_writer.stop()
 
 webui_dir = Path(__file__).resolve().parents[2] / "webui"
 webui_dist_dir = webui_dir / "dist"
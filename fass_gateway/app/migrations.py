@@ -116,7 +116,147 @@ CREATE TABLE IF NOT EXISTS checksums (
   computed_at_unix_ms INTEGER NOT NULL
 );
 """,
-        )
+        ),
+        (
+            2,
+            """
+ALTER TABLE tasks ADD COLUMN last_run_unix_ms INTEGER;
+ALTER TABLE tasks ADD COLUMN last_duration_ms INTEGER;
+ALTER TABLE tasks ADD COLUMN last_status TEXT;
+ALTER TABLE tasks ADD COLUMN last_error TEXT;
+ALTER TABLE tasks ADD COLUMN run_count INTEGER NOT NULL DEFAULT 0;
+""",
+        ),
+        (
+            3,
+            """
+ALTER TABLE tasks ADD COLUMN next_run_unix_ms INTEGER;
+CREATE INDEX IF NOT EXISTS idx_tasks_next_run ON tasks(enabled, next_run_unix_ms);
+""",
+        ),
+        (
+            4,
+            """
+ALTER TABLE automation_jobs ADD COLUMN kind TEXT NOT NULL DEFAULT 'automation_rule';
+ALTER TABLE automation_jobs ADD COLUMN priority INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE automation_jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE automation_jobs ADD COLUMN max_attempts INTEGER NOT NULL DEFAULT 5;
+ALTER TABLE automation_jobs ADD COLUMN lease_owner TEXT;
+ALTER TABLE automation_jobs ADD COLUMN lease_expires_unix_ms INTEGER;
+CREATE INDEX IF NOT EXISTS idx_automation_jobs_claim ON automation_jobs(status, priority, run_at_unix_ms);
+CREATE INDEX IF NOT EXISTS idx_automation_jobs_due ON automation_jobs(status, run_at_unix_ms);
+CREATE INDEX IF NOT EXISTS idx_automation_jobs_lease ON automation_jobs(status, lease_expires_unix_ms);
+
+INSERT INTO automation_jobs(kind, status, run_at_unix_ms, payload_json, created_at_unix_ms, updated_at_unix_ms)
+SELECT 'research', 'queued', scheduled_at_unix_ms, json_object('research_job_id', id), created_at_unix_ms, updated_at_unix_ms
+FROM research_jobs WHERE status IN ('queued', 'running');
+UPDATE research_jobs SET status='queued' WHERE status='running';
+""",
+        ),
+        (
+            5,
+            """
+CREATE TABLE IF NOT EXISTS trace_broadcast (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  origin TEXT NOT NULL,
+  conversation_id INTEGER NOT NULL,
+  event_id TEXT NOT NULL,
+  event_json TEXT NOT NULL,
+  created_at_unix_ms INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_trace_broadcast_time ON trace_broadcast(created_at_unix_ms);
+""",
+        ),
+        (
+            6,
+            """
+CREATE INDEX IF NOT EXISTS idx_trace_events_model ON trace_events(provider_id, model_id);
+CREATE INDEX IF NOT EXISTS idx_trace_events_time_model ON trace_events(ts_unix_ms, provider_id, model_id, status);
+ANALYZE trace_events;
+""",
+        ),
+        (
+            7,
+            """
+CREATE INDEX IF NOT EXISTS idx_conversations_updated ON conversations(updated_at_unix_ms);
+CREATE INDEX IF NOT EXISTS idx_research_history_time ON research_history(created_at_unix_ms);
+CREATE INDEX IF NOT EXISTS idx_research_jobs_status_updated ON research_jobs(status, updated_at_unix_ms);
+""",
+        ),
+        (
+            8,
+            """
+CREATE INDEX IF NOT EXISTS idx_audit_logs_action_time ON audit_logs(action, created_at_unix_ms);
+CREATE INDEX IF NOT EXISTS idx_audit_logs_actor_time ON audit_logs(actor, created_at_unix_ms);
+""",
+        ),
+        (
+            9,
+            """
+CREATE TABLE IF NOT EXISTS checksum_dirty (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  tbl TEXT NOT NULL,
+  row_key TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS checksum_rows (
+  tbl TEXT NOT NULL,
+  row_key TEXT NOT NULL,
+  row_hash TEXT NOT NULL,
+  PRIMARY KEY(tbl, row_key)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_checksum_l3_categories_ins AFTER INSERT ON l3_categories BEGIN
+  INSERT INTO checksum_dirty(tbl, row_key) VALUES('l3_categories', NEW.id);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_checksum_l3_categories_upd AFTER UPDATE OF id, updated_at_unix_ms ON l3_categories BEGIN
+  INSERT INTO checksum_dirty(tbl, row_key) VALUES('l3_categories', NEW.id);
+  INSERT INTO checksum_dirty(tbl, row_key) SELECT 'l3_categories', OLD.id WHERE OLD.id IS NOT NEW.id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_checksum_l3_categories_del AFTER DELETE ON l3_categories BEGIN
+  INSERT INTO checksum_dirty(tbl, row_key) VALUES('l3_categories', OLD.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_checksum_personas_ins AFTER INSERT ON personas BEGIN
+  INSERT INTO checksum_dirty(tbl, row_key) VALUES('personas', NEW.id);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_checksum_personas_upd AFTER UPDATE OF id, updated_at_unix_ms ON personas BEGIN
+  INSERT INTO checksum_dirty(tbl, row_key) VALUES('personas', NEW.id);
+  INSERT INTO checksum_dirty(tbl, row_key) SELECT 'personas', OLD.id WHERE OLD.id IS NOT NEW.id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_checksum_personas_del AFTER DELETE ON personas BEGIN
+  INSERT INTO checksum_dirty(tbl, row_key) VALUES('personas', OLD.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_checksum_model_catalog_ins AFTER INSERT ON model_catalog BEGIN
+  INSERT INTO checksum_dirty(tbl, row_key) VALUES('model_catalog', NEW.id);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_checksum_model_catalog_upd AFTER UPDATE OF id, updated_at_unix_ms, status ON model_catalog BEGIN
+  INSERT INTO checksum_dirty(tbl, row_key) VALUES('model_catalog', NEW.id);
+  INSERT INTO checksum_dirty(tbl, row_key) SELECT 'model_catalog', OLD.id WHERE OLD.id IS NOT NEW.id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_checksum_model_catalog_del AFTER DELETE ON model_catalog BEGIN
+  INSERT INTO checksum_dirty(tbl, row_key) VALUES('model_catalog', OLD.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_checksum_layer_presets_ins AFTER INSERT ON layer_presets BEGIN
+  INSERT INTO checksum_dirty(tbl, row_key) VALUES('layer_presets', NEW.layer);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_checksum_layer_presets_upd AFTER UPDATE OF layer, updated_at_unix_ms ON layer_presets BEGIN
+  INSERT INTO checksum_dirty(tbl, row_key) VALUES('layer_presets', NEW.layer);
+  INSERT INTO checksum_dirty(tbl, row_key) SELECT 'layer_presets', OLD.layer WHERE OLD.layer IS NOT NEW.layer;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_checksum_layer_presets_del AFTER DELETE ON layer_presets BEGIN
+  INSERT INTO checksum_dirty(tbl, row_key) VALUES('layer_presets', OLD.layer);
+END;
+
+DELETE FROM checksums WHERE key IN ('l3_categories', 'personas', 'model_catalog', 'layer_presets');
+INSERT INTO checksum_dirty(tbl, row_key) SELECT 'l3_categories', id FROM l3_categories;
+INSERT INTO checksum_dirty(tbl, row_key) SELECT 'personas', id FROM personas;
+INSERT INTO checksum_dirty(tbl, row_key) SELECT 'model_catalog', id FROM model_catalog;
+INSERT INTO checksum_dirty(tbl, row_key) SELECT 'layer_presets', layer FROM layer_presets;
+""",
+        ),
     ]
 
     for version, sql in migrations:
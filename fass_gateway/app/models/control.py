@@ -80,5 +80,6 @@ class ModelProfile(BaseModel):
     model_alias_id: str
     system_prompt: str = ""
     params: dict = Field(default_factory=dict)
+    rag_token_budget: int | None = None
     tools_enabled: bool = True
     private_memory_enabled: bool = True
@@ -1,13 +1,17 @@
 from __future__ import annotations
 
+import json
 from pathlib import Path
+from time import time
 
 from fastapi import APIRouter, Header, HTTPException, Request
 
 from ..db import open_db
 from ..settings import settings
+from ..services.automation import check_steps
 from ..services.research import enqueue_research
 from ..services.dreaming import run_dreaming
+from ..services.job_queue import JOB_STATUSES, job_queue
 
 
 router = APIRouter(prefix="/api/automations")
@@ -18,6 +22,10 @@ def _db():
     return open_db(str(base / "data" / "fass_gateway.sqlite"))
 
 
+def _now_ms() -> int:
+    return int(time() * 1000)
+
+
 def _check_api_key(authorization: str | None) -> None:
     if not settings.api_key:
         return
@@ -63,3 +71,135 @@ async def dreaming_run(request: Request, authorization: str | None = Header(defa
     if not isinstance(collection, str):
         collection = "shared"
     return await run_dreaming(max_items=max_items, collection=collection)
+
+
+def _rule_fields(payload: dict, *, partial: bool) -> dict:
+    out: dict = {}
+    if "name" in payload or not partial:
+        name = payload.get("name")
+        if not isinstance(name, str) or not name.strip():
+            raise HTTPException(status_code=400, detail="name is required")
+        out["name"] = name
+    if "enabled" in payload:
+        out["enabled"] = 1 if payload["enabled"] else 0
+    if "trigger" in payload or not partial:
+        trigger = payload.get("trigger") or {"type": "manual"}
+        if not isinstance(trigger, dict):
+            raise HTTPException(status_code=400, detail="trigger must be an object")
+        out["trigger_json"] = json.dumps(trigger, ensure_ascii=False)
+    if "steps" in payload or not partial:
+        try:
+            steps = check_steps(payload.get("steps"))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        out["steps_json"] = json.dumps(steps, ensure_ascii=False)
+    return out
+
+
+@router.get("/rules")
+async def list_rules(authorization: str | None = Header(default=None)) -> dict:
+    _check_api_key(authorization)
+    conn = _db()
+    rows = conn.execute("SELECT * FROM automation_rules ORDER BY id DESC").fetchall()
+    conn.close()
+    return {"rules": [dict(r) for r in rows]}
+
+
+@router.post("/rules")
+async def create_rule(request: Request, authorization: str | None = Header(default=None)) -> dict:
+    _check_api_key(authorization)
+    fields = _rule_fields(await request.json(), partial=False)
+    now = _now_ms()
+    conn = _db()
+    cur = conn.execute(
+        "INSERT INTO automation_rules(name, enabled, trigger_json, steps_json, created_at_unix_ms, updated_at_unix_ms) VALUES (?, ?, ?, ?, ?, ?)",
+        (fields["name"], fields.get("enabled", 1), fields["trigger_json"], fields["steps_json"], now, now),
+    )
+    conn.commit()
+    row = conn.execute("SELECT * FROM automation_rules WHERE id=?", (cur.lastrowid,)).fetchone()
+    conn.close()
+    return dict(row)
+
+
+@router.post("/rules/{rule_id}")
+async def update_rule(rule_id: int, request: Request, authorization: str | None = Header(default=None)) -> dict:
+    _check_api_key(authorization)
+    fields = _rule_fields(await request.json(), partial=True)
+    if not fields:
+        raise HTTPException(status_code=400, detail="no fields to update")
+    fields["updated_at_unix_ms"] = _now_ms()
+    conn = _db()
+    conn.execute(f"UPDATE automation_rules SET {', '.join(f'{k}=?' for k in fields)} WHERE id=?", (*fields.values(), rule_id))
+    conn.commit()
+    row = conn.execute("SELECT * FROM automation_rules WHERE id=?", (rule_id,)).fetchone()
+    conn.close()
+    if not row:
+        raise HTTPException(status_code=404, detail="rule not found")
+    return dict(row)
+
+
+@router.delete("/rules/{rule_id}")
+async def delete_rule(rule_id: int, authorization: str | None = Header(default=None)) -> dict:
+    _check_api_key(authorization)
+    conn = _db()
+    conn.execute("DELETE FROM automation_rules WHERE id=?", (rule_id,))
+    conn.commit()
+    conn.close()
+    return {"ok": True}
+
+
+@router.post("/rules/{rule_id}/run")
+async def run_rule(rule_id: int, request: Request, authorization: str | None = Header(default=None)) -> dict:
+    _check_api_key(authorization)
+    payload = await request.json()
+    priority = payload.get("priority", 0)
+    if not isinstance(priority, int):
+        raise HTTPException(status_code=400, detail="priority must be an integer")
+    conn = _db()
+    row = conn.execute("SELECT id FROM automation_rules WHERE id=?", (rule_id,)).fetchone()
+    conn.close()
+    if not row:
+        raise HTTPException(status_code=404, detail="rule not found")
+    job_id = job_queue.enqueue("automation_rule", {"rule_id": rule_id}, priority=priority, rule_id=rule_id)
+    return {"queued": True, "job_id": job_id}
+
+
+@router.get("/jobs")
+async def list_jobs(
+    status: str | None = None,
+    kind: str | None = None,
+    limit: int = 50,
+    authorization: str | None = Header(default=None),
+) -> dict:
+    _check_api_key(authorization)
+    if status is not None and status not in JOB_STATUSES:
+        raise HTTPException(status_code=400, detail=f"status must be one of {', '.join(JOB_STATUSES)}")
+    where, args = [], []
+    if status:
+        where.append("status=?")
+        args.append(status)
+    if kind:
+        where.append("kind=?")
+        args.append(kind)
+    sql = "SELECT * FROM automation_jobs"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY id DESC LIMIT ?"
+    conn = _db()
+    rows = conn.execute(sql, (*args, min(max(1, limit), 500))).fetchall()
+    conn.close()
+    return {"jobs": [dict(r) for r in rows]}
+
+
+@router.get("/jobs/stats")
+async def job_stats(authorization: str | None = Header(default=None)) -> dict:
+    _check_api_key(authorization)
+    return job_queue.stats()
+
+
+@router.post("/jobs/{job_id}/retry")
+async def retry_job(job_id: int, authorization: str | None = Header(default=None)) -> dict:
+    _check_api_key(authorization)
+    if not job_queue.requeue(job_id):
+        raise HTTPException(status_code=404, detail="dead job not found")
+    return {"ok": True}
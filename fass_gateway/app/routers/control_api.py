@@ -1,6 +1,9 @@
 from __future__ import annotations
 
+import asyncio
+
 from fastapi import APIRouter, Header, HTTPException, Request
+from fastapi.responses import StreamingResponse
 
 from ..models.control import ControlConfig, ModelAlias, ModelProfile, Provider, ProviderAuth
 from ..services.model_registry import model_registry
@@ -9,7 +12,9 @@ from ..services.provider_registry import registry
 from ..services.provider_router import proxy_models_for_provider
 from ..services import model_catalog as model_catalog_service
 from ..services import matching_engine
-from ..services.audit_log import list_logs as list_audit_logs
+from ..services.audit_log import export_ndjson as export_audit_logs
+from ..services.audit_log import page_logs as page_audit_logs
+from ..services.retention import retention_worker
 from ..services.self_heal import (
     daily_tick as self_heal_daily_tick,
     rollback_latest as self_heal_rollback_latest,
@@ -181,28 +186,76 @@ async def get_audit_logs(
     since_unix_ms: int | None = None,
     until_unix_ms: int | None = None,
     action: str | None = None,
+    actor: str | None = None,
+    cursor: str | None = None,
     limit: int = 200,
 ) -> dict:
     _check_api_key(authorization)
-    return {"items": list_audit_logs(since_unix_ms=since_unix_ms, until_unix_ms=until_unix_ms, action=action, limit=limit, decrypt=False)}
+    try:
+        return page_audit_logs(
+            since_unix_ms=since_unix_ms,
+            until_unix_ms=until_unix_ms,
+            action=action,
+            actor=actor,
+            cursor=cursor,
+            limit=min(max(1, limit), 1000),
+            decrypt=False,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/audit_logs/export")
+async def export_audit_logs_ndjson(
+    authorization: str | None = Header(default=None),
+    since_unix_ms: int | None = None,
+    until_unix_ms: int | None = None,
+    action: str | None = None,
+    actor: str | None = None,
+    decrypt: bool = False,
+) -> StreamingResponse:
+    _check_api_key(authorization)
+    # 同步生成器由 Starlette 放到线程池迭代，不阻塞事件循环。
+    return StreamingResponse(
+        export_audit_logs(since_unix_ms=since_unix_ms, until_unix_ms=until_unix_ms, action=action, actor=actor, decrypt=decrypt),
+        media_type="application/x-ndjson",
+    )
 
 
 @router.post("/self_heal/daily_tick")
 async def run_daily_tick(authorization: str | None = Header(default=None)) -> dict:
     _check_api_key(authorization)
-    return self_heal_daily_tick(actor="control_api")
+    return await asyncio.to_thread(self_heal_daily_tick, actor="control_api")
 
 
 @router.post("/self_heal/rollback_latest")
 async def rollback_latest(authorization: str | None = Header(default=None)) -> dict:
     _check_api_key(authorization)
-    return self_heal_rollback_latest(actor="control_api")
+    return await asyncio.to_thread(self_heal_rollback_latest, actor="control_api")
 
 
 @router.post("/self_heal/run_full_check")
 async def run_full_check(authorization: str | None = Header(default=None)) -> dict:
     _check_api_key(authorization)
-    return self_heal_run_full_check(actor="control_api")
+    return await asyncio.to_thread(self_heal_run_full_check, actor="control_api")
+
+
+@router.post("/retention/run")
+async def run_retention(authorization: str | None = Header(default=None)) -> dict:
+    _check_api_key(authorization)
+    return await retention_worker.run_once()
+
+
+@router.post("/retention/convert_vacuum")
+async def convert_retention_vacuum(authorization: str | None = Header(default=None)) -> dict:
+    _check_api_key(authorization)
+    return await retention_worker.convert_vacuum()
+
+
+@router.get("/retention/stats")
+async def retention_stats(authorization: str | None = Header(default=None)) -> dict:
+    _check_api_key(authorization)
+    return retention_worker.stats()
 
 
 @router.get("/models")
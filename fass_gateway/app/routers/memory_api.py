@@ -5,10 +5,12 @@ from pathlib import Path
 from fastapi import APIRouter, Header, HTTPException, Request
 
 from ..settings import settings
-from ..services.embedding import embed_texts
 from ..services.ingest import ingest_diary, ingest_workspace
 from ..services.file_store import iter_texts
-from ..services.memory import store
+from ..services.fusion import FusionConfig
+from ..services.memory import check_search_fields, store
+from ..services.index_sync import index_sync_worker
+from ..services.reembed import reembed_manager
 
 router = APIRouter(prefix="/api/memory")
 
@@ -39,6 +41,24 @@ async def upsert(request: Request, authorization: str | None = Header(default=No
     return {"changed": changed}
 
 
+def _search_options(payload: dict, collection: str | None) -> tuple[list[str] | None, int, FusionConfig | None]:
+    fields = payload.get("fields")
+    snippet_chars = payload.get("snippet_chars", 240)
+    if fields is not None and (not isinstance(fields, list) or not all(isinstance(f, str) for f in fields)):
+        raise HTTPException(status_code=400, detail="fields must be a list of strings")
+    if not isinstance(snippet_chars, int) or snippet_chars <= 0:
+        raise HTTPException(status_code=400, detail="snippet_chars must be a positive integer")
+    fusion = payload.get("fusion")
+    if fusion is not None and not isinstance(fusion, dict):
+        raise HTTPException(status_code=400, detail="fusion must be an object")
+    try:
+        check_search_fields(fields)
+        fusion_cfg = FusionConfig.from_dict(fusion, base=store.fusion_for(collection)) if fusion else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return fields, snippet_chars, fusion_cfg
+
+
 @router.post("/search")
 async def search(request: Request, authorization: str | None = Header(default=None)) -> dict:
     _check_api_key(authorization)
@@ -48,16 +68,51 @@ async def search(request: Request, authorization: str | None = Header(default=No
     top_k = int(payload.get("top_k") or 8)
     if not isinstance(query, str) or not query:
         raise HTTPException(status_code=400, detail="query is required")
+    collection = collection if isinstance(collection, str) else None
+    fields, snippet_chars, fusion_cfg = _search_options(payload, collection)
     query_vec = None
     if payload.get("use_vector", True):
-        try:
-            query_vec = (await embed_texts([query]))[0]
-        except Exception:
-            query_vec = None
-    results = store.search(collection=collection if isinstance(collection, str) else None, query_text=query, query_vec=query_vec, top_k=top_k)
+        query_vec = await store.embed_query(query, collection=collection)
+    results = store.search(
+        collection=collection,
+        query_text=query,
+        query_vec=query_vec,
+        top_k=top_k,
+        fields=fields,
+        snippet_chars=snippet_chars,
+        fusion=fusion_cfg,
+    )
     return {"results": results}
 
 
+@router.post("/search_batch")
+async def search_batch(request: Request, authorization: str | None = Header(default=None)) -> dict:
+    _check_api_key(authorization)
+    payload = await request.json()
+    queries = payload.get("queries")
+    collection = payload.get("collection")
+    top_k = int(payload.get("top_k") or 8)
+    if not isinstance(queries, list) or not queries or not all(isinstance(q, str) and q for q in queries):
+        raise HTTPException(status_code=400, detail="queries must be a non-empty list of strings")
+    if len(queries) > 64:
+        raise HTTPException(status_code=400, detail="at most 64 queries per batch")
+    collection = collection if isinstance(collection, str) else None
+    fields, snippet_chars, fusion_cfg = _search_options(payload, collection)
+    query_vecs = None
+    if payload.get("use_vector", True):
+        query_vecs = await store.embed_queries(queries, collection=collection)
+    results = store.search_batch(
+        collection=collection,
+        queries=queries,
+        query_vecs=query_vecs,
+        top_k=top_k,
+        fields=fields,
+        snippet_chars=snippet_chars,
+        fusion=fusion_cfg,
+    )
+    return {"results": [{"query": q, "results": r} for q, r in zip(queries, results)]}
+
+
 @router.post("/ingest")
 async def ingest(request: Request, authorization: str | None = Header(default=None)) -> dict:
     _check_api_key(authorization)
@@ -90,3 +145,70 @@ async def rebuild(request: Request, authorization: str | None = Header(default=N
         out[col] = {"changed": changed, "files": len(items)}
     return out
 
+
+
+@router.get("/stats")
+async def memory_stats(authorization: str | None = Header(default=None)) -> dict:
+    _check_api_key(authorization)
+    return {"cache": store.cache_stats(), "index_sync": index_sync_worker.stats()}
+
+
+@router.get("/reembed")
+async def list_reembed_jobs(authorization: str | None = Header(default=None)) -> dict:
+    _check_api_key(authorization)
+    return {"jobs": reembed_manager.list()}
+
+
+@router.post("/reembed")
+async def start_reembed(request: Request, authorization: str | None = Header(default=None)) -> dict:
+    _check_api_key(authorization)
+    payload = await request.json()
+    collection = payload.get("collection")
+    model_id = payload.get("model_id")
+    batch_size = payload.get("batch_size", 32)
+    interval_ms = payload.get("interval_ms", 1000)
+    if not isinstance(collection, str) or not collection:
+        raise HTTPException(status_code=400, detail="collection is required")
+    if model_id is not None and (not isinstance(model_id, str) or ":" not in model_id):
+        raise HTTPException(status_code=400, detail="model_id must look like '<provider>:<model>' or be null")
+    if not isinstance(batch_size, int) or not isinstance(interval_ms, int):
+        raise HTTPException(status_code=400, detail="batch_size and interval_ms must be integers")
+    job = reembed_manager.start(collection, model_id=model_id, batch_size=batch_size, interval_seconds=interval_ms / 1000)
+    return job.to_dict()
+
+
+@router.delete("/reembed/{collection}")
+async def cancel_reembed(collection: str, authorization: str | None = Header(default=None)) -> dict:
+    _check_api_key(authorization)
+    return {"cancelled": await reembed_manager.cancel(collection)}
+
+
+@router.get("/fusion")
+async def list_fusion_presets(authorization: str | None = Header(default=None)) -> dict:
+    _check_api_key(authorization)
+    return {
+        "default": store.default_fusion().to_dict(),
+        "presets": {k: v.to_dict() for k, v in store.fusion_presets().items()},
+    }
+
+
+@router.put("/fusion/{collection}")
+async def set_fusion_preset(collection: str, request: Request, authorization: str | None = Header(default=None)) -> dict:
+    _check_api_key(authorization)
+    payload = await request.json()
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=400, detail="payload must be an object")
+    try:
+        cfg = FusionConfig.from_dict(payload, base=store.default_fusion())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    store.set_fusion_preset(collection, cfg)
+    return {"collection": collection, "fusion": cfg.to_dict()}
+
+
+@router.delete("/fusion/{collection}")
+async def delete_fusion_preset(collection: str, authorization: str | None = Header(default=None)) -> dict:
+    _check_api_key(authorization)
+    existed = collection in store.fusion_presets()
+    store.set_fusion_preset(collection, None)
+    return {"deleted": existed}
@@ -1,9 +1,8 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Header, HTTPException, Request
+from fastapi import APIRouter, Header, HTTPException, Request, Response
 
 from ..settings import settings
-from ..services.embedding import embed_texts
 from ..services.context_packs import get_context_pack
 from ..services.llm_proxy import proxy_chat_completions, proxy_models
 from ..services.model_defaults import get_defaults
@@ -12,6 +11,8 @@ from ..services.upstream_config import get_upstreams
 from ..services.memory import store
 from ..services.model_registry import model_registry
 from ..services.research import enqueue_research
+from ..services.rag_context import assemble_context
+from ..services.rerank import rerank, rerank_enabled
 
 router = APIRouter()
 
@@ -38,7 +39,7 @@ async def v1_models(authorization: str | None = Header(default=None)) -> dict:
 
 
 @router.post("/v1/chat/completions")
-async def v1_chat_completions(request: Request, authorization: str | None = Header(default=None)) -> dict:
+async def v1_chat_completions(request: Request, response: Response, authorization: str | None = Header(default=None)) -> dict:
     _check_api_key(authorization)
     payload = await request.json()
     if not isinstance(payload, dict) or not isinstance(payload.get("messages"), list):
@@ -60,6 +61,8 @@ async def v1_chat_completions(request: Request, authorization: str | None = Head
         rag = payload.get("rag") or {}
         collection = rag.get("collection") if isinstance(rag.get("collection"), str) else None
         top_k = int(rag.get("top_k") or 5)
+        use_rerank = bool(rag.get("rerank", True)) and rerank_enabled()
+        budget_ms = rag.get("rerank_budget_ms") if isinstance(rag.get("rerank_budget_ms"), int) else None
         auto_research = bool(rag.get("auto_research")) if "auto_research" in rag else False
         query = None
         for m in reversed(payload["messages"]):
@@ -67,19 +70,19 @@ async def v1_chat_completions(request: Request, authorization: str | None = Head
                 query = m["content"]
                 break
         if query:
-            try:
-                query_vec = (await embed_texts([query]))[0]
-            except Exception:
-                query_vec = None
-            hits = store.search(collection=collection, query_text=query, query_vec=query_vec, top_k=top_k)
+            query_vec = await store.embed_query(query, collection=collection)
+            fetch = top_k * max(1, settings.rerank_fetch_multiplier) if use_rerank else top_k
+            hits = store.search(collection=collection, query_text=query, query_vec=query_vec, top_k=fetch)
+            if use_rerank:
+                hits, _ = await rerank(query, hits, top_k=top_k, budget_ms=budget_ms)
             if hits:
-                ctx_lines = []
-                for h in hits:
-                    content = str(h.get("content") or "")
-                    if len(content) > 800:
-                        content = content[:800] + "…"
-                    ctx_lines.append(f"[{h.get('path')}] {content}")
-                rag_ctx = "以下是检索到的资料片段（用于回答问题，优先引用）：\n" + "\n\n".join(ctx_lines)
+                budget = rag.get("token_budget")
+                if not isinstance(budget, int) or budget <= 0:
+                    budget = (profile.rag_token_budget if profile else None) or settings.rag_token_budget
+                assembled = assemble_context(query, hits, token_budget=budget)
+                rag_ctx = assembled.text
+                response.headers["x-fass-rag-tokens"] = str(assembled.tokens)
+                response.headers["x-fass-rag-chunks"] = str(len(assembled.chunks))
             elif auto_research:
                 try:
                     await enqueue_research(query, collection=collection or "shared")
@@ -43,6 +43,12 @@ async def get_settings(authorization: str | None = Header(default=None)) -> dict
             "embedding_provider": settings.embedding_provider,
             "embedding_model_path": settings.embedding_model_path,
             "embedding_model": settings.embedding_model,
+            "embedding_dim": settings.embedding_dim,
+            "memory_fusion": settings.memory_fusion,
+            "rerank_provider": settings.rerank_provider,
+            "rerank_model": settings.rerank_model,
+            "rerank_budget_ms": settings.rerank_budget_ms,
+            "rag_token_budget": settings.rag_token_budget,
             "llm_provider": settings.llm_provider,
             "llm_base_url": settings.llm_base_url,
             "llm_model": settings.llm_model,
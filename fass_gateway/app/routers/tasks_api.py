@@ -7,6 +7,8 @@ from time import time
 from fastapi import APIRouter, Header, HTTPException, Request
 
 from ..db import open_db
+from ..services.cron import CronError, CronExpr
+from ..services.task_runner import compute_next_run, parse_task_payload, runner
 from ..settings import settings
 
 router = APIRouter(prefix="/api/tasks")
@@ -33,6 +35,21 @@ def _check_api_key(authorization: str | None) -> None:
         raise HTTPException(status_code=403, detail="Invalid API key")
 
 
+def _check_cron(cron: str | None) -> None:
+    if not cron or not cron.strip():
+        return
+    try:
+        CronExpr(cron)
+    except CronError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/runner")
+async def runner_stats(authorization: str | None = Header(default=None)) -> dict:
+    _check_api_key(authorization)
+    return runner.stats()
+
+
 @router.get("")
 async def list_tasks(authorization: str | None = Header(default=None)) -> list[dict]:
     _check_api_key(authorization)
@@ -53,18 +70,21 @@ async def create_task(request: Request, authorization: str | None = Header(defau
         raise HTTPException(status_code=400, detail="name is required")
     if cron is not None and not isinstance(cron, str):
         raise HTTPException(status_code=400, detail="cron must be a string or null")
+    _check_cron(cron)
     if not isinstance(task_payload, dict):
         raise HTTPException(status_code=400, detail="payload must be an object")
     now = _now_ms()
+    next_run = compute_next_run({"cron": cron}, task_payload, now)
     conn = _db()
     conn.execute(
-        "INSERT INTO tasks(name, cron, payload_json, enabled, created_at_unix_ms, updated_at_unix_ms) VALUES (?, ?, ?, 1, ?, ?)",
-        (name, cron, json.dumps(task_payload, ensure_ascii=False), now, now),
+        "INSERT INTO tasks(name, cron, payload_json, enabled, created_at_unix_ms, updated_at_unix_ms, next_run_unix_ms) VALUES (?, ?, ?, 1, ?, ?, ?)",
+        (name, cron, json.dumps(task_payload, ensure_ascii=False), now, now, next_run),
     )
     conn.commit()
     task_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
     row = conn.execute("SELECT * FROM tasks WHERE id=?", (task_id,)).fetchone()
     conn.close()
+    runner.wake()
     return dict(row)
 
 
@@ -72,6 +92,10 @@ async def create_task(request: Request, authorization: str | None = Header(defau
 async def update_task(task_id: int, request: Request, authorization: str | None = Header(default=None)) -> dict:
     _check_api_key(authorization)
     payload = await request.json()
+    if "cron" in payload:
+        if payload["cron"] is not None and not isinstance(payload["cron"], str):
+            raise HTTPException(status_code=400, detail="cron must be a string or null")
+        _check_cron(payload["cron"])
     fields = []
     values = []
     for k in ("name", "cron", "enabled"):
@@ -83,16 +107,23 @@ async def update_task(task_id: int, request: Request, authorization: str | None
         values.append(json.dumps(payload["payload"], ensure_ascii=False))
     if not fields:
         raise HTTPException(status_code=400, detail="no fields to update")
+    now = _now_ms()
     fields.append("updated_at_unix_ms=?")
-    values.append(_now_ms())
+    values.append(now)
     values.append(task_id)
     conn = _db()
     conn.execute(f"UPDATE tasks SET {', '.join(fields)} WHERE id=?", values)
-    conn.commit()
     row = conn.execute("SELECT * FROM tasks WHERE id=?", (task_id,)).fetchone()
+    if row and any(k in payload for k in ("cron", "enabled", "payload")):
+        # 调度相关字段变更后重算下一次触发时间。
+        t = dict(row)
+        conn.execute("UPDATE tasks SET next_run_unix_ms=? WHERE id=?", (compute_next_run(t, parse_task_payload(t), now), task_id))
+        row = conn.execute("SELECT * FROM tasks WHERE id=?", (task_id,)).fetchone()
+    conn.commit()
     conn.close()
     if not row:
         raise HTTPException(status_code=404, detail="task not found")
+    runner.wake()
     return dict(row)
 
 
@@ -103,5 +134,6 @@ async def delete_task(task_id: int, authorization: str | None = Header(default=N
     conn.execute("DELETE FROM tasks WHERE id=?", (task_id,))
     conn.commit()
     conn.close()
+    runner.wake()
     return {"ok": True}
 
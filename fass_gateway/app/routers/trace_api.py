@@ -12,8 +12,10 @@ from sse_starlette.sse import EventSourceResponse
 
 from ..db import open_db
 from ..settings import settings
-from ..services.llm_proxy import proxy_chat_completions
+from ..services.llm_proxy import proxy_chat_completions_stream
+from ..services.trace_history import list_events, model_stats
 from ..services.trace_hub import hub
+from ..services.trace_writer import DELTA_STATUS, trace_writer
 
 
 router = APIRouter(prefix="/api/trace")
@@ -42,37 +44,9 @@ def _check_api_key(authorization: str | None, token_query: str | None = None) ->
         raise HTTPException(status_code=403, detail="Invalid API key")
 
 
-def _insert_trace(conversation_id: int, ev: dict[str, Any]) -> None:
-    conn = _db()
-    conn.execute(
-        """
-INSERT INTO trace_events(
-  conversation_id, trace_id, parent_id, layer, from_agent, to_agent, event_kind,
-  raw_command_text, content, ts_unix_ms, status, provider_id, model_id
-) VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?)
-""",
-        (
-            conversation_id,
-            ev.get("trace_id"),
-            ev.get("parent_id"),
-            ev.get("layer"),
-            ev.get("from_agent"),
-            ev.get("to_agent"),
-            ev.get("event_kind"),
-            ev.get("raw_command_text"),
-            ev.get("content"),
-            ev.get("ts_unix_ms"),
-            ev.get("status"),
-            ev.get("provider_id"),
-            ev.get("model_id"),
-        ),
-    )
-    conn.commit()
-    conn.close()
-
-
 async def _emit(conversation_id: int, ev: dict[str, Any]) -> None:
-    _insert_trace(conversation_id, ev)
+    # 广播不等待落库；持久化由 trace_writer 在后台批量写入。
+    trace_writer.enqueue(conversation_id, ev)
     await hub.publish(conversation_id, ev)
 
 
@@ -102,29 +76,109 @@ async def create_conversation(request: Request, authorization: str | None = Head
 
 
 @router.get("/conversations/{conversation_id}/events")
-async def stream_events(conversation_id: int, token: str | None = None, authorization: str | None = Header(default=None)):
+async def stream_events(
+    conversation_id: int,
+    token: str | None = None,
+    last_event_id: str | None = None,
+    authorization: str | None = Header(default=None),
+    last_event_id_header: str | None = Header(default=None, alias="Last-Event-ID"),
+):
     _check_api_key(authorization, token_query=token)
-    q = await hub.subscribe(conversation_id)
+    # 浏览器 EventSource 重连时自动带 Last-Event-ID 头，从环形缓冲续传。
+    sub = await hub.subscribe(conversation_id, last_event_id=last_event_id_header or last_event_id)
 
     async def gen():
         try:
             yield {"event": "ready", "data": json.dumps({"ok": True})}
             while True:
-                ev = await q.get()
-                yield {"event": "trace", "data": json.dumps(ev, ensure_ascii=False)}
+                item = await sub.get()
+                if item is None:
+                    # 慢消费者被断开，客户端应带最后收到的 id 重连。
+                    yield {"event": "overflow", "data": json.dumps({"reconnect": True})}
+                    break
+                event_id, ev = item
+                yield {"event": "trace", "id": event_id, "data": json.dumps(ev, ensure_ascii=False)}
         finally:
-            await hub.unsubscribe(conversation_id, q)
+            await hub.unsubscribe(conversation_id, sub)
 
     return EventSourceResponse(gen())
 
 
-async def _fake_stream_chunks(conversation_id: int, base: dict[str, Any], text: str) -> None:
-    chunk_size = 24
-    buf = ""
-    for i in range(0, len(text), chunk_size):
-        buf += text[i : i + chunk_size]
-        await _emit(conversation_id, {**base, "content": buf})
-        await asyncio.sleep(0.05)
+@router.get("/conversations/{conversation_id}/history")
+async def trace_history(
+    conversation_id: int,
+    cursor: str | None = None,
+    since_unix_ms: int | None = None,
+    until_unix_ms: int | None = None,
+    layer: str | None = None,
+    order: str = "asc",
+    limit: int = 200,
+    authorization: str | None = Header(default=None),
+) -> dict:
+    _check_api_key(authorization)
+    try:
+        return list_events(
+            conversation_id,
+            cursor=cursor,
+            since_unix_ms=since_unix_ms,
+            until_unix_ms=until_unix_ms,
+            layer=layer,
+            order=order,
+            limit=limit,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/stats/models")
+async def trace_model_stats(
+    since_unix_ms: int | None = None,
+    until_unix_ms: int | None = None,
+    provider_id: str | None = None,
+    authorization: str | None = Header(default=None),
+) -> dict:
+    _check_api_key(authorization)
+    return model_stats(since_unix_ms=since_unix_ms, until_unix_ms=until_unix_ms, provider_id=provider_id)
+
+
+@router.get("/hub/stats")
+async def hub_stats(authorization: str | None = Header(default=None)) -> dict:
+    _check_api_key(authorization)
+    return hub.stats()
+
+
+async def _stream_layer(conversation_id: int, base: dict[str, Any], messages: list[dict[str, str]], fallback: str) -> str:
+    # 上游每到一个片段就广播增量，结束时发一条带完整内容的 done 事件。
+    parts: list[str] = []
+    status = "done"
+    try:
+        async for piece in proxy_chat_completions_stream({"model": "default", "messages": messages}):
+            parts.append(piece)
+            await _emit(conversation_id, {**base, "content": piece, "status": DELTA_STATUS, "ts_unix_ms": _now_ms()})
+    except Exception:
+        status = "error"
+    text = "".join(parts)
+    if not text:
+        text = fallback
+    await _emit(conversation_id, {**base, "content": text, "status": status, "ts_unix_ms": _now_ms()})
+    return text
+
+
+def _layer_base(trace_id: str, parent_id: str | None, layer: str, to_agent: str, event_kind: str, raw_command_text: str) -> dict[str, Any]:
+    return {
+        "trace_id": trace_id,
+        "parent_id": parent_id,
+        "layer": layer,
+        "from_agent": layer,
+        "to_agent": to_agent,
+        "event_kind": event_kind,
+        "raw_command_text": raw_command_text,
+        "content": "",
+        "ts_unix_ms": _now_ms(),
+        "status": "running",
+        "provider_id": None,
+        "model_id": None,
+    }
 
 
 @router.post("/conversations/{conversation_id}/send")
@@ -134,6 +188,12 @@ async def send_message(conversation_id: int, request: Request, authorization: st
     text = payload.get("text")
     if not isinstance(text, str) or not text.strip():
         raise HTTPException(status_code=400, detail="text is required")
+    subtasks = payload.get("subtasks") or []
+    if not isinstance(subtasks, list) or not all(isinstance(x, str) and x.strip() for x in subtasks):
+        raise HTTPException(status_code=400, detail="subtasks must be a list of non-empty strings")
+    if len(subtasks) > 8:
+        raise HTTPException(status_code=400, detail="at most 8 subtasks")
+    parallel = payload.get("parallel", True)
     text = text.strip()
     trace_id = str(uuid.uuid4())
     now = _now_ms()
@@ -155,64 +215,37 @@ async def send_message(conversation_id: int, request: Request, authorization: st
     await _emit(conversation_id, l3_base)
 
     l2_trace_id = str(uuid.uuid4())
-    l2_base = {
-        "trace_id": l2_trace_id,
-        "parent_id": trace_id,
-        "layer": "L2",
-        "from_agent": "L2",
-        "to_agent": "L1",
-        "event_kind": "analysis",
-        "raw_command_text": f"分析用户输入并提出执行步骤：{text}",
-        "content": "",
-        "ts_unix_ms": _now_ms(),
-        "status": "running",
-        "provider_id": None,
-        "model_id": None,
-    }
-    try:
-        resp_l2 = await proxy_chat_completions(
-            {
-                "model": "default",
-                "messages": [
-                    {"role": "system", "content": "你是执行层(L2)。给出条理清晰的分析与可执行步骤，简短。" },
-                    {"role": "user", "content": text},
-                ],
-            }
-        )
-        l2_text = resp_l2.get("choices", [{}])[0].get("message", {}).get("content") or ""
-    except Exception:
-        l2_text = "L2 分析失败，降级为直接回答。"
-    await _fake_stream_chunks(conversation_id, l2_base, l2_text)
-
-    l1_trace_id = str(uuid.uuid4())
-    l1_base = {
-        "trace_id": l1_trace_id,
-        "parent_id": l2_trace_id,
-        "layer": "L1",
-        "from_agent": "L1",
-        "to_agent": "L3",
-        "event_kind": "execution",
-        "raw_command_text": "根据 L2 结果给出最终回复草案。",
-        "content": "",
-        "ts_unix_ms": _now_ms(),
-        "status": "running",
-        "provider_id": None,
-        "model_id": None,
-    }
-    try:
-        resp_l1 = await proxy_chat_completions(
-            {
-                "model": "default",
-                "messages": [
-                    {"role": "system", "content": "你是执行层(L1)。输出最终回复草案，语言自然，简洁但完整。"},
-                    {"role": "user", "content": f"用户：{text}\n\nL2：{l2_text}"},
-                ],
-            }
+    l2_text = await _stream_layer(
+        conversation_id,
+        _layer_base(l2_trace_id, trace_id, "L2", "L1", "analysis", f"分析用户输入并提出执行步骤：{text}"),
+        [
+            {"role": "system", "content": "你是执行层(L2)。给出条理清晰的分析与可执行步骤，简短。"},
+            {"role": "user", "content": text},
+        ],
+        "L2 分析失败，降级为直接回答。",
+    )
+
+    def _l1(task: str | None):
+        instruction = f"\n\n子任务：{task.strip()}" if task else ""
+        return _stream_layer(
+            conversation_id,
+            _layer_base(str(uuid.uuid4()), l2_trace_id, "L1", "L3", "execution", f"根据 L2 结果给出最终回复草案。{instruction}".strip()),
+            [
+                {"role": "system", "content": "你是执行层(L1)。输出最终回复草案，语言自然，简洁但完整。"},
+                {"role": "user", "content": f"用户：{text}\n\nL2：{l2_text}{instruction}"},
+            ],
+            "执行失败。",
         )
-        l1_text = resp_l1.get("choices", [{}])[0].get("message", {}).get("content") or ""
-    except Exception:
-        l1_text = "执行失败。"
-    await _fake_stream_chunks(conversation_id, l1_base, l1_text)
+
+    if not subtasks:
+        l1_text = await _l1(None)
+    else:
+        # 子任务互不依赖，parallel=true 时并发执行，各自的增量事件按 trace_id 区分。
+        if parallel:
+            results = await asyncio.gather(*(_l1(t) for t in subtasks))
+        else:
+            results = [await _l1(t) for t in subtasks]
+        l1_text = "\n\n".join(f"【{t.strip()}】\n{r}" for t, r in zip(subtasks, results))
 
     await _emit(conversation_id, {**l3_base, "to_agent": "user", "event_kind": "final", "content": "已汇总。", "ts_unix_ms": _now_ms(), "status": "done"})
     return {"ok": True, "assistant": l1_text, "trace_id": trace_id}
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+from pathlib import Path
+from time import perf_counter
+from typing import Any
+
+from ..services.fusion import FusionConfig
+from ..services.memory import store
+
+
+def _load_queries(path: Path) -> list[dict[str, Any]]:
+    out: list[dict[str, Any]] = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        item = json.loads(line)
+        relevant = item.get("relevant")
+        if not isinstance(item.get("query"), str) or not isinstance(relevant, list) or not relevant:
+            raise ValueError(f"invalid query line: {line}")
+        out.append({"query": item["query"], "collection": item.get("collection"), "relevant": {str(p) for p in relevant}})
+    return out
+
+
+def _percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    return s[min(len(s) - 1, int(round(q * (len(s) - 1))))]
+
+
+def evaluate(queries: list[dict[str, Any]], fusion: FusionConfig, k: int) -> dict[str, Any]:
+    recall = 0.0
+    rr = 0.0
+    latencies: list[float] = []
+    for q in queries:
+        t0 = perf_counter()
+        hits = store.search(
+            collection=q["collection"],
+            query_text=q["query"],
+            query_vec=q["vec"],
+            top_k=k,
+            fields=["path"],
+            fusion=fusion,
+            use_cache=False,
+        )
+        latencies.append((perf_counter() - t0) * 1000)
+        paths = [h["path"] for h in hits]
+        recall += len(q["relevant"].intersection(paths)) / len(q["relevant"])
+        rr += next((1.0 / (i + 1) for i, p in enumerate(paths) if p in q["relevant"]), 0.0)
+    n = len(queries) or 1
+    return {
+        "fusion": fusion.to_dict(),
+        f"recall@{k}": recall / n,
+        "mrr": rr / n,
+        "p50_ms": _percentile(latencies, 0.5),
+        "p95_ms": _percentile(latencies, 0.95),
+    }
+
+
+async def _embed_all(queries: list[dict[str, Any]], no_vector: bool) -> None:
+    for q in queries:
+        q["vec"] = None if no_vector else await store.embed_query(q["query"], collection=q["collection"])
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("queries", help="标注查询集（JSONL，每行 {query, collection?, relevant:[path,...]}）")
+    ap.add_argument("--k", type=int, default=8, help="评估的 top_k")
+    ap.add_argument("--rrf-k", type=float, default=60.0, help="RRF 平滑常数")
+    ap.add_argument("--no-vector", action="store_true", help="只评估文本检索")
+    ap.add_argument("--tune", action="store_true", help="网格搜索加权融合的文本权重，输出 MRR 最优的一组")
+    ap.add_argument("--save-preset", default=None, help="把 --tune 得到的最优配置保存为该集合的融合预设")
+    args = ap.parse_args()
+
+    queries = _load_queries(Path(args.queries))
+    asyncio.run(_embed_all(queries, args.no_vector))
+
+    candidates = [store.default_fusion(), FusionConfig(strategy="rrf", text_weight=1.0, vector_weight=1.0, rrf_k=args.rrf_k)]
+    if args.tune:
+        candidates += [FusionConfig(text_weight=w / 10, vector_weight=1 - w / 10) for w in range(11)]
+
+    results = [evaluate(queries, c, args.k) for c in candidates]
+    for r in results:
+        print(json.dumps(r, ensure_ascii=False))
+
+    if args.tune:
+        best = max(results, key=lambda r: (r["mrr"], r[f"recall@{args.k}"]))
+        print(f"best: {json.dumps(best['fusion'], ensure_ascii=False)}")
+        if args.save_preset:
+            store.set_fusion_preset(args.save_preset, FusionConfig.from_dict(best["fusion"]))
+            print(f"saved preset for {args.save_preset}")
+
+
+if __name__ == "__main__":
+    main()
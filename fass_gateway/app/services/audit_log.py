@@ -1,16 +1,24 @@
 from __future__ import annotations
 
+import asyncio
 import base64
 import hashlib
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 from time import time
-from typing import Any
+from typing import Any, Iterator
 
 from cryptography.fernet import Fernet, InvalidToken
 
 from ..db import open_db
 from ..settings import settings
+from .trace_history import decode_cursor, encode_cursor
+
+
+_INSERT_SQL = "INSERT INTO audit_logs(actor, action, encrypted_payload, created_at_unix_ms, expire_at_unix_ms) VALUES(?,?,?,?,?)"
 
 
 def _now_ms() -> int:
@@ -22,38 +30,168 @@ def _db():
     return open_db(str(base / "data" / "fass_gateway.sqlite"))
 
 
-def _fernet() -> Fernet:
-    key = getattr(settings, "audit_log_key", None)
+@lru_cache(maxsize=4)
+def _cipher(key: str | None, seed: str) -> Fernet:
     if isinstance(key, str) and key.strip():
         return Fernet(key.strip().encode("utf-8"))
-    seed = settings.api_key or "fass-audit-default"
     derived = base64.urlsafe_b64encode(hashlib.sha256(seed.encode("utf-8")).digest())
     return Fernet(derived)
 
 
+def _fernet() -> Fernet:
+    # 按当前配置缓存，修改 audit_log_key/api_key 后自动换用新的密钥。
+    return _cipher(getattr(settings, "audit_log_key", None), settings.api_key or "fass-audit-default")
+
+
+class AuditWriter:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending: list[tuple[str, str, bytes, int, int]] = []
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+        self.written = 0
+        self.batches = 0
+        self.last_error: str | None = None
+
+    def start(self) -> None:
+        if self._task and not self._task.done():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None and self._wake is not None:
+            self._stopping = True
+            self._wake.set()
+            try:
+                await self._task
+            except Exception:
+                pass
+        with self._lock:
+            self._loop = None
+            self._task = None
+        # 关闭时同步写完剩余记录。
+        self.flush()
+
+    def write(self, actor: str, action: str, payload: dict[str, Any], *, retention_days: int) -> None:
+        now = _now_ms()
+        # 调用时序列化快照，加密与落库放到批量写入时进行。
+        row = (actor, action, json.dumps(payload, ensure_ascii=False).encode("utf-8"), now, now + retention_days * 24 * 3600 * 1000)
+        with self._lock:
+            loop = self._loop
+            if loop is not None:
+                self._pending.append(row)
+                full = len(self._pending) >= settings.audit_writer_batch_size
+        if loop is None:
+            # 未启动（脚本/测试/启动自检阶段）时同步写入。
+            self._insert([row])
+            return
+        if full and self._wake is not None:
+            try:
+                loop.call_soon_threadsafe(self._wake.set)
+            except RuntimeError:
+                pass
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                rows, self._pending = self._pending, []
+            if not rows:
+                return 0
+            try:
+                self._insert(rows)
+            except Exception:
+                with self._lock:
+                    self._pending[:0] = rows
+                raise
+            return len(rows)
+
+    def _insert(self, rows: list[tuple[str, str, bytes, int, int]]) -> None:
+        f = _fernet()
+        conn = _db()
+        try:
+            conn.executemany(_INSERT_SQL, [(actor, action, f.encrypt(plain), created, expire) for actor, action, plain, created, expire in rows])
+            conn.commit()
+        finally:
+            conn.close()
+        self.written += len(rows)
+        self.batches += 1
+
+    async def _run(self) -> None:
+        assert self._wake is not None
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=settings.audit_writer_flush_ms / 1000)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await asyncio.to_thread(self.flush)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            pending = len(self._pending)
+        return {"pending": pending, "written": self.written, "batches": self.batches, "last_error": self.last_error}
+
+
+audit_writer = AuditWriter()
+
+
 def write(actor: str, action: str, payload: dict[str, Any], *, retention_days: int = 180) -> None:
-    now = _now_ms()
-    expire = now + retention_days * 24 * 3600 * 1000
-    blob = _fernet().encrypt(json.dumps(payload, ensure_ascii=False).encode("utf-8"))
-    conn = _db()
-    conn.execute(
-        "INSERT INTO audit_logs(actor, action, encrypted_payload, created_at_unix_ms, expire_at_unix_ms) VALUES(?,?,?,?,?)",
-        (actor, action, blob, now, expire),
-    )
-    conn.commit()
-    conn.close()
+    audit_writer.write(actor, action, payload, retention_days=retention_days)
 
 
-def list_logs(
+def _decode_payload(f: Fernet, blob: bytes) -> Any:
+    try:
+        return json.loads(f.decrypt(blob).decode("utf-8"))
+    except (InvalidToken, json.JSONDecodeError):
+        return None
+
+
+_decrypt_pool: ThreadPoolExecutor | None = None
+
+
+def _decrypt_all(blobs: list[bytes]) -> list[Any]:
+    global _decrypt_pool
+    f = _fernet()
+    if len(blobs) < settings.audit_decrypt_parallel_min or settings.audit_decrypt_workers <= 1:
+        return [_decode_payload(f, b) for b in blobs]
+    # 大批量解密分块交给线程池并行，结果保持原顺序。
+    if _decrypt_pool is None:
+        _decrypt_pool = ThreadPoolExecutor(max_workers=settings.audit_decrypt_workers, thread_name_prefix="audit-decrypt")
+    step = max(1, -(-len(blobs) // settings.audit_decrypt_workers))
+    chunks = [blobs[i : i + step] for i in range(0, len(blobs), step)]
+    out: list[Any] = []
+    for part in _decrypt_pool.map(lambda chunk: [_decode_payload(f, b) for b in chunk], chunks):
+        out.extend(part)
+    return out
+
+
+def page_logs(
     *,
     since_unix_ms: int | None = None,
     until_unix_ms: int | None = None,
     action: str | None = None,
+    actor: str | None = None,
+    cursor: str | None = None,
     limit: int = 200,
     decrypt: bool = False,
-) -> list[dict[str, Any]]:
+) -> dict[str, Any]:
+    # 按 (created_at_unix_ms, id) 倒序键集分页；action/actor 过滤分别走对应的复合索引。
     where = []
     params: list[Any] = []
+    if cursor:
+        ts, eid = decode_cursor(cursor)
+        where.append("(created_at_unix_ms, id)<(?, ?)")
+        params.extend([ts, eid])
     if since_unix_ms is not None:
         where.append("created_at_unix_ms>=?")
         params.append(int(since_unix_ms))
@@ -63,27 +201,66 @@ def list_logs(
     if action is not None:
         where.append("action=?")
         params.append(str(action))
+    if actor is not None:
+        where.append("actor=?")
+        params.append(str(actor))
+    limit = max(1, int(limit))
     sql = "SELECT id, actor, action, encrypted_payload, created_at_unix_ms, expire_at_unix_ms FROM audit_logs"
     if where:
         sql += " WHERE " + " AND ".join(where)
-    sql += " ORDER BY created_at_unix_ms DESC LIMIT ?"
-    params.append(int(limit))
+    sql += " ORDER BY created_at_unix_ms DESC, id DESC LIMIT ?"
+    params.append(limit + 1)
+    # 先写入缓冲中的记录，保证查询能看到刚产生的审计。
+    audit_writer.flush()
     conn = _db()
     rows = conn.execute(sql, tuple(params)).fetchall()
     conn.close()
-    out: list[dict[str, Any]] = []
-    f = _fernet()
-    for r in rows:
-        item = dict(r)
-        if decrypt:
-            try:
-                plain = f.decrypt(item["encrypted_payload"])
-                item["payload"] = json.loads(plain.decode("utf-8"))
-            except (InvalidToken, json.JSONDecodeError):
-                item["payload"] = None
+    items = [dict(r) for r in rows[:limit]]
+    payloads = _decrypt_all([x["encrypted_payload"] for x in items]) if decrypt else None
+    for i, item in enumerate(items):
         item.pop("encrypted_payload", None)
-        out.append(item)
-    return out
+        if payloads is not None:
+            item["payload"] = payloads[i]
+    next_cursor = encode_cursor(items[-1]["created_at_unix_ms"], items[-1]["id"]) if len(rows) > limit else None
+    return {"items": items, "next_cursor": next_cursor}
+
+
+def list_logs(
+    *,
+    since_unix_ms: int | None = None,
+    until_unix_ms: int | None = None,
+    action: str | None = None,
+    limit: int = 200,
+    decrypt: bool = False,
+) -> list[dict[str, Any]]:
+    return page_logs(since_unix_ms=since_unix_ms, until_unix_ms=until_unix_ms, action=action, limit=limit, decrypt=decrypt)["items"]
+
+
+def export_ndjson(
+    *,
+    since_unix_ms: int | None = None,
+    until_unix_ms: int | None = None,
+    action: str | None = None,
+    actor: str | None = None,
+    decrypt: bool = False,
+) -> Iterator[bytes]:
+    # 逐页读取并逐行输出，内存占用与导出总量无关。
+    cursor = None
+    while True:
+        page = page_logs(
+            since_unix_ms=since_unix_ms,
+            until_unix_ms=until_unix_ms,
+            action=action,
+            actor=actor,
+            cursor=cursor,
+            limit=settings.audit_export_page_size,
+            decrypt=decrypt,
+        )
+        if page["items"]:
+            yield "".join(json.dumps(x, ensure_ascii=False) + "\n" for x in page["items"]).encode("utf-8")
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return
 
 
 def prune_expired() -> int:
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any
+
+from ..db import open_db
+from .dreaming import run_dreaming
+from .job_queue import DeadHandler, JobHandler
+from .mcp_executor import execute_tool
+from .research import enqueue_research, mark_research_dead, run_research_job
+
+
+STEP_TYPES = ("research", "dreaming", "tool")
+
+
+def _db():
+    base = Path(__file__).resolve().parents[2]
+    return open_db(str(base / "data" / "fass_gateway.sqlite"))
+
+
+def check_steps(steps: Any) -> list[dict[str, Any]]:
+    if not isinstance(steps, list) or not steps:
+        raise ValueError("steps must be a non-empty list")
+    for i, step in enumerate(steps):
+        if not isinstance(step, dict) or step.get("type") not in STEP_TYPES:
+            raise ValueError(f"steps[{i}].type must be one of {', '.join(STEP_TYPES)}")
+        if step["type"] == "research" and not (isinstance(step.get("query"), str) and step["query"].strip()):
+            raise ValueError(f"steps[{i}].query is required")
+        if step["type"] == "tool":
+            if not isinstance(step.get("name"), str) or not step["name"]:
+                raise ValueError(f"steps[{i}].name is required")
+            if not isinstance(step.get("arguments", {}), dict):
+                raise ValueError(f"steps[{i}].arguments must be an object")
+    return steps
+
+
+async def _run_step(step: dict[str, Any]) -> Any:
+    kind = step["type"]
+    if kind == "research":
+        return await enqueue_research(step["query"], collection=str(step.get("collection") or "shared"))
+    if kind == "dreaming":
+        max_items = step.get("max_items", 10)
+        return await run_dreaming(
+            max_items=max_items if isinstance(max_items, int) else 10,
+            collection=str(step.get("collection") or "shared"),
+        )
+    out = await execute_tool(step["name"], step.get("arguments") or {})
+    if not out.get("ok"):
+        raise RuntimeError(f"tool {step['name']} failed: {out.get('error')}")
+    return out.get("result")
+
+
+async def run_rule(payload: dict[str, Any]) -> dict[str, Any]:
+    rule_id = int(payload["rule_id"])
+    conn = _db()
+    row = conn.execute("SELECT * FROM automation_rules WHERE id=?", (rule_id,)).fetchone()
+    conn.close()
+    if not row:
+        return {"rule_id": rule_id, "skipped": "missing"}
+    if not row["enabled"]:
+        return {"rule_id": rule_id, "skipped": "disabled"}
+    steps = check_steps(json.loads(row["steps_json"] or "[]"))
+    # 步骤顺序执行；任一步失败则整条规则交给队列重试。
+    results = [await _run_step(step) for step in steps]
+    return {"rule_id": rule_id, "steps": results}
+
+
+JOB_HANDLERS: dict[str, JobHandler] = {
+    "research": run_research_job,
+    "automation_rule": run_rule,
+}
+
+JOB_DEAD_HANDLERS: dict[str, DeadHandler] = {
+    "research": mark_research_dead,
+}
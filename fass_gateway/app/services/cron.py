@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+
+_MACROS = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *",
+}
+_MONTHS = {m: i + 1 for i, m in enumerate(("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"))}
+_DAYS = {d: i for i, d in enumerate(("sun", "mon", "tue", "wed", "thu", "fri", "sat"))}
+
+
+class CronError(ValueError):
+    pass
+
+
+def _parse_field(text: str, lo: int, hi: int, names: dict[str, int] | None = None) -> set[int]:
+    def value(tok: str) -> int:
+        tok = tok.lower()
+        if names and tok in names:
+            return names[tok]
+        try:
+            v = int(tok)
+        except ValueError:
+            raise CronError(f"invalid cron value: {tok}")
+        if not lo <= v <= hi:
+            raise CronError(f"cron value out of range: {tok}")
+        return v
+
+    out: set[int] = set()
+    for part in text.split(","):
+        base, _, step_s = part.partition("/")
+        step = 1
+        if step_s:
+            if not step_s.isdigit() or int(step_s) <= 0:
+                raise CronError(f"invalid cron step: {part}")
+            step = int(step_s)
+        if base == "*":
+            start, end = lo, hi
+        elif "-" in base:
+            a, _, b = base.partition("-")
+            start, end = value(a), value(b)
+            if end < start:
+                raise CronError(f"invalid cron range: {part}")
+        else:
+            start = value(base)
+            end = hi if step_s else start
+        out.update(range(start, end + 1, step))
+    return out
+
+
+class CronExpr:
+    def __init__(self, expr: str) -> None:
+        text = _MACROS.get(expr.strip().lower(), expr.strip())
+        parts = text.split()
+        if len(parts) != 5:
+            raise CronError("cron expression must have 5 fields: minute hour day month weekday")
+        self.expr = expr
+        self.minutes = _parse_field(parts[0], 0, 59)
+        self.hours = _parse_field(parts[1], 0, 23)
+        self.days = _parse_field(parts[2], 1, 31)
+        self.months = _parse_field(parts[3], 1, 12, _MONTHS)
+        # 星期字段允许 7 表示周日。
+        self.weekdays = {d % 7 for d in _parse_field(parts[4], 0, 7, _DAYS)}
+        self._dom_any = parts[2] == "*"
+        self._dow_any = parts[4] == "*"
+
+    def _day_matches(self, t: datetime) -> bool:
+        dom = t.day in self.days
+        dow = (t.weekday() + 1) % 7 in self.weekdays
+        # 与 vixie cron 一致：日与星期都受限时，任一命中即可。
+        if self._dom_any or self._dow_any:
+            return dom and dow
+        return dom or dow
+
+    def next_after(self, ts_ms: int) -> int:
+        t = datetime.fromtimestamp(ts_ms / 1000).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t + timedelta(days=366 * 5)
+        while t < limit:
+            if t.month not in self.months:
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+                continue
+            if not self._day_matches(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+                continue
+            if t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+                continue
+            return int(t.timestamp() * 1000)
+        raise CronError(f"cron expression never fires: {self.expr}")
+
+
+def next_run_ms(expr: str, after_ms: int) -> int:
+    return CronExpr(expr).next_after(after_ms)
@@ -8,27 +8,40 @@ import httpx
 from ..settings import settings
 
 
-@lru_cache(maxsize=1)
-def _load_model():
+EMBEDDING_PROVIDERS = ("local", "openai_compat")
+
+
+def current_model_id() -> str:
+    if settings.embedding_provider == "local":
+        return f"local:{settings.embedding_model_path}"
+    if settings.embedding_provider == "openai_compat":
+        return f"openai_compat:{settings.embedding_model or settings.llm_model or 'default'}"
+    return f"{settings.embedding_provider}:"
+
+
+@lru_cache(maxsize=2)
+def _load_model(model_path: str):
     try:
         from sentence_transformers import SentenceTransformer
     except Exception as e:
         raise RuntimeError("sentence-transformers is required for local embedding") from e
-    return SentenceTransformer(settings.embedding_model_path)
+    return SentenceTransformer(model_path)
 
 
-async def embed_texts(texts: list[str]) -> list[list[float]]:
-    if settings.embedding_provider == "local":
-        model = await asyncio.to_thread(_load_model)
+async def embed_texts(texts: list[str], *, model_id: str | None = None) -> list[list[float]]:
+    provider, _, name = (model_id or current_model_id()).partition(":")
+
+    if provider == "local":
+        model = await asyncio.to_thread(_load_model, name)
         vectors = await asyncio.to_thread(model.encode, texts, normalize_embeddings=True)
         return [v.tolist() for v in vectors]
 
-    if settings.embedding_provider == "openai_compat":
+    if provider == "openai_compat":
         async with httpx.AsyncClient(timeout=120) as client:
             headers = {}
             if settings.llm_api_key:
                 headers["Authorization"] = f"Bearer {settings.llm_api_key}"
-            model = settings.embedding_model or settings.llm_model or "default"
+            model = name or "default"
             base = settings.llm_base_url.rstrip("/")
             resp = await client.post(f"{base}/v1/embeddings", headers=headers, json={"model": model, "input": texts})
             if resp.status_code == 404:
@@ -42,5 +55,5 @@ async def embed_texts(texts: list[str]) -> list[list[float]]:
             data = resp.json()
             return [x["embedding"] for x in data.get("data") or []]
 
-    raise RuntimeError(f"unsupported embedding_provider: {settings.embedding_provider}")
+    raise RuntimeError(f"unsupported embedding_provider: {provider}")
 
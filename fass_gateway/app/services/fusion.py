@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass
+from typing import Any
+
+
+FUSION_STRATEGIES = ("weighted", "rrf")
+
+
+@dataclass(frozen=True)
+class FusionConfig:
+    strategy: str = "weighted"
+    text_weight: float = 0.55
+    vector_weight: float = 0.45
+    rrf_k: float = 60.0
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any], base: FusionConfig | None = None) -> FusionConfig:
+        base = base or cls()
+        strategy = data.get("strategy", base.strategy)
+        if strategy not in FUSION_STRATEGIES:
+            raise ValueError(f"unknown fusion strategy: {strategy}")
+        try:
+            text_weight = float(data.get("text_weight", base.text_weight))
+            vector_weight = float(data.get("vector_weight", base.vector_weight))
+            rrf_k = float(data.get("rrf_k", base.rrf_k))
+        except (TypeError, ValueError):
+            raise ValueError("fusion weights and rrf_k must be numbers")
+        if text_weight < 0 or vector_weight < 0 or rrf_k < 0:
+            raise ValueError("fusion weights and rrf_k must be non-negative")
+        return cls(strategy=str(strategy), text_weight=text_weight, vector_weight=vector_weight, rrf_k=rrf_k)
+
+
+def fuse(
+    text_hits: list[tuple[int, float]],
+    vector_hits: list[tuple[int, float]],
+    config: FusionConfig,
+) -> list[tuple[int, float, str]]:
+    # 两路输入都按得分降序；加权融合先各自按最大值归一化，RRF 只看名次。
+    signals: dict[int, list[Any]] = {}
+    for hits, slot in ((text_hits, 0), (vector_hits, 1)):
+        peak = max((s for _, s in hits), default=0.0) or 1.0
+        for rank, (doc_id, s) in enumerate(hits):
+            sig = signals.setdefault(doc_id, [0.0, 0.0, None, None])
+            sig[slot] = s / peak
+            sig[slot + 2] = rank
+
+    out: list[tuple[int, float, str]] = []
+    for doc_id, (t, v, t_rank, v_rank) in signals.items():
+        if config.strategy == "rrf":
+            score = 0.0
+            if t_rank is not None:
+                score += config.text_weight / (config.rrf_k + t_rank + 1)
+            if v_rank is not None:
+                score += config.vector_weight / (config.rrf_k + v_rank + 1)
+        else:
+            score = t * config.text_weight + v * config.vector_weight
+        if t_rank is not None and v_rank is not None:
+            source = "hybrid"
+        elif t_rank is not None:
+            source = "bm25"
+        else:
+            source = "ann"
+        out.append((doc_id, score, source))
+    out.sort(key=lambda x: x[1], reverse=True)
+    return out
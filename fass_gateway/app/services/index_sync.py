@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import asyncio
+from time import monotonic, perf_counter, time
+from typing import Any
+
+from ..settings import settings
+from .memory import store
+
+
+def _now_ms() -> int:
+    return int(time() * 1000)
+
+
+class IndexSyncWorker:
+    def __init__(self) -> None:
+        self._task: asyncio.Task | None = None
+        self._stop: asyncio.Event | None = None
+        self._wake: asyncio.Event | None = None
+        self.batch_size = settings.index_sync_min_batch
+        self.synced_total = 0
+        self.commits = 0
+        self.last_batch_ms = 0.0
+        self.last_commit_unix_ms: int | None = None
+        self.last_error: str | None = None
+        self._uncommitted = 0
+        self._last_commit = monotonic()
+
+    def start(self) -> None:
+        if self._task and not self._task.done():
+            return
+        self._stop = asyncio.Event()
+        self._wake = asyncio.Event()
+        self._wake.set()
+        store.add_index_listener(self.wake)
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        store.remove_index_listener(self.wake)
+        if self._stop:
+            self._stop.set()
+        if self._wake:
+            self._wake.set()
+        if self._task:
+            try:
+                await self._task
+            except Exception:
+                pass
+
+    def wake(self) -> None:
+        if self._wake:
+            self._wake.set()
+
+    async def _loop(self) -> None:
+        assert self._stop is not None and self._wake is not None
+        while not self._stop.is_set():
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=settings.index_sync_idle_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self._drain()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+        try:
+            self._commit()
+        except Exception:
+            pass
+
+    async def _drain(self) -> None:
+        assert self._stop is not None
+        while not self._stop.is_set():
+            limit = self.batch_size
+            t0 = perf_counter()
+            n = store.sync_indexes(limit=limit, commit=False)
+            self.last_batch_ms = (perf_counter() - t0) * 1000
+            self.synced_total += n
+            self._uncommitted += n
+            self._adapt(n, limit)
+
+            if self._uncommitted >= settings.index_sync_commit_docs or (
+                self._uncommitted and monotonic() - self._last_commit >= settings.index_sync_commit_seconds
+            ):
+                self._commit()
+            if n < limit:
+                break
+            # memoscore 核心内部用 RefCell、不可跨线程调用，只能在事件循环上同步执行；
+            # 因此用批大小把单次占用控制在 index_sync_target_batch_ms 左右，批次之间让出事件循环。
+            await asyncio.sleep(0)
+        # 积压清空后立即提交，保证新写入尽快可检索。
+        self._commit()
+
+    def _adapt(self, n: int, limit: int) -> None:
+        # 按上一批的单条耗时预估下一批大小，使单次同步接近目标耗时；每次最多翻倍，避免偶然的快批跳到上限。
+        if n <= 0:
+            return
+        per_doc_ms = self.last_batch_ms / n
+        target = settings.index_sync_target_batch_ms
+        size = int(target / per_doc_ms) if per_doc_ms > 0 else self.batch_size * 2
+        if n < limit:
+            size = min(size, self.batch_size)
+        size = min(size, self.batch_size * 2)
+        self.batch_size = max(settings.index_sync_min_batch, min(settings.index_sync_max_batch, size))
+
+    def _commit(self) -> None:
+        if not self._uncommitted:
+            return
+        store.commit_indexes()
+        self._uncommitted = 0
+        self._last_commit = monotonic()
+        self.commits += 1
+        self.last_commit_unix_ms = _now_ms()
+
+    def stats(self) -> dict[str, Any]:
+        backlog = store.index_backlog()
+        oldest = backlog.get("oldest_pending_unix_ms")
+        return {
+            "running": bool(self._task and not self._task.done()),
+            "batch_size": self.batch_size,
+            "last_batch_ms": round(self.last_batch_ms, 2),
+            "synced_total": self.synced_total,
+            "commits": self.commits,
+            "last_commit_unix_ms": self.last_commit_unix_ms,
+            "last_error": self.last_error,
+            "backlog": backlog,
+            "lag_ms": max(0, _now_ms() - int(oldest)) if isinstance(oldest, int) else 0,
+        }
+
+
+index_sync_worker = IndexSyncWorker()
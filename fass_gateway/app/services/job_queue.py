@@ -0,0 +1,385 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+import sqlite3
+from dataclasses import dataclass
+from pathlib import Path
+from time import time
+from typing import Any, Awaitable, Callable
+from uuid import uuid4
+
+from ..db import open_db
+from ..settings import settings
+
+
+JOB_STATUSES = ("queued", "running", "done", "dead")
+
+JobHandler = Callable[[dict[str, Any]], Awaitable[Any]]
+# 任务进入死信后的回调（payload, error），用于同步业务表状态。
+DeadHandler = Callable[[dict[str, Any], str], None]
+
+
+def _now_ms() -> int:
+    return int(time() * 1000)
+
+
+def _db():
+    base = Path(__file__).resolve().parents[2]
+    return open_db(str(base / "data" / "fass_gateway.sqlite"))
+
+
+@dataclass
+class Job:
+    id: int
+    kind: str
+    payload: dict[str, Any]
+    attempts: int
+    max_attempts: int
+    priority: int
+    rule_id: int | None = None
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> "Job":
+        try:
+            payload = json.loads(row["payload_json"] or "{}")
+        except Exception:
+            payload = {}
+        return cls(
+            id=int(row["id"]),
+            kind=str(row["kind"]),
+            payload=payload if isinstance(payload, dict) else {},
+            attempts=int(row["attempts"]),
+            max_attempts=int(row["max_attempts"]),
+            priority=int(row["priority"]),
+            rule_id=row["rule_id"],
+        )
+
+
+class JobDeferred(Exception):
+    # 处理器的前置条件暂不满足（如依赖未配置）：推迟执行且不消耗重试次数。
+    def __init__(self, reason: str, delay_seconds: float | None = None) -> None:
+        super().__init__(reason)
+        self.delay_seconds = delay_seconds
+
+
+def retry_delay_ms(attempts: int) -> int:
+    # 指数退避加抖动，避免同一批失败任务同时重试。
+    base = settings.job_queue_retry_base_seconds * (2 ** max(0, attempts - 1))
+    delay = min(base, settings.job_queue_retry_max_seconds)
+    return int(delay * (0.5 + random.random() / 2) * 1000)
+
+
+class JobQueue:
+    def __init__(self) -> None:
+        self.handlers: dict[str, JobHandler] = {}
+        self.dead_handlers: dict[str, DeadHandler] = {}
+        self._workers: list[asyncio.Task] = []
+        self._stop: asyncio.Event | None = None
+        self._wake: asyncio.Event | None = None
+        self._instance = uuid4().hex[:8]
+        self.processed = 0
+        self.failed = 0
+        self.dead_lettered = 0
+        self.deferred = 0
+
+    def register(self, kind: str, fn: JobHandler, *, on_dead: DeadHandler | None = None) -> None:
+        self.handlers[kind] = fn
+        if on_dead is not None:
+            self.dead_handlers[kind] = on_dead
+
+    def _notify_dead(self, jobs: list[tuple[str, dict[str, Any], str]]) -> None:
+        for kind, payload, error in jobs:
+            fn = self.dead_handlers.get(kind)
+            if fn is None:
+                continue
+            try:
+                fn(payload, error)
+            except Exception:
+                pass
+
+    def enqueue(
+        self,
+        kind: str,
+        payload: dict[str, Any],
+        *,
+        priority: int = 0,
+        delay_seconds: float = 0,
+        max_attempts: int | None = None,
+        rule_id: int | None = None,
+        conn: sqlite3.Connection | None = None,
+    ) -> int:
+        # 传入 conn 时与调用方的写入处于同一事务，由调用方提交。
+        now = _now_ms()
+        own = conn is None
+        c = _db() if own else conn
+        cur = c.execute(
+            "INSERT INTO automation_jobs(rule_id, kind, status, priority, max_attempts, run_at_unix_ms, payload_json, created_at_unix_ms, updated_at_unix_ms) VALUES (?, ?, 'queued', ?, ?, ?, ?, ?, ?)",
+            (
+                rule_id,
+                kind,
+                int(priority),
+                int(max_attempts or settings.job_queue_max_attempts),
+                now + int(delay_seconds * 1000),
+                json.dumps(payload, ensure_ascii=False),
+                now,
+                now,
+            ),
+        )
+        job_id = int(cur.lastrowid)
+        if own:
+            c.commit()
+            c.close()
+        self.wake()
+        return job_id
+
+    def claim(self, owner: str, limit: int) -> list[Job]:
+        now = _now_ms()
+        lease_until = now + int(settings.job_queue_lease_seconds * 1000)
+        conn = _db()
+        dead: list[tuple[str, dict[str, Any], str]] = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for r in conn.execute(
+                "SELECT * FROM automation_jobs WHERE status='running' AND lease_expires_unix_ms<? AND attempts>=max_attempts",
+                (now,),
+            ).fetchall():
+                dead.append((str(r["kind"]), Job.from_row(r).payload, str(r["error"] or "lease expired")))
+            # 租约过期说明执行者已崩溃：有剩余次数的放回队列，否则进死信。
+            conn.execute(
+                "UPDATE automation_jobs SET status=CASE WHEN attempts>=max_attempts THEN 'dead' ELSE 'queued' END, error=COALESCE(error, 'lease expired'), lease_owner=NULL, lease_expires_unix_ms=NULL, updated_at_unix_ms=? WHERE status='running' AND lease_expires_unix_ms<?",
+                (now, now),
+            )
+            ids = [
+                int(r["id"])
+                for r in conn.execute(
+                    "SELECT id FROM automation_jobs WHERE status='queued' AND run_at_unix_ms<=? ORDER BY priority DESC, run_at_unix_ms ASC, id ASC LIMIT ?",
+                    (now, int(limit)),
+                ).fetchall()
+            ]
+            if not ids:
+                conn.commit()
+                self._notify_dead(dead)
+                return []
+            marks = ",".join("?" * len(ids))
+            conn.execute(
+                f"UPDATE automation_jobs SET status='running', lease_owner=?, lease_expires_unix_ms=?, attempts=attempts+1, updated_at_unix_ms=? WHERE id IN ({marks})",
+                (owner, lease_until, now, *ids),
+            )
+            rows = conn.execute(
+                f"SELECT * FROM automation_jobs WHERE id IN ({marks}) ORDER BY priority DESC, run_at_unix_ms ASC, id ASC",
+                ids,
+            ).fetchall()
+            conn.commit()
+            self._notify_dead(dead)
+            return [Job.from_row(r) for r in rows]
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def extend_lease(self, owner: str, job_ids: list[int]) -> set[int]:
+        # 返回仍由 owner 持有的任务；不在其中的已被重新领取，不能再执行。
+        if not job_ids:
+            return set()
+        marks = ",".join("?" * len(job_ids))
+        conn = _db()
+        conn.execute(
+            f"UPDATE automation_jobs SET lease_expires_unix_ms=? WHERE lease_owner=? AND status='running' AND id IN ({marks})",
+            (_now_ms() + int(settings.job_queue_lease_seconds * 1000), owner, *job_ids),
+        )
+        owned = {
+            int(r["id"])
+            for r in conn.execute(
+                f"SELECT id FROM automation_jobs WHERE lease_owner=? AND status='running' AND id IN ({marks})",
+                (owner, *job_ids),
+            ).fetchall()
+        }
+        conn.commit()
+        conn.close()
+        return owned
+
+    def complete(self, job: Job, owner: str, result: Any) -> None:
+        conn = _db()
+        conn.execute(
+            "UPDATE automation_jobs SET status='done', result_json=?, error=NULL, lease_owner=NULL, lease_expires_unix_ms=NULL, updated_at_unix_ms=? WHERE id=? AND lease_owner=?",
+            (json.dumps(result, ensure_ascii=False, default=str), _now_ms(), job.id, owner),
+        )
+        conn.commit()
+        conn.close()
+        self.processed += 1
+
+    def fail(self, job: Job, owner: str, error: str, *, retry: bool = True) -> None:
+        now = _now_ms()
+        conn = _db()
+        if retry and job.attempts < job.max_attempts:
+            conn.execute(
+                "UPDATE automation_jobs SET status='queued', run_at_unix_ms=?, error=?, lease_owner=NULL, lease_expires_unix_ms=NULL, updated_at_unix_ms=? WHERE id=? AND lease_owner=?",
+                (now + retry_delay_ms(job.attempts), error, now, job.id, owner),
+            )
+            self.failed += 1
+        else:
+            cur = conn.execute(
+                "UPDATE automation_jobs SET status='dead', error=?, lease_owner=NULL, lease_expires_unix_ms=NULL, updated_at_unix_ms=? WHERE id=? AND lease_owner=?",
+                (error, now, job.id, owner),
+            )
+            self.dead_lettered += 1
+            if cur.rowcount:
+                conn.commit()
+                conn.close()
+                self._notify_dead([(job.kind, job.payload, error)])
+                return
+        conn.commit()
+        conn.close()
+
+    def defer(self, job: Job, owner: str, reason: str, delay_seconds: float | None = None) -> None:
+        # 退回本次领取时加的 attempts，任务保持 queued 等待条件满足。
+        now = _now_ms()
+        delay = settings.job_queue_idle_seconds if delay_seconds is None else delay_seconds
+        conn = _db()
+        conn.execute(
+            "UPDATE automation_jobs SET status='queued', attempts=MAX(0, attempts-1), run_at_unix_ms=?, error=?, lease_owner=NULL, lease_expires_unix_ms=NULL, updated_at_unix_ms=? WHERE id=? AND lease_owner=?",
+            (now + int(delay * 1000), reason, now, job.id, owner),
+        )
+        conn.commit()
+        conn.close()
+        self.deferred += 1
+
+    def requeue(self, job_id: int) -> bool:
+        # 死信任务人工重放：清零重试次数并立即入队。
+        now = _now_ms()
+        conn = _db()
+        cur = conn.execute(
+            "UPDATE automation_jobs SET status='queued', attempts=0, run_at_unix_ms=?, error=NULL, updated_at_unix_ms=? WHERE id=? AND status='dead'",
+            (now, now, job_id),
+        )
+        conn.commit()
+        conn.close()
+        if cur.rowcount:
+            self.wake()
+        return bool(cur.rowcount)
+
+    def next_wakeup_ms(self) -> int | None:
+        conn = _db()
+        queued = conn.execute("SELECT MIN(run_at_unix_ms) FROM automation_jobs WHERE status='queued'").fetchone()[0]
+        leased = conn.execute("SELECT MIN(lease_expires_unix_ms) FROM automation_jobs WHERE status='running'").fetchone()[0]
+        conn.close()
+        candidates = [int(v) for v in (queued, leased) if v is not None]
+        return min(candidates) if candidates else None
+
+    def wake(self) -> None:
+        if self._wake is not None:
+            self._wake.set()
+
+    def start(self, handlers: dict[str, JobHandler] | None = None, dead_handlers: dict[str, DeadHandler] | None = None) -> None:
+        if any(not t.done() for t in self._workers):
+            return
+        for kind, fn in (handlers or {}).items():
+            self.register(kind, fn, on_dead=(dead_handlers or {}).get(kind))
+        self._stop = asyncio.Event()
+        self._wake = asyncio.Event()
+        self._workers = [
+            asyncio.create_task(self._worker(f"{self._instance}-{i}")) for i in range(max(1, settings.job_queue_workers))
+        ]
+
+    async def stop(self) -> None:
+        if self._stop:
+            self._stop.set()
+        self.wake()
+        for t in self._workers:
+            t.cancel()
+        for t in self._workers:
+            try:
+                await t
+            except BaseException:
+                pass
+        self._workers = []
+
+    async def _worker(self, owner: str) -> None:
+        assert self._stop is not None and self._wake is not None
+        while not self._stop.is_set():
+            try:
+                jobs = self.claim(owner, max(1, settings.job_queue_claim_batch))
+            except Exception:
+                jobs = []
+            if jobs:
+                await self._run_batch(owner, jobs)
+                continue
+            try:
+                nxt = self.next_wakeup_ms()
+            except Exception:
+                nxt = None
+            idle = settings.job_queue_idle_seconds
+            delay = idle if nxt is None else min(max((nxt - _now_ms()) / 1000, 0.05), idle)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def _run_batch(self, owner: str, jobs: list[Job]) -> None:
+        pending = [j.id for j in jobs]
+
+        async def _heartbeat() -> None:
+            # 批内尚未执行完的任务（包括还在排队等待的）统一续约；单次失败不能让心跳停止。
+            while True:
+                await asyncio.sleep(max(0.05, settings.job_queue_lease_seconds / 3))
+                try:
+                    self.extend_lease(owner, list(pending))
+                except Exception:
+                    pass
+
+        hb = asyncio.create_task(_heartbeat())
+        try:
+            for job in jobs:
+                # 开始前确认租约仍在：若已过期被其他 worker 领取则跳过，避免同一任务执行两次。
+                try:
+                    owned = self.extend_lease(owner, list(pending))
+                except Exception:
+                    owned = set(pending)
+                if job.id in owned:
+                    await self._run_one(owner, job)
+                pending.remove(job.id)
+        finally:
+            hb.cancel()
+
+    async def _run_one(self, owner: str, job: Job) -> None:
+        handler = self.handlers.get(job.kind)
+        if handler is None:
+            self.fail(job, owner, f"unknown job kind: {job.kind}", retry=False)
+            return
+        try:
+            result = await asyncio.wait_for(handler(job.payload), timeout=settings.job_queue_timeout_seconds)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            self.fail(job, owner, f"timeout after {settings.job_queue_timeout_seconds}s")
+            return
+        except JobDeferred as e:
+            self.defer(job, owner, str(e), e.delay_seconds)
+            return
+        except Exception as e:
+            self.fail(job, owner, f"{type(e).__name__}: {e}")
+            return
+        self.complete(job, owner, result)
+
+    def stats(self) -> dict[str, Any]:
+        conn = _db()
+        rows = conn.execute("SELECT kind, status, COUNT(*) AS n FROM automation_jobs GROUP BY kind, status").fetchall()
+        conn.close()
+        counts: dict[str, dict[str, int]] = {}
+        for r in rows:
+            counts.setdefault(str(r["kind"]), {})[str(r["status"])] = int(r["n"])
+        return {
+            "workers": sum(1 for t in self._workers if not t.done()),
+            "processed": self.processed,
+            "failed_attempts": self.failed,
+            "dead_lettered": self.dead_lettered,
+            "deferred": self.deferred,
+            "jobs": counts,
+        }
+
+
+job_queue = JobQueue()
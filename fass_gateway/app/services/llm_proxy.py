@@ -1,9 +1,9 @@
 from __future__ import annotations
 
-from typing import Any
+from typing import Any, AsyncIterator
 
 from .model_defaults import get_defaults
-from .newapi_client import UpstreamError, chat_completions, list_models
+from .newapi_client import UpstreamError, chat_completions, chat_completions_stream, list_models
 from .upstream_config import get_upstreams
 
 
@@ -26,3 +26,16 @@ async def proxy_chat_completions(payload: dict[str, Any]) -> dict:
     except UpstreamError as e:
         raise RuntimeError(f"{e.detail} (request_id={e.request_id})")
 
+
+
+async def proxy_chat_completions_stream(payload: dict[str, Any]) -> AsyncIterator[str]:
+    p = dict(payload or {})
+    defaults = get_defaults()
+    if not p.get("model") and defaults.chat_model_id:
+        p["model"] = defaults.chat_model_id
+    cfg = get_upstreams()
+    try:
+        async for piece in chat_completions_stream(p, base_url=cfg.newapi.base_url, api_key=cfg.newapi.api_key):
+            yield piece
+    except UpstreamError as e:
+        raise RuntimeError(f"{e.detail} (request_id={e.request_id})")
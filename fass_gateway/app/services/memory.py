@@ -1,27 +1,138 @@
 from __future__ import annotations
 
+import hashlib
+import html
+import json
+import re
+import struct
+import sys
+from array import array
+from collections import OrderedDict
 from pathlib import Path
-from typing import Any
-from time import time
+from typing import Any, Callable
+from time import monotonic, time
 
 from ..settings import settings
-from .embedding import embed_texts
+from .embedding import EMBEDDING_PROVIDERS, current_model_id, embed_texts
 from .file_store import write_text
+from .fusion import FusionConfig, fuse
+
+
+EMBEDDING_DTYPES = ("f32", "f16", "i8")
+SEARCH_FIELDS = ("id", "collection", "path", "content", "snippet", "score", "source")
+DEFAULT_SEARCH_FIELDS = ("id", "collection", "path", "content", "score", "source")
+_FALLBACK_SOURCES = {"bm25": "fallback", "ann": "fallback_vector", "hybrid": "fallback_hybrid"}
 
 
 def _default_store_dir() -> Path:
     return Path(__file__).resolve().parents[2] / "data" / "memoscore"
 
+
+def encode_embedding(vec: list[float], dtype: str = "f32") -> bytes:
+    if dtype == "f32":
+        a = array("f", (float(x) for x in vec))
+        if sys.byteorder != "little":
+            a.byteswap()
+        return a.tobytes()
+    if dtype == "f16":
+        return struct.pack(f"<{len(vec)}e", *(float(x) for x in vec))
+    if dtype == "i8":
+        peak = max((abs(float(x)) for x in vec), default=0.0)
+        scale = peak / 127.0 if peak > 0 else 1.0
+        q = array("b", (max(-127, min(127, round(float(x) / scale))) for x in vec))
+        return struct.pack("<f", scale) + q.tobytes()
+    raise ValueError(f"unsupported embedding dtype: {dtype}")
+
+
+def decode_embedding(blob: bytes, dtype: str | None = "f32") -> list[float]:
+    dtype = dtype or "f32"
+    if dtype == "f32":
+        a = array("f")
+        a.frombytes(blob)
+        if sys.byteorder != "little":
+            a.byteswap()
+        return a.tolist()
+    if dtype == "f16":
+        return list(struct.unpack(f"<{len(blob) // 2}e", blob))
+    if dtype == "i8":
+        (scale,) = struct.unpack_from("<f", blob)
+        q = array("b")
+        q.frombytes(blob[4:])
+        return [x * scale for x in q]
+    raise ValueError(f"unsupported embedding dtype: {dtype}")
+
+
+def check_search_fields(fields: list[str] | None) -> tuple[str, ...]:
+    if fields is None:
+        return DEFAULT_SEARCH_FIELDS
+    unknown = [f for f in fields if f not in SEARCH_FIELDS]
+    if unknown:
+        raise ValueError(f"unknown search field: {unknown[0]}")
+    return tuple(dict.fromkeys(fields))
+
+
+def make_snippet(content: str, query_text: str | None, max_chars: int = 240) -> str:
+    terms = sorted({t for t in re.split(r"\W+", (query_text or "").lower()) if t}, key=len, reverse=True)
+    low = content.lower()
+    hits = [i for i in (low.find(t) for t in terms) if i >= 0]
+    start = max(0, min(hits) - max_chars // 4) if hits else 0
+    window = html.escape(content[start : start + max_chars])
+    if not terms:
+        return window
+    pattern = re.compile("|".join(re.escape(html.escape(t)) for t in terms), re.IGNORECASE)
+    return pattern.sub(lambda m: f"<b>{m.group(0)}</b>", window)
+
+
+class _TTLCache:
+    def __init__(self, capacity: int, ttl_seconds: float) -> None:
+        self.capacity = capacity
+        self.ttl_seconds = ttl_seconds
+        self._items: OrderedDict[Any, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Any) -> Any | None:
+        item = self._items.get(key)
+        if item is None or item[0] < monotonic():
+            if item is not None:
+                del self._items[key]
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def put(self, key: Any, value: Any) -> None:
+        if self.capacity <= 0:
+            return
+        self._items[key] = (monotonic() + self.ttl_seconds, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.capacity:
+            self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        self._items.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {"size": len(self._items), "hits": self.hits, "misses": self.misses}
+
+
+def _normalize_query(text: str | None) -> str:
+    return " ".join((text or "").split())
+
+
 class _FallbackCore:
-    def __init__(self, db_path: Path) -> None:
+    def __init__(self, db_path: Path, *, embedding_dtype: str = "f32") -> None:
         import sqlite3
         import json
 
+        if embedding_dtype not in EMBEDDING_DTYPES:
+            raise ValueError(f"unsupported embedding dtype: {embedding_dtype}")
         db_path.parent.mkdir(parents=True, exist_ok=True)
         self.conn = sqlite3.connect(db_path, check_same_thread=False)
         self.conn.row_factory = sqlite3.Row
         self.conn.execute("PRAGMA journal_mode=WAL;")
-        self.conn.execute(
+        self.conn.executescript(
             """
 CREATE TABLE IF NOT EXISTS documents (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -29,89 +140,301 @@ CREATE TABLE IF NOT EXISTS documents (
   path TEXT NOT NULL,
   content TEXT NOT NULL,
   embedding_json TEXT,
+  embedding_blob BLOB,
+  embedding_dim INTEGER,
+  embedding_model TEXT,
+  embedding_dtype TEXT,
+  updated_at_unix_ms INTEGER,
   UNIQUE(collection, path)
 );
+
+CREATE TABLE IF NOT EXISTS embedding_staging (
+  doc_id INTEGER PRIMARY KEY,
+  embedding_model TEXT NOT NULL,
+  embedding_dim INTEGER NOT NULL,
+  embedding_dtype TEXT NOT NULL,
+  embedding_blob BLOB NOT NULL
+);
 """
         )
         cols = {r["name"] for r in self.conn.execute("PRAGMA table_info(documents)").fetchall()}
         if "embedding_json" not in cols:
             self.conn.execute("ALTER TABLE documents ADD COLUMN embedding_json TEXT")
+        for name, ty in (("embedding_blob", "BLOB"), ("embedding_dim", "INTEGER"), ("embedding_model", "TEXT"), ("embedding_dtype", "TEXT"), ("updated_at_unix_ms", "INTEGER")):
+            if name not in cols:
+                self.conn.execute(f"ALTER TABLE documents ADD COLUMN {name} {ty}")
         self._json = json
+        self.embedding_dtype = embedding_dtype
         self.conn.commit()
+        self._migrate_embedding_json()
+
+    def _migrate_embedding_json(self, batch_size: int = 500) -> int:
+        migrated = 0
+        while True:
+            rows = self.conn.execute(
+                "SELECT id, embedding_json FROM documents WHERE embedding_json IS NOT NULL AND embedding_blob IS NULL LIMIT ?",
+                (batch_size,),
+            ).fetchall()
+            if not rows:
+                return migrated
+            for r in rows:
+                try:
+                    emb = self._json.loads(r["embedding_json"])
+                except Exception:
+                    emb = None
+                if isinstance(emb, list) and emb:
+                    self.conn.execute(
+                        "UPDATE documents SET embedding_blob=?, embedding_dim=?, embedding_dtype=?, embedding_json=NULL WHERE id=?",
+                        (encode_embedding(emb, self.embedding_dtype), len(emb), self.embedding_dtype, int(r["id"])),
+                    )
+                    migrated += 1
+                else:
+                    self.conn.execute("UPDATE documents SET embedding_json=NULL WHERE id=?", (int(r["id"]),))
+            self.conn.commit()
 
     def upsert_documents(self, collection: str, docs: list[dict[str, Any]]) -> int:
         changed = 0
         for d in docs:
-            emb_json = None
+            emb_blob = None
+            emb_dim = None
+            emb_dtype = None
+            emb_model = None
             if d.get("embedding") is not None:
-                emb_json = self._json.dumps(d["embedding"])
+                emb_blob = encode_embedding(d["embedding"], self.embedding_dtype)
+                emb_dim = len(d["embedding"])
+                emb_dtype = self.embedding_dtype
+                emb_model = d.get("embedding_model")
             self.conn.execute(
                 """
-INSERT INTO documents(collection, path, content, embedding_json) VALUES (?, ?, ?, ?)
-ON CONFLICT(collection, path) DO UPDATE SET content=excluded.content, embedding_json=excluded.embedding_json
+INSERT INTO documents(collection, path, content, embedding_json, embedding_blob, embedding_dim, embedding_model, embedding_dtype, updated_at_unix_ms)
+VALUES (?, ?, ?, NULL, ?, ?, ?, ?, ?)
+ON CONFLICT(collection, path) DO UPDATE SET
+  content=excluded.content,
+  embedding_json=NULL,
+  embedding_blob=excluded.embedding_blob,
+  embedding_dim=excluded.embedding_dim,
+  embedding_model=excluded.embedding_model,
+  embedding_dtype=excluded.embedding_dtype,
+  updated_at_unix_ms=excluded.updated_at_unix_ms
 """,
-                (collection, d["path"], d["content"], emb_json),
+                (collection, d["path"], d["content"], emb_blob, emb_dim, emb_model, emb_dtype, d.get("updated_at_unix_ms")),
+            )
+            self.conn.execute(
+                "DELETE FROM embedding_staging WHERE doc_id=(SELECT id FROM documents WHERE collection=? AND path=?)",
+                (collection, d["path"]),
             )
             changed += 1
         self.conn.commit()
         return changed
 
-    def search(self, collection: str | None, query_text: str | None, query_vec: list[float] | None, top_k: int) -> list[dict[str, Any]]:
-        if not query_text:
-            return []
-        if query_vec:
-            if collection:
-                rows = self.conn.execute(
-                    "SELECT id, collection, path, content, embedding_json FROM documents WHERE collection=? AND embedding_json IS NOT NULL",
-                    (collection,),
-                ).fetchall()
-            else:
-                rows = self.conn.execute(
-                    "SELECT id, collection, path, content, embedding_json FROM documents WHERE embedding_json IS NOT NULL"
-                ).fetchall()
-
-            qn = sum(float(x) * float(x) for x in query_vec) ** 0.5 or 1.0
-            scored: list[tuple[float, Any]] = []
-            for r in rows:
-                try:
-                    emb = self._json.loads(r["embedding_json"])
-                except Exception:
-                    continue
-                if not isinstance(emb, list) or not emb:
+    def list_reembed_candidates(self, collection: str, embedding_model: str, limit: int = 64) -> list[dict[str, Any]]:
+        rows = self.conn.execute(
+            """
+SELECT d.id, d.path, d.content, d.updated_at_unix_ms FROM documents d
+LEFT JOIN embedding_staging s ON s.doc_id=d.id AND s.embedding_model=?
+WHERE d.collection=? AND (d.embedding_model IS NULL OR d.embedding_model!=?) AND s.doc_id IS NULL
+ORDER BY d.id ASC LIMIT ?
+""",
+            (embedding_model, collection, embedding_model, int(limit)),
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    def stage_embeddings(self, embedding_model: str, items: list[dict[str, Any]]) -> int:
+        staged = 0
+        for it in items:
+            emb = it["embedding"]
+            cur = self.conn.execute(
+                """
+INSERT OR REPLACE INTO embedding_staging(doc_id, embedding_model, embedding_dim, embedding_dtype, embedding_blob)
+SELECT id, ?, ?, ?, ? FROM documents WHERE id=? AND updated_at_unix_ms IS ?
+""",
+                (embedding_model, len(emb), self.embedding_dtype, encode_embedding(emb, self.embedding_dtype), int(it["id"]), it.get("updated_at_unix_ms")),
+            )
+            staged += int(cur.rowcount or 0)
+        self.conn.commit()
+        return staged
+
+    def promote_embeddings(self, collection: str, embedding_model: str) -> int:
+        cur = self.conn.execute(
+            """
+UPDATE documents SET
+  embedding_blob=(SELECT s.embedding_blob FROM embedding_staging s WHERE s.doc_id=documents.id),
+  embedding_dim=(SELECT s.embedding_dim FROM embedding_staging s WHERE s.doc_id=documents.id),
+  embedding_dtype=(SELECT s.embedding_dtype FROM embedding_staging s WHERE s.doc_id=documents.id),
+  embedding_model=?
+WHERE collection=? AND id IN (SELECT doc_id FROM embedding_staging WHERE embedding_model=?)
+""",
+            (embedding_model, collection, embedding_model),
+        )
+        self.conn.execute(
+            "DELETE FROM embedding_staging WHERE embedding_model=? AND doc_id IN (SELECT id FROM documents WHERE collection=?)",
+            (embedding_model, collection),
+        )
+        self.conn.commit()
+        return int(cur.rowcount or 0)
+
+    def _hydrate(
+        self,
+        batches: list[list[tuple[int, float, str]]],
+        fields: tuple[str, ...],
+        queries: list[str],
+        snippet_chars: int,
+    ) -> list[list[dict[str, Any]]]:
+        ids = sorted({doc_id for scored in batches for doc_id, _, _ in scored})
+        if not ids:
+            return [[] for _ in batches]
+        need_content = "content" in fields or "snippet" in fields
+        placeholders = ",".join("?" for _ in ids)
+        rows = self.conn.execute(
+            f"SELECT id, collection, path, {'content' if need_content else 'NULL AS content'} FROM documents WHERE id IN ({placeholders})",
+            tuple(ids),
+        ).fetchall()
+        by_id = {int(r["id"]): r for r in rows}
+        out: list[list[dict[str, Any]]] = []
+        for scored, query_text in zip(batches, queries):
+            items: list[dict[str, Any]] = []
+            for doc_id, score, source in scored:
+                r = by_id.get(doc_id)
+                if r is None:
                     continue
-                dn = sum(float(x) * float(x) for x in emb) ** 0.5 or 1.0
-                dot = 0.0
-                for a, b in zip(query_vec, emb):
-                    dot += float(a) * float(b)
-                score = dot / (qn * dn)
-                scored.append((score, r))
-            scored.sort(key=lambda x: x[0], reverse=True)
-            out = []
-            for score, r in scored[:top_k]:
-                out.append(
-                    {
-                        "id": int(r["id"]),
-                        "collection": r["collection"],
-                        "path": r["path"],
-                        "content": r["content"],
-                        "score": float(score),
-                        "source": "fallback_vector",
-                    }
-                )
-            return out
+                full = {"id": doc_id, "collection": r["collection"], "path": r["path"], "content": r["content"], "score": float(score), "source": source}
+                if "snippet" in fields:
+                    full["snippet"] = make_snippet(r["content"] or "", query_text, snippet_chars)
+                items.append({k: full[k] for k in fields})
+            out.append(items)
+        return out
 
-        q = f"%{query_text}%"
+    def _text_hits(self, collection: str | None, query_text: str, limit: int) -> list[tuple[int, float]]:
+        # LIKE 没有相关性分值，用子串出现次数近似 BM25 的词频信号。
+        needle = query_text.lower()
+        where = ["instr(lower(content), ?) > 0"]
+        params: list[Any] = [needle, len(needle), needle]
         if collection:
-            rows = self.conn.execute(
-                "SELECT id, collection, path, content FROM documents WHERE collection=? AND content LIKE ? LIMIT ?",
-                (collection, q, top_k),
-            ).fetchall()
-        else:
-            rows = self.conn.execute(
-                "SELECT id, collection, path, content FROM documents WHERE content LIKE ? LIMIT ?",
-                (q, top_k),
-            ).fetchall()
-        return [{"id": int(r["id"]), "collection": r["collection"], "path": r["path"], "content": r["content"], "score": 1.0, "source": "fallback"} for r in rows]
+            where.append("collection=?")
+            params.append(collection)
+        rows = self.conn.execute(
+            "SELECT id, (length(lower(content)) - length(replace(lower(content), ?, ''))) / ? AS hits FROM documents "
+            f"WHERE {' AND '.join(where)} ORDER BY hits DESC, id LIMIT ?",
+            (*params, limit),
+        ).fetchall()
+        return [(int(r["id"]), float(r["hits"] or 1)) for r in rows]
+
+    def _vector_hits(
+        self,
+        collection: str | None,
+        query_vecs: list[list[float]],
+        embedding_model: str | None,
+        limit: int,
+    ) -> list[list[tuple[int, float]]]:
+        # 候选向量只读取、解码一次，所有查询共用；有 numpy 时走矩阵乘法。
+        dim = len(query_vecs[0])
+        where = ["embedding_blob IS NOT NULL", "embedding_dim=?"]
+        params: list[Any] = [dim]
+        if collection:
+            where.append("collection=?")
+            params.append(collection)
+        if embedding_model:
+            where.append("(embedding_model IS NULL OR embedding_model=?)")
+            params.append(embedding_model)
+        rows = self.conn.execute(
+            f"SELECT id, embedding_blob, embedding_dtype FROM documents WHERE {' AND '.join(where)}",
+            tuple(params),
+        ).fetchall()
+        ids: list[int] = []
+        embs: list[list[float]] = []
+        for r in rows:
+            try:
+                emb = decode_embedding(r["embedding_blob"], r["embedding_dtype"])
+            except Exception:
+                continue
+            if len(emb) == dim:
+                ids.append(int(r["id"]))
+                embs.append(emb)
+        if not ids:
+            return [[] for _ in query_vecs]
+
+        try:
+            import numpy as np
+        except Exception:
+            np = None
+
+        if np is not None:
+            d = np.asarray(embs, dtype=np.float32)
+            d /= np.maximum(np.linalg.norm(d, axis=1, keepdims=True), 1e-12)
+            q = np.asarray(query_vecs, dtype=np.float32)
+            q /= np.maximum(np.linalg.norm(q, axis=1, keepdims=True), 1e-12)
+            sims = q @ d.T
+            out: list[list[tuple[int, float]]] = []
+            for row in sims:
+                top = np.argsort(-row)[:limit]
+                # 与 memoscore 一致，把相似度映射到非负区间后再参与融合。
+                out.append([(ids[i], (1.0 + float(row[i])) / 2.0) for i in top])
+            return out
+
+        norms = [sum(x * x for x in e) ** 0.5 or 1.0 for e in embs]
+        out = []
+        for vec in query_vecs:
+            qn = sum(float(x) * float(x) for x in vec) ** 0.5 or 1.0
+            scored = []
+            for doc_id, emb, dn in zip(ids, embs, norms):
+                dot = 0.0
+                for a, b in zip(vec, emb):
+                    dot += float(a) * b
+                scored.append((doc_id, (1.0 + dot / (qn * dn)) / 2.0))
+            scored.sort(key=lambda x: x[1], reverse=True)
+            out.append(scored[:limit])
+        return out
+
+    def search(
+        self,
+        collection: str | None,
+        query_text: str | None,
+        query_vec: list[float] | None,
+        top_k: int,
+        embedding_model: str | None = None,
+        fields: list[str] | None = None,
+        snippet_chars: int = 240,
+        fusion: FusionConfig | None = None,
+    ) -> list[dict[str, Any]]:
+        if not query_text:
+            check_search_fields(fields)
+            return []
+        return self.search_batch(collection, [query_text], [query_vec], top_k, embedding_model, fields, snippet_chars, fusion)[0]
+
+    def search_batch(
+        self,
+        collection: str | None,
+        queries: list[str],
+        query_vecs: list[list[float] | None] | None,
+        top_k: int,
+        embedding_model: str | None = None,
+        fields: list[str] | None = None,
+        snippet_chars: int = 240,
+        fusion: FusionConfig | None = None,
+    ) -> list[list[dict[str, Any]]]:
+        selected = check_search_fields(fields)
+        fusion = fusion or FusionConfig()
+        fetch = max(top_k * 4, top_k)
+        vecs = list(query_vecs or [None] * len(queries))
+
+        # 同维度的查询向量一起打分；缺失向量的查询只走文本检索。
+        vector_hits: list[list[tuple[int, float]]] = [[] for _ in queries]
+        by_dim: dict[int, list[int]] = {}
+        for i, v in enumerate(vecs):
+            if v and queries[i]:
+                by_dim.setdefault(len(v), []).append(i)
+        for idxs in by_dim.values():
+            for i, hits in zip(idxs, self._vector_hits(collection, [vecs[i] for i in idxs], embedding_model, fetch)):
+                vector_hits[i] = hits
+
+        batches: list[list[tuple[int, float, str]]] = []
+        for i, q in enumerate(queries):
+            if not q:
+                batches.append([])
+                continue
+            merged = fuse(self._text_hits(collection, q, fetch), vector_hits[i], fusion)[:top_k]
+            batches.append([(doc_id, score, _FALLBACK_SOURCES[source]) for doc_id, score, source in merged])
+        return self._hydrate(batches, selected, queries, snippet_chars)
 
 
 class MemoryStore:
@@ -119,6 +442,15 @@ class MemoryStore:
         self.store_dir = store_dir or _default_store_dir()
         self.store_dir.mkdir(parents=True, exist_ok=True)
         self._core = None
+        self._models_path = self.store_dir / "embedding_models.json"
+        self._models: dict[str, str] | None = None
+        self._fusion_path = self.store_dir / "fusion_presets.json"
+        self._fusion_presets: dict[str, FusionConfig] | None = None
+        # 结果缓存以集合 generation 作为键的一部分：写入/索引同步后自增，旧条目自然失效。
+        self._generations: dict[str | None, int] = {}
+        self._search_cache = _TTLCache(settings.memory_search_cache_size, settings.memory_search_cache_ttl_seconds)
+        self._embed_cache = _TTLCache(settings.memory_search_cache_size, settings.memory_search_cache_ttl_seconds)
+        self._index_listeners: list[Callable[[], None]] = []
 
     def _get_core(self):
         if self._core is not None:
@@ -126,11 +458,151 @@ class MemoryStore:
         try:
             import memoscore  # type: ignore
 
-            self._core = memoscore.MemosCore(str(self.store_dir), 768, 200_000)
+            self._core = memoscore.MemosCore(str(self.store_dir), int(settings.embedding_dim), 200_000)
         except Exception:
-            self._core = _FallbackCore(self.store_dir / "fallback.sqlite")
+            self._core = _FallbackCore(self.store_dir / "fallback.sqlite", embedding_dtype=settings.embedding_storage_dtype)
         return self._core
 
+    def _load_models(self) -> dict[str, str]:
+        if self._models is None:
+            try:
+                data = json.loads(self._models_path.read_text(encoding="utf-8"))
+            except Exception:
+                data = {}
+            self._models = {str(k): str(v) for k, v in data.items()} if isinstance(data, dict) else {}
+        return self._models
+
+    def _generation(self, collection: str | None) -> int:
+        return self._generations.get(collection, 0)
+
+    def bump_generation(self, collection: str | None) -> None:
+        if collection is not None:
+            self._generations[collection] = self._generations.get(collection, 0) + 1
+        self._generations[None] = self._generations.get(None, 0) + 1
+        if collection is None:
+            self._search_cache.clear()
+
+    def add_index_listener(self, cb: Callable[[], None]) -> None:
+        if cb not in self._index_listeners:
+            self._index_listeners.append(cb)
+
+    def remove_index_listener(self, cb: Callable[[], None]) -> None:
+        if cb in self._index_listeners:
+            self._index_listeners.remove(cb)
+
+    def _notify_index(self) -> None:
+        for cb in list(self._index_listeners):
+            try:
+                cb()
+            except Exception:
+                pass
+
+    def cache_stats(self) -> dict[str, dict[str, int]]:
+        return {"search": self._search_cache.stats(), "embedding": self._embed_cache.stats()}
+
+    def _save_models(self) -> None:
+        tmp = self._models_path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(self._load_models(), ensure_ascii=False, indent=2), encoding="utf-8")
+        tmp.replace(self._models_path)
+
+    def serving_model(self, collection: str | None) -> str:
+        if collection:
+            model = self._load_models().get(collection)
+            if model:
+                return model
+        return current_model_id()
+
+    def set_serving_model(self, collection: str, model_id: str) -> None:
+        models = self._load_models()
+        if models.get(collection) == model_id:
+            return
+        models[collection] = model_id
+        self._save_models()
+        self.bump_generation(collection)
+
+    def default_fusion(self) -> FusionConfig:
+        return FusionConfig.from_dict(
+            {
+                "strategy": settings.memory_fusion,
+                "text_weight": settings.memory_fusion_text_weight,
+                "vector_weight": settings.memory_fusion_vector_weight,
+                "rrf_k": settings.memory_fusion_rrf_k,
+            }
+        )
+
+    def fusion_presets(self) -> dict[str, FusionConfig]:
+        if self._fusion_presets is None:
+            try:
+                data = json.loads(self._fusion_path.read_text(encoding="utf-8"))
+            except Exception:
+                data = {}
+            presets: dict[str, FusionConfig] = {}
+            for col, raw in (data.items() if isinstance(data, dict) else []):
+                try:
+                    presets[str(col)] = FusionConfig.from_dict(raw if isinstance(raw, dict) else {})
+                except ValueError:
+                    continue
+            self._fusion_presets = presets
+        return self._fusion_presets
+
+    def set_fusion_preset(self, collection: str, config: FusionConfig | None) -> None:
+        presets = self.fusion_presets()
+        if config is None:
+            if presets.pop(collection, None) is None:
+                return
+        else:
+            presets[collection] = config
+        tmp = self._fusion_path.with_suffix(".json.tmp")
+        tmp.write_text(
+            json.dumps({k: v.to_dict() for k, v in presets.items()}, ensure_ascii=False, indent=2),
+            encoding="utf-8",
+        )
+        tmp.replace(self._fusion_path)
+        self.bump_generation(collection)
+
+    def fusion_for(self, collection: str | None) -> FusionConfig:
+        if collection:
+            preset = self.fusion_presets().get(collection)
+            if preset is not None:
+                return preset
+        return self.default_fusion()
+
+    async def embed_query(self, query: str, *, collection: str | None) -> list[float] | None:
+        model_id = self.serving_model(collection)
+        key = (model_id, _normalize_query(query))
+        cached = self._embed_cache.get(key)
+        if cached is not None:
+            return list(cached)
+        try:
+            vec = (await embed_texts([query], model_id=model_id))[0]
+        except Exception:
+            return None
+        self._embed_cache.put(key, tuple(vec))
+        return vec
+
+    async def embed_queries(self, queries: list[str], *, collection: str | None) -> list[list[float] | None]:
+        model_id = self.serving_model(collection)
+        keys = [(model_id, _normalize_query(q)) for q in queries]
+        out: list[list[float] | None] = []
+        missing: dict[tuple[str, str], list[int]] = {}
+        for i, key in enumerate(keys):
+            cached = self._embed_cache.get(key)
+            out.append(list(cached) if cached is not None else None)
+            if cached is None:
+                missing.setdefault(key, []).append(i)
+        if not missing:
+            return out
+        todo = list(missing)
+        try:
+            vecs = await embed_texts([queries[missing[k][0]] for k in todo], model_id=model_id)
+        except Exception:
+            return out
+        for key, vec in zip(todo, vecs):
+            self._embed_cache.put(key, tuple(vec))
+            for i in missing[key]:
+                out[i] = list(vec)
+        return out
+
     async def upsert_texts(self, collection: str, items: list[dict[str, Any]]) -> int:
         docs: list[dict[str, Any]] = []
         contents: list[str] = []
@@ -146,30 +618,228 @@ class MemoryStore:
                 except Exception:
                     pass
 
-        try:
-            embeddings = await embed_texts(contents)
-            for d, e in zip(docs, embeddings, strict=True):
-                d["embedding"] = e
-        except Exception:
-            pass
+        if settings.embedding_provider in EMBEDDING_PROVIDERS:
+            model_id = self.serving_model(collection)
+            try:
+                embeddings = await embed_texts(contents, model_id=model_id)
+                for d, e in zip(docs, embeddings, strict=True):
+                    d["embedding"] = e
+                    d["embedding_model"] = model_id
+                self.set_serving_model(collection, model_id)
+            except Exception:
+                pass
 
         core = self._get_core()
-        return int(core.upsert_documents(collection, docs))
+        changed = int(core.upsert_documents(collection, docs))
+        if changed:
+            self.bump_generation(collection)
+            self._notify_index()
+        return changed
 
-    def sync_indexes(self, limit: int = 200) -> int:
+    def sync_indexes(self, limit: int = 200, *, commit: bool = True) -> int:
         core = self._get_core()
         fn = getattr(core, "sync_index_tasks", None)
         if not fn:
             return 0
         try:
-            return int(fn(limit))
+            changed = int(fn(limit, commit))
         except Exception:
             return 0
+        if changed and commit:
+            # 同步不区分集合，整体失效。
+            self.bump_generation(None)
+        return changed
+
+    def commit_indexes(self) -> int:
+        fn = getattr(self._get_core(), "commit_indexes", None)
+        if not fn:
+            return 0
+        committed = int(fn())
+        if committed:
+            self.bump_generation(None)
+        return committed
+
+    def index_backlog(self) -> dict[str, Any]:
+        fn = getattr(self._get_core(), "index_backlog", None)
+        if not fn:
+            return {"pending": 0, "failed": 0, "staged": 0, "oldest_pending_unix_ms": None}
+        return dict(fn())
+
+    def vector_dim(self) -> int | None:
+        # memoscore 的 USearch 索引维度固定；回退实现按 embedding_dim 过滤，任意维度都可检索。
+        if isinstance(self._get_core(), _FallbackCore):
+            return None
+        return int(settings.embedding_dim)
+
+    def _servable_vec(self, vec: list[float] | None) -> list[float] | None:
+        # 查询向量维度与索引不符（如跨维度迁移中）时只走文本检索，不让整个请求失败。
+        dim = self.vector_dim()
+        if vec and dim is not None and len(vec) != dim:
+            return None
+        return vec
+
+    def reembed_candidates(self, collection: str, model_id: str, limit: int) -> list[dict[str, Any]]:
+        return [dict(r) for r in self._get_core().list_reembed_candidates(collection, model_id, int(limit))]
+
+    def stage_embeddings(self, model_id: str, items: list[dict[str, Any]]) -> int:
+        return int(self._get_core().stage_embeddings(model_id, items))
+
+    def promote_embeddings(self, collection: str, model_id: str) -> int:
+        promoted = int(self._get_core().promote_embeddings(collection, model_id))
+        self.set_serving_model(collection, model_id)
+        if promoted:
+            self._notify_index()
+        return promoted
+
+    def search(
+        self,
+        *,
+        collection: str | None,
+        query_text: str | None,
+        query_vec: list[float] | None,
+        top_k: int,
+        embedding_model: str | None = None,
+        fields: list[str] | None = None,
+        snippet_chars: int = 240,
+        fusion: FusionConfig | None = None,
+        use_cache: bool = True,
+    ) -> list[dict[str, Any]]:
+        check_search_fields(fields)
+        query_vec = self._servable_vec(query_vec)
+        model = embedding_model or (self.serving_model(collection) if query_vec else None)
+        f = fusion or self.fusion_for(collection)
+        key = None
+        if use_cache:
+            key = self._cache_key(collection, query_text, query_vec, top_k, model, fields, snippet_chars, f)
+            cached = self._search_cache.get(key)
+            if cached is not None:
+                return [dict(r) for r in cached]
+        results = self._search_core(collection, query_text, query_vec, top_k, model, fields, snippet_chars, f)
+        if key is not None:
+            self._search_cache.put(key, tuple(dict(r) for r in results))
+        return results
+
+    def search_batch(
+        self,
+        *,
+        collection: str | None,
+        queries: list[str],
+        query_vecs: list[list[float] | None] | None,
+        top_k: int,
+        embedding_model: str | None = None,
+        fields: list[str] | None = None,
+        snippet_chars: int = 240,
+        fusion: FusionConfig | None = None,
+    ) -> list[list[dict[str, Any]]]:
+        check_search_fields(fields)
+        vecs = list(query_vecs or [None] * len(queries))
+        if len(vecs) != len(queries):
+            raise ValueError("query_vecs must match queries")
+        vecs = [self._servable_vec(v) for v in vecs]
+        model = embedding_model or (self.serving_model(collection) if any(vecs) else None)
+        f = fusion or self.fusion_for(collection)
+        keys = [self._cache_key(collection, q, v, top_k, model, fields, snippet_chars, f) for q, v in zip(queries, vecs)]
+        out: list[list[dict[str, Any]] | None] = []
+        misses: list[int] = []
+        for i, key in enumerate(keys):
+            cached = self._search_cache.get(key)
+            out.append([dict(r) for r in cached] if cached is not None else None)
+            if cached is None:
+                misses.append(i)
+        if misses:
+            fresh = self._search_batch_core(
+                collection, [queries[i] for i in misses], [vecs[i] for i in misses], top_k, model, fields, snippet_chars, f
+            )
+            for i, results in zip(misses, fresh):
+                self._search_cache.put(keys[i], tuple(dict(r) for r in results))
+                out[i] = results
+        return [r or [] for r in out]
+
+    def _cache_key(
+        self,
+        collection: str | None,
+        query_text: str | None,
+        query_vec: list[float] | None,
+        top_k: int,
+        model: str | None,
+        fields: list[str] | None,
+        snippet_chars: int,
+        f: FusionConfig,
+    ) -> tuple:
+        vec_digest = hashlib.sha1(array("f", query_vec).tobytes()).hexdigest() if query_vec else None
+        return (
+            collection,
+            self._generation(collection),
+            _normalize_query(query_text),
+            vec_digest,
+            top_k,
+            model,
+            tuple(fields) if fields is not None else None,
+            snippet_chars,
+            f,
+        )
+
+    def _search_batch_core(
+        self,
+        collection: str | None,
+        queries: list[str],
+        query_vecs: list[list[float] | None],
+        top_k: int,
+        model: str | None,
+        fields: list[str] | None,
+        snippet_chars: int,
+        f: FusionConfig,
+    ) -> list[list[dict[str, Any]]]:
+        core = self._get_core()
+        if isinstance(core, _FallbackCore):
+            return core.search_batch(collection, queries, query_vecs, top_k, model, fields, snippet_chars, f)
+        return [
+            [r for r in hits]
+            for hits in core.search_batch(
+                collection,
+                queries,
+                query_vecs,
+                top_k,
+                model,
+                fields,
+                snippet_chars,
+                f.strategy,
+                f.text_weight,
+                f.vector_weight,
+                f.rrf_k,
+            )
+        ]
 
-    def search(self, *, collection: str | None, query_text: str | None, query_vec: list[float] | None, top_k: int) -> list[dict[str, Any]]:
+    def _search_core(
+        self,
+        collection: str | None,
+        query_text: str | None,
+        query_vec: list[float] | None,
+        top_k: int,
+        model: str | None,
+        fields: list[str] | None,
+        snippet_chars: int,
+        f: FusionConfig,
+    ) -> list[dict[str, Any]]:
         core = self._get_core()
-        return [r for r in core.search(collection, query_text, query_vec, top_k)]
+        if isinstance(core, _FallbackCore):
+            return core.search(collection, query_text, query_vec, top_k, model, fields, snippet_chars, f)
+        return [
+            r
+            for r in core.search(
+                collection,
+                query_text,
+                query_vec,
+                top_k,
+                model,
+                fields,
+                snippet_chars,
+                f.strategy,
+                f.text_weight,
+                f.vector_weight,
+                f.rrf_k,
+            )
+        ]
 
 
 store = MemoryStore()
-
@@ -1,10 +1,11 @@
 from __future__ import annotations
 
+import json as jsonlib
 import logging
 import time
 import uuid
 from dataclasses import dataclass
-from typing import Any
+from typing import Any, AsyncIterator
 
 import httpx
 
@@ -97,6 +98,49 @@ async def chat_completions(payload: dict[str, Any], *, base_url: str | None, api
     return await _request_json("POST", "/v1/chat/completions", request_id=rid, base_url=base_url, api_key=api_key, json=payload)
 
 
+async def chat_completions_stream(
+    payload: dict[str, Any], *, base_url: str | None, api_key: str | None, request_id: str | None = None
+) -> AsyncIterator[str]:
+    # 以 SSE 方式请求上游，逐个产出 choices[0].delta.content 文本片段。
+    rid = request_id or new_request_id()
+    started = _now_ms()
+    url = f"{_base_url(base_url)}/v1/chat/completions"
+    headers = _headers(api_key)
+    timeout = float(settings.newapi_timeout_seconds or 60.0)
+    # UpstreamError 是 frozen dataclass，不能穿过 async with 的退出逻辑，需在上下文外抛出。
+    error: UpstreamError | None = None
+    try:
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            async with client.stream("POST", url, headers=headers, json={**payload, "stream": True}) as resp:
+                if resp.status_code >= 400:
+                    body = _truncate((await resp.aread()).decode("utf-8", errors="replace"))
+                    error = UpstreamError(request_id=rid, status_code=resp.status_code, detail=f"upstream {resp.status_code}: {body}")
+                else:
+                    log.info("newapi stream opened", extra={"request_id": rid, "path": "/v1/chat/completions", "status": resp.status_code, "ms": _now_ms() - started})
+                    async for line in resp.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[5:].strip()
+                        if data == "[DONE]":
+                            break
+                        try:
+                            chunk = jsonlib.loads(data)
+                        except Exception:
+                            continue
+                        for choice in chunk.get("choices") or []:
+                            piece = (choice.get("delta") or {}).get("content")
+                            if isinstance(piece, str) and piece:
+                                yield piece
+    except Exception as e:
+        log.warning(
+            "newapi stream error",
+            extra={"request_id": rid, "path": "/v1/chat/completions", "ms": _now_ms() - started, "error": type(e).__name__},
+        )
+        raise UpstreamError(request_id=rid, status_code=None, detail=f"upstream network error: {type(e).__name__}")
+    if error is not None:
+        raise error
+
+
 async def embeddings(payload: dict[str, Any], *, base_url: str | None, api_key: str | None, request_id: str | None = None) -> dict:
     rid = request_id or new_request_id()
     return await _request_json("POST", "/v1/embeddings", request_id=rid, base_url=base_url, api_key=api_key, json=payload)
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Any
+
+
+RAG_HEADER = "以下是检索到的资料片段（用于回答问题，优先引用）：\n"
+
+_CJK = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]")
+_WORD = re.compile(r"[A-Za-z0-9_]+")
+_SENTENCE_END = re.compile(r"(?<=[。！？!?；;.\n])")
+
+
+def estimate_tokens(text: str) -> int:
+    # 不依赖具体 tokenizer 的保守估计：CJK 每字约 1 token，其余约 4 字符 1 token。
+    cjk = len(_CJK.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def _features(text: str) -> set[str]:
+    low = text.lower()
+    feats = set(_WORD.findall(low))
+    chars = _CJK.findall(low)
+    feats.update(a + b for a, b in zip(chars, chars[1:]))
+    if len(chars) == 1:
+        feats.add(chars[0])
+    return feats
+
+
+def _split_passages(content: str, max_tokens: int) -> list[str]:
+    passages: list[str] = []
+    cur = ""
+    for sent in _SENTENCE_END.split(content):
+        if not sent.strip():
+            continue
+        if cur and estimate_tokens(cur + sent) > max_tokens:
+            passages.append(cur.strip())
+            cur = ""
+        cur += sent
+    if cur.strip():
+        passages.append(cur.strip())
+    return passages
+
+
+def _trim_to_tokens(text: str, budget: int) -> str:
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if estimate_tokens(text[:mid]) + 1 <= budget:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo].rstrip() + "…" if lo < len(text) else text
+
+
+@dataclass
+class _Passage:
+    path: str
+    text: str
+    tokens: int
+    relevance: float
+    feats: set[str]
+
+
+@dataclass
+class RagContext:
+    text: str | None
+    tokens: int = 0
+    chunks: list[dict[str, Any]] = field(default_factory=list)
+    dropped: int = 0
+
+
+def assemble_context(
+    query: str,
+    hits: list[dict[str, Any]],
+    *,
+    token_budget: int,
+    passage_tokens: int = 160,
+    mmr_lambda: float = 0.7,
+    dedup_threshold: float = 0.85,
+    min_tokens: int = 24,
+) -> RagContext:
+    q_feats = _features(query)
+    candidates: list[_Passage] = []
+    for rank, h in enumerate(hits):
+        path = str(h.get("path") or "")
+        base = 1.0 / (1 + rank)
+        passages: list[_Passage] = []
+        for text in _split_passages(str(h.get("content") or ""), passage_tokens):
+            feats = _features(text)
+            coverage = len(q_feats & feats) / len(q_feats) if q_feats else 0.0
+            tokens = estimate_tokens(text)
+            # 相关密度：命中率越高、篇幅越短的片段越优先。
+            density = coverage / math.sqrt(max(tokens, 1) / passage_tokens)
+            passages.append(_Passage(path, text, tokens, base * (0.5 + density), feats))
+        # 只保留与查询有词面重合的片段；都不重合时（纯向量命中）保留开头一段。
+        matched = [p for p in passages if p.feats & q_feats]
+        candidates.extend(matched or passages[:1])
+
+    header_tokens = estimate_tokens(RAG_HEADER)
+    remaining = token_budget - header_tokens
+    selected: list[_Passage] = []
+    dropped = 0
+    while candidates and remaining >= min_tokens:
+        best_i, best_score, best_sim = -1, float("-inf"), 0.0
+        for i, c in enumerate(candidates):
+            sim = max((_jaccard(c.feats, s.feats) for s in selected), default=0.0)
+            score = mmr_lambda * c.relevance - (1 - mmr_lambda) * sim
+            if score > best_score:
+                best_i, best_score, best_sim = i, score, sim
+        c = candidates.pop(best_i)
+        if best_sim >= dedup_threshold:
+            dropped += 1
+            continue
+        cost = c.tokens + estimate_tokens(f"[{c.path}] \n\n")
+        if cost > remaining:
+            room = remaining - estimate_tokens(f"[{c.path}] \n\n")
+            if room < min_tokens:
+                dropped += 1
+                continue
+            c.text = _trim_to_tokens(c.text, room)
+            c.tokens = estimate_tokens(c.text)
+            cost = c.tokens + estimate_tokens(f"[{c.path}] \n\n")
+        selected.append(c)
+        remaining -= cost
+    dropped += len(candidates)
+
+    if not selected:
+        return RagContext(text=None, dropped=dropped)
+    body = "\n\n".join(f"[{c.path}] {c.text}" for c in selected)
+    text = RAG_HEADER + body
+    return RagContext(
+        text=text,
+        tokens=estimate_tokens(text),
+        chunks=[{"path": c.path, "tokens": c.tokens} for c in selected],
+        dropped=dropped,
+    )
+
+
+def _jaccard(a: set[str], b: set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from time import time
+from typing import Any
+
+from .embedding import current_model_id, embed_texts
+from .memory import store
+
+
+def _now_ms() -> int:
+    return int(time() * 1000)
+
+
+@dataclass
+class ReembedJob:
+    collection: str
+    model_id: str
+    batch_size: int = 32
+    interval_seconds: float = 1.0
+    status: str = "pending"
+    processed: int = 0
+    promoted: int = 0
+    error: str | None = None
+    started_at_unix_ms: int | None = None
+    finished_at_unix_ms: int | None = None
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "collection": self.collection,
+            "model_id": self.model_id,
+            "batch_size": self.batch_size,
+            "interval_seconds": self.interval_seconds,
+            "status": self.status,
+            "processed": self.processed,
+            "promoted": self.promoted,
+            "error": self.error,
+            "started_at_unix_ms": self.started_at_unix_ms,
+            "finished_at_unix_ms": self.finished_at_unix_ms,
+            "serving_model": store.serving_model(self.collection),
+        }
+
+
+class ReembedManager:
+    def __init__(self) -> None:
+        self._jobs: dict[str, ReembedJob] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    def start(self, collection: str, *, model_id: str | None = None, batch_size: int = 32, interval_seconds: float = 1.0) -> ReembedJob:
+        t = self._tasks.get(collection)
+        if t and not t.done():
+            return self._jobs[collection]
+        job = ReembedJob(
+            collection=collection,
+            model_id=model_id or current_model_id(),
+            batch_size=min(max(1, int(batch_size)), 512),
+            interval_seconds=max(0.0, float(interval_seconds)),
+        )
+        self._jobs[collection] = job
+        self._tasks[collection] = asyncio.create_task(self._run(job))
+        return job
+
+    def list(self) -> list[dict[str, Any]]:
+        return [j.to_dict() for j in self._jobs.values()]
+
+    async def cancel(self, collection: str) -> bool:
+        t = self._tasks.get(collection)
+        if not t or t.done():
+            return False
+        t.cancel()
+        try:
+            await t
+        except BaseException:
+            pass
+        return True
+
+    async def stop(self) -> None:
+        for collection in list(self._tasks):
+            await self.cancel(collection)
+
+    async def _run(self, job: ReembedJob) -> None:
+        job.status = "running"
+        job.started_at_unix_ms = _now_ms()
+        try:
+            while True:
+                rows = store.reembed_candidates(job.collection, job.model_id, job.batch_size)
+                if not rows:
+                    break
+                vectors = await embed_texts([str(r["content"]) for r in rows], model_id=job.model_id)
+                if len(vectors) != len(rows):
+                    raise RuntimeError(f"embedding returned {len(vectors)} vectors for {len(rows)} documents")
+                # 维度与向量索引不符时不能切换服务模型，否则切换后向量检索全部失效；保持旧模型继续服务。
+                dim = store.vector_dim()
+                if dim is not None and any(len(v) != dim for v in vectors):
+                    raise RuntimeError(f"model {job.model_id} returns {len(vectors[0])}-dim vectors, index expects {dim}")
+                store.stage_embeddings(
+                    job.model_id,
+                    [{"id": r["id"], "updated_at_unix_ms": r.get("updated_at_unix_ms"), "embedding": v} for r, v in zip(rows, vectors)],
+                )
+                job.processed += len(rows)
+                await asyncio.sleep(job.interval_seconds)
+            job.promoted = store.promote_embeddings(job.collection, job.model_id)
+            job.status = "done"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+            raise
+        except Exception as e:
+            job.status = "failed"
+            job.error = f"{type(e).__name__}: {e}"
+        finally:
+            job.finished_at_unix_ms = _now_ms()
+
+
+reembed_manager = ReembedManager()
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any
+
+import httpx
+
+from ..settings import settings
+
+
+RERANK_PROVIDERS = ("local", "openai_compat")
+
+
+def rerank_enabled() -> bool:
+    return settings.rerank_provider in RERANK_PROVIDERS and bool(settings.rerank_model)
+
+
+def _model_id() -> str:
+    return f"{settings.rerank_provider}:{settings.rerank_model}"
+
+
+class _ScoreCache:
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self._items: OrderedDict[tuple[str, str, str], float] = OrderedDict()
+
+    def get(self, key: tuple[str, str, str]) -> float | None:
+        score = self._items.get(key)
+        if score is not None:
+            self._items.move_to_end(key)
+        return score
+
+    def put(self, key: tuple[str, str, str], score: float) -> None:
+        self._items[key] = score
+        self._items.move_to_end(key)
+        while len(self._items) > self.capacity:
+            self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        self._items.clear()
+
+
+_cache = _ScoreCache(4096)
+# 进行中的打分任务：相同 (模型, 查询, 文档) 共用一个任务；总数受 rerank_max_inflight 限制。
+_inflight: dict[tuple[str, str, tuple[str, ...]], asyncio.Future] = {}
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+@lru_cache(maxsize=2)
+def _load_cross_encoder(model_path: str):
+    try:
+        from sentence_transformers import CrossEncoder
+    except Exception as e:
+        raise RuntimeError("sentence-transformers is required for local rerank") from e
+    return CrossEncoder(model_path)
+
+
+async def _score_pairs(query: str, docs: list[str]) -> list[float]:
+    provider, name = settings.rerank_provider, settings.rerank_model
+
+    if provider == "local":
+        model = await asyncio.to_thread(_load_cross_encoder, name)
+        scores = await asyncio.to_thread(model.predict, [(query, d) for d in docs])
+        return [float(s) for s in scores]
+
+    if provider == "openai_compat":
+        base = (settings.rerank_base_url or settings.llm_base_url).rstrip("/")
+        headers = {}
+        if settings.llm_api_key:
+            headers["Authorization"] = f"Bearer {settings.llm_api_key}"
+        async with httpx.AsyncClient(timeout=30) as client:
+            resp = await client.post(f"{base}/v1/rerank", headers=headers, json={"model": name, "query": query, "documents": docs})
+            resp.raise_for_status()
+            data = resp.json() or {}
+        scores = [0.0] * len(docs)
+        for r in data.get("results") or []:
+            idx = int(r.get("index", -1))
+            if 0 <= idx < len(docs):
+                scores[idx] = float(r.get("relevance_score", r.get("score", 0.0)))
+        return scores
+
+    raise RuntimeError(f"unsupported rerank_provider: {provider}")
+
+
+async def rerank(query: str, hits: list[dict[str, Any]], *, top_k: int, budget_ms: int | None = None) -> tuple[list[dict[str, Any]], bool]:
+    # 返回 (结果, 是否完成重排)；超出预算或出错时保留融合顺序。
+    if not rerank_enabled() or len(hits) <= 1:
+        return hits[:top_k], False
+
+    model_id = _model_id()
+    q_key = _digest(query)
+    keys = [(model_id, q_key, _digest(str(h.get("content") or ""))) for h in hits]
+    scores: list[float | None] = [_cache.get(k) for k in keys]
+    missing = [i for i, s in enumerate(scores) if s is None]
+
+    if missing:
+        docs = [str(hits[i].get("content") or "") for i in missing]
+
+        async def _fill() -> list[float]:
+            out = await _score_pairs(query, docs)
+            for i, s in zip(missing, out):
+                _cache.put(keys[i], s)
+            return out
+
+        # 超时后任务继续跑完并写入缓存，同一查询的下一次请求可直接命中。
+        fill_key = (model_id, q_key, tuple(keys[i][2] for i in missing))
+        task = _inflight.get(fill_key)
+        if task is None or task.done():
+            if len(_inflight) >= max(1, settings.rerank_max_inflight):
+                # 重排器过慢时不再堆积后台任务，直接保留融合顺序。
+                return hits[:top_k], False
+            task = asyncio.ensure_future(_fill())
+            _inflight[fill_key] = task
+
+            def _forget(t: asyncio.Future, k: tuple = fill_key) -> None:
+                if _inflight.get(k) is t:
+                    del _inflight[k]
+
+            task.add_done_callback(_forget)
+        budget = settings.rerank_budget_ms if budget_ms is None else budget_ms
+        try:
+            fresh = await asyncio.wait_for(asyncio.shield(task), timeout=max(0, budget) / 1000)
+        except asyncio.TimeoutError:
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            return hits[:top_k], False
+        except Exception:
+            return hits[:top_k], False
+        for i, s in zip(missing, fresh):
+            scores[i] = s
+
+    ranked = sorted(zip(hits, scores), key=lambda x: x[1] if x[1] is not None else float("-inf"), reverse=True)
+    return [{**h, "rerank_score": s} for h, s in ranked[:top_k]], True
@@ -6,7 +6,9 @@ from pathlib import Path
 from time import time
 
 from ..db import open_db
+from .control_store import get_json
 from .embedding import embed_texts
+from .job_queue import JobDeferred, job_queue
 from .mcp_executor import execute_tool
 from .memory import store
 
@@ -62,33 +64,38 @@ async def enqueue_research(query: str, *, collection: str) -> dict:
     conn.close()
 
     conn = _db()
-    conn.execute(
+    cur = conn.execute(
         "INSERT INTO research_jobs(query, collection, status, scheduled_at_unix_ms, query_embedding_json, created_at_unix_ms, updated_at_unix_ms) VALUES (?, ?, 'queued', ?, ?, ?, ?)",
         (q, collection, now, json.dumps(vec, ensure_ascii=False) if vec else None, now, now),
     )
+    research_job_id = int(cur.lastrowid)
+    job_queue.enqueue("research", {"research_job_id": research_job_id}, conn=conn)
     conn.commit()
     conn.close()
-    return {"queued": True}
+    return {"queued": True, "research_job_id": research_job_id}
 
 
-async def tick_research_jobs(searxng_base_url: str | None) -> None:
-    base = (searxng_base_url or "").strip()
+async def run_research_job(payload: dict) -> dict:
+    # 由 job_queue 执行；抛出异常即交给队列按退避重试。
+    base = get_json("web.searxng_base_url")
+    base = base.strip() if isinstance(base, str) else ""
     if not base:
-        return
-    now = _now_ms()
+        # 搜索后端未配置时只推迟，不消耗重试次数，配置后自动继续。
+        raise JobDeferred("web.searxng_base_url is not configured", delay_seconds=60)
+    job_id = int(payload["research_job_id"])
     conn = _db()
-    row = conn.execute(
-        "SELECT * FROM research_jobs WHERE status='queued' AND scheduled_at_unix_ms<=? ORDER BY id ASC LIMIT 1",
-        (now,),
-    ).fetchone()
+    row = conn.execute("SELECT * FROM research_jobs WHERE id=?", (job_id,)).fetchone()
     if not row:
         conn.close()
-        return
-    job_id = int(row["id"])
+        return {"skipped": "missing"}
+    # 租约过期后重复投递时直接返回已有结果。
+    if row["status"] == "done":
+        conn.close()
+        return json.loads(row["result_json"] or "null")
     query = str(row["query"])
     collection = str(row["collection"])
     vec_json = row["query_embedding_json"]
-    conn.execute("UPDATE research_jobs SET status='running', updated_at_unix_ms=? WHERE id=?", (now, job_id))
+    conn.execute("UPDATE research_jobs SET status='running', updated_at_unix_ms=? WHERE id=?", (_now_ms(), job_id))
     conn.commit()
     conn.close()
 
@@ -116,24 +123,39 @@ async def tick_research_jobs(searxng_base_url: str | None) -> None:
         if items:
             await store.upsert_texts(collection, items)
         result = {"query": query, "urls": urls[:3], "ingested": len(items)}
-
-        conn = _db()
-        conn.execute(
-            "UPDATE research_jobs SET status='done', result_json=?, error=NULL, updated_at_unix_ms=? WHERE id=?",
-            (json.dumps(result, ensure_ascii=False), _now_ms(), job_id),
-        )
-        conn.execute(
-            "INSERT INTO research_history(query, query_embedding_json, result_json, created_at_unix_ms) VALUES (?, ?, ?, ?)",
-            (query, vec_json, json.dumps(result, ensure_ascii=False), _now_ms()),
-        )
-        conn.commit()
-        conn.close()
     except Exception as e:
+        # 队列还会重试，这里只记录错误；最终失败由 mark_research_dead 在进入死信时标记。
         conn = _db()
         conn.execute(
-            "UPDATE research_jobs SET status='failed', error=?, updated_at_unix_ms=? WHERE id=?",
+            "UPDATE research_jobs SET status='queued', error=?, updated_at_unix_ms=? WHERE id=?",
             (type(e).__name__, _now_ms(), job_id),
         )
         conn.commit()
         conn.close()
+        raise
+
+    conn = _db()
+    conn.execute(
+        "UPDATE research_jobs SET status='done', result_json=?, error=NULL, updated_at_unix_ms=? WHERE id=?",
+        (json.dumps(result, ensure_ascii=False), _now_ms(), job_id),
+    )
+    conn.execute(
+        "INSERT INTO research_history(query, query_embedding_json, result_json, created_at_unix_ms) VALUES (?, ?, ?, ?)",
+        (query, vec_json, json.dumps(result, ensure_ascii=False), _now_ms()),
+    )
+    conn.commit()
+    conn.close()
+    return result
 
+
+def mark_research_dead(payload: dict, error: str) -> None:
+    job_id = payload.get("research_job_id")
+    if job_id is None:
+        return
+    conn = _db()
+    conn.execute(
+        "UPDATE research_jobs SET status='failed', error=?, updated_at_unix_ms=? WHERE id=? AND status!='done'",
+        (error, _now_ms(), int(job_id)),
+    )
+    conn.commit()
+    conn.close()
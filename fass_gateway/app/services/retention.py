@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+import asyncio
+import sqlite3
+from pathlib import Path
+from time import sleep, time
+from typing import Any
+
+from ..db import open_db
+from ..settings import settings
+
+
+DAY_MS = 24 * 3600 * 1000
+
+
+def _now_ms() -> int:
+    return int(time() * 1000)
+
+
+def _db():
+    base = Path(__file__).resolve().parents[2]
+    return open_db(str(base / "data" / "fass_gateway.sqlite"))
+
+
+def _delete_batches(conn: sqlite3.Connection, sql: str, params: tuple[Any, ...]) -> int:
+    # 每批单独提交并短暂让出写锁，避免一次大删除长时间阻塞 trace_writer/任务队列。
+    batch = max(1, settings.retention_batch_size)
+    total = 0
+    while True:
+        n = int(conn.execute(sql, (*params, batch)).rowcount or 0)
+        conn.commit()
+        total += n
+        if n < batch:
+            return total
+        sleep(settings.retention_batch_pause_ms / 1000)
+
+
+def _prune_trace_by_age(conn: sqlite3.Connection, now: int) -> int:
+    if settings.retention_trace_days <= 0:
+        return 0
+    cutoff = now - settings.retention_trace_days * DAY_MS
+    return _delete_batches(
+        conn,
+        "DELETE FROM trace_events WHERE id IN (SELECT id FROM trace_events WHERE ts_unix_ms<? LIMIT ?)",
+        (cutoff,),
+    )
+
+
+def _trace_max_id(conn: sqlite3.Connection) -> int:
+    return int(conn.execute("SELECT COALESCE(MAX(id), 0) FROM trace_events").fetchone()[0])
+
+
+def _prune_trace_by_count(conn: sqlite3.Connection, since_id: int, until_id: int) -> int:
+    keep = settings.retention_trace_max_per_conversation
+    if keep <= 0:
+        return 0
+    # 只有上次运行后写入过事件的会话才可能新超出上限，按主键范围找出这些会话，避免全表 GROUP BY。
+    touched = conn.execute(
+        "SELECT DISTINCT conversation_id FROM trace_events WHERE id>? AND id<=?",
+        (since_id, until_id),
+    ).fetchall()
+    total = 0
+    for r in touched:
+        cid = int(r["conversation_id"])
+        # 找到第 keep 新的事件作为分界，更早的按批删除。
+        edge = conn.execute(
+            "SELECT ts_unix_ms, id FROM trace_events WHERE conversation_id=? ORDER BY ts_unix_ms DESC, id DESC LIMIT 1 OFFSET ?",
+            (cid, keep - 1),
+        ).fetchone()
+        if edge is None:
+            continue
+        total += _delete_batches(
+            conn,
+            "DELETE FROM trace_events WHERE id IN (SELECT id FROM trace_events WHERE conversation_id=? AND (ts_unix_ms, id)<(?, ?) LIMIT ?)",
+            (cid, int(edge["ts_unix_ms"]), int(edge["id"])),
+        )
+    return total
+
+
+def _prune_conversations(conn: sqlite3.Connection, now: int) -> tuple[int, int]:
+    if settings.retention_conversation_days <= 0:
+        return 0, 0
+    cutoff = now - settings.retention_conversation_days * DAY_MS
+    rows = conn.execute(
+        """
+SELECT id FROM conversations c
+WHERE c.updated_at_unix_ms<?
+  AND NOT EXISTS (SELECT 1 FROM trace_events te WHERE te.conversation_id=c.id AND te.ts_unix_ms>=?)
+ORDER BY id ASC LIMIT ?
+""",
+        (cutoff, cutoff, max(1, settings.retention_batch_size)),
+    ).fetchall()
+    events = 0
+    for r in rows:
+        cid = int(r["id"])
+        # 先分批删事件，再删会话，避免 ON DELETE CASCADE 一次删完整个会话。
+        events += _delete_batches(
+            conn,
+            "DELETE FROM trace_events WHERE id IN (SELECT id FROM trace_events WHERE conversation_id=? LIMIT ?)",
+            (cid,),
+        )
+        conn.execute("DELETE FROM conversations WHERE id=?", (cid,))
+        conn.commit()
+    return len(rows), events
+
+
+def _prune_research(conn: sqlite3.Connection, now: int) -> tuple[int, int]:
+    history = jobs = 0
+    if settings.retention_research_history_days > 0:
+        cutoff = now - settings.retention_research_history_days * DAY_MS
+        history = _delete_batches(
+            conn,
+            "DELETE FROM research_history WHERE id IN (SELECT id FROM research_history WHERE created_at_unix_ms<? LIMIT ?)",
+            (cutoff,),
+        )
+    if settings.retention_research_jobs_days > 0:
+        cutoff = now - settings.retention_research_jobs_days * DAY_MS
+        # 只清理已结束的任务，queued/running 由任务队列负责。
+        jobs = _delete_batches(
+            conn,
+            "DELETE FROM research_jobs WHERE id IN (SELECT id FROM research_jobs WHERE status IN ('done', 'failed') AND updated_at_unix_ms<? LIMIT ?)",
+            (cutoff,),
+        )
+    return history, jobs
+
+
+def _prune_automation_jobs(conn: sqlite3.Connection, now: int) -> int:
+    if settings.retention_automation_jobs_days <= 0:
+        return 0
+    cutoff = now - settings.retention_automation_jobs_days * DAY_MS
+    # 只清理已完成和死信任务；死信保留期内仍可人工 requeue。
+    return _delete_batches(
+        conn,
+        "DELETE FROM automation_jobs WHERE id IN (SELECT id FROM automation_jobs WHERE status IN ('done', 'dead') AND updated_at_unix_ms<? LIMIT ?)",
+        (cutoff,),
+    )
+
+
+def _vacuum(conn: sqlite3.Connection) -> dict[str, Any]:
+    # 周期清理只做增量回收；未开启 auto_vacuum 的旧库由 convert_vacuum 在启动时或运维手动转换。
+    free = int(conn.execute("PRAGMA freelist_count").fetchone()[0])
+    mode = int(conn.execute("PRAGMA auto_vacuum").fetchone()[0])
+    if mode != 2:
+        return {"mode": "none", "free_pages_before": free, "free_pages_after": free}
+    pages = max(0, settings.retention_vacuum_pages)
+    if free and pages:
+        # incremental_vacuum 每 step 只回收一页，executescript 会一直 step 到结束。
+        conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+    return {"mode": "incremental", "free_pages_before": free, "free_pages_after": int(conn.execute("PRAGMA freelist_count").fetchone()[0])}
+
+
+def convert_vacuum(*, min_free_pages: int = 0) -> dict[str, Any]:
+    # 一次性全库 VACUUM 把旧库转为 auto_vacuum=INCREMENTAL；会长时间持有写锁，不在后台周期任务中执行。
+    conn = _db()
+    try:
+        free = int(conn.execute("PRAGMA freelist_count").fetchone()[0])
+        mode = int(conn.execute("PRAGMA auto_vacuum").fetchone()[0])
+        if mode == 2:
+            return {"converted": False, "reason": "already_incremental", "free_pages_before": free}
+        if free < min_free_pages:
+            return {"converted": False, "reason": "below_min_free_pages", "free_pages_before": free}
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+        return {"converted": True, "free_pages_before": free, "free_pages_after": int(conn.execute("PRAGMA freelist_count").fetchone()[0])}
+    finally:
+        conn.close()
+
+
+def prune_once(*, now: int | None = None, since_trace_id: int = 0) -> dict[str, Any]:
+    now = _now_ms() if now is None else int(now)
+    conn = _db()
+    try:
+        trace_age = _prune_trace_by_age(conn, now)
+        watermark = _trace_max_id(conn)
+        trace_count = _prune_trace_by_count(conn, since_trace_id, watermark)
+        conversations, conversation_events = _prune_conversations(conn, now)
+        history, jobs = _prune_research(conn, now)
+        automation_jobs = _prune_automation_jobs(conn, now)
+        vacuum = _vacuum(conn)
+    finally:
+        conn.close()
+    return {
+        "trace_events_by_age": trace_age,
+        "trace_events_by_count": trace_count,
+        "conversations": conversations,
+        "conversation_trace_events": conversation_events,
+        "research_history": history,
+        "research_jobs": jobs,
+        "automation_jobs": automation_jobs,
+        "vacuum": vacuum,
+        "trace_watermark": watermark,
+    }
+
+
+class RetentionWorker:
+    def __init__(self) -> None:
+        self._task: asyncio.Task | None = None
+        self._stop: asyncio.Event | None = None
+        self._lock = asyncio.Lock()
+        self.runs = 0
+        self.last_run_unix_ms: int | None = None
+        self.last_result: dict[str, Any] | None = None
+        self.last_error: str | None = None
+        # 上次按条数清理时的 trace_events 最大 id；进程重启后首轮全量检查。
+        self.trace_watermark = 0
+
+    def start(self) -> None:
+        if not settings.retention_enabled or (self._task and not self._task.done()):
+            return
+        self._stop = asyncio.Event()
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._stop:
+            self._stop.set()
+        if self._task:
+            try:
+                await self._task
+            except Exception:
+                pass
+
+    async def run_once(self) -> dict[str, Any]:
+        async with self._lock:
+            try:
+                result = await asyncio.to_thread(prune_once, since_trace_id=self.trace_watermark)
+                self.trace_watermark = int(result["trace_watermark"])
+                self.last_error = None
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                raise
+            finally:
+                self.runs += 1
+                self.last_run_unix_ms = _now_ms()
+            self.last_result = result
+            return result
+
+    async def convert_vacuum(self, *, min_free_pages: int = 0) -> dict[str, Any]:
+        # 与周期清理互斥，避免 VACUUM 与分批删除同时争抢写锁。
+        async with self._lock:
+            return await asyncio.to_thread(convert_vacuum, min_free_pages=min_free_pages)
+
+    async def _loop(self) -> None:
+        assert self._stop is not None
+        while not self._stop.is_set():
+            try:
+                await self.run_once()
+            except Exception:
+                pass
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=settings.retention_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "enabled": settings.retention_enabled,
+            "running": bool(self._task and not self._task.done()),
+            "runs": self.runs,
+            "last_run_unix_ms": self.last_run_unix_ms,
+            "last_result": self.last_result,
+            "last_error": self.last_error,
+            "trace_watermark": self.trace_watermark,
+        }
+
+
+retention_worker = RetentionWorker()
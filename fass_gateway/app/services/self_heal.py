@@ -1,15 +1,18 @@
 from __future__ import annotations
 
+import gzip
 import hashlib
 import json
 import os
 import shutil
 import sqlite3
+import tempfile
 from pathlib import Path
 from time import time
 from typing import Any
 
 from ..db import open_db
+from ..settings import settings
 from .audit_log import write as write_audit
 from .audit_log import prune_expired as prune_audit_logs
 from .model_catalog import cleanup_offline
@@ -35,55 +38,230 @@ def _backup_dir() -> Path:
     return d
 
 
+class _BackupRestarted(Exception):
+    pass
+
+
+def _backup_api(src_path: Path, dst: Path) -> None:
+    # 分页复制并在每步之间 sleep，写入方只在单步内被阻塞；源库被其他连接改写会导致重新开始，多次后放弃。
+    restarts = 0
+    last_remaining: int | None = None
+
+    def progress(status: int, remaining: int, total: int) -> None:
+        nonlocal restarts, last_remaining
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+            if restarts > settings.backup_max_restarts:
+                raise _BackupRestarted()
+        last_remaining = remaining
+
+    src = sqlite3.connect(str(src_path))
+    out = sqlite3.connect(str(dst))
+    try:
+        src.backup(out, pages=max(1, settings.backup_pages_per_step), progress=progress, sleep=settings.backup_step_sleep_ms / 1000)
+    finally:
+        out.close()
+        src.close()
+
+
+def _vacuum_into(src_path: Path, dst: Path) -> None:
+    # WAL 下 VACUUM INTO 读取一致快照且不阻塞写入，输出同时完成碎片整理。
+    conn = sqlite3.connect(str(src_path))
+    try:
+        conn.execute("VACUUM INTO ?", (str(dst),))
+    finally:
+        conn.close()
+
+
+def _gzip(path: Path) -> Path:
+    gz = path.with_name(path.name + ".gz")
+    tmp = gz.with_name(gz.name + ".tmp")
+    with path.open("rb") as f, gzip.open(tmp, "wb", compresslevel=6) as g:
+        shutil.copyfileobj(f, g, 1 << 20)
+    os.replace(tmp, gz)
+    path.unlink()
+    return gz
+
+
+def _backup_ts(path: Path) -> int:
+    try:
+        return int(path.name.split(".")[1])
+    except (IndexError, ValueError):
+        return 0
+
+
+def list_backups() -> list[Path]:
+    files = [p for p in _backup_dir().glob("fass_gateway.*.sqlite*") if p.suffix in (".sqlite", ".gz") and _backup_ts(p)]
+    return sorted(files, key=_backup_ts, reverse=True)
+
+
+def rotate_backups() -> list[str]:
+    # 至少保留最新一份；超出数量或超过保留天数的旧备份删除。
+    files = list_backups()
+    cutoff = _now_ms() - settings.backup_keep_days * 24 * 3600 * 1000 if settings.backup_keep_days > 0 else None
+    removed: list[str] = []
+    for i, p in enumerate(files):
+        if i == 0:
+            continue
+        if (settings.backup_keep > 0 and i >= settings.backup_keep) or (cutoff is not None and _backup_ts(p) < cutoff):
+            p.unlink(missing_ok=True)
+            removed.append(p.name)
+    return removed
+
+
 def backup(*, actor: str, reason: str) -> str:
     src = _db_path()
     ts = _now_ms()
     dst = _backup_dir() / f"fass_gateway.{ts}.sqlite"
-    if src.exists():
-        shutil.copy2(src, dst)
-        write_audit(actor, "DB_BACKUP", {"path": str(dst), "reason": reason, "size": dst.stat().st_size})
+    if not src.exists():
+        return dst.name
+    tmp = dst.with_name(dst.name + ".tmp")
+    tmp.unlink(missing_ok=True)
+    method = settings.backup_method
+    if method == "vacuum_into":
+        _vacuum_into(src, tmp)
+    else:
+        try:
+            _backup_api(src, tmp)
+        except _BackupRestarted:
+            tmp.unlink(missing_ok=True)
+            method = "vacuum_into"
+            _vacuum_into(src, tmp)
+    os.replace(tmp, dst)
+    if settings.backup_compress:
+        dst = _gzip(dst)
+    removed = rotate_backups()
+    write_audit(actor, "DB_BACKUP", {"path": str(dst), "reason": reason, "size": dst.stat().st_size, "method": method, "rotated": removed})
     return dst.name
 
 
-def integrity_check() -> dict[str, Any]:
+def integrity_check(*, quick: bool = False) -> dict[str, Any]:
     conn = _db()
-    rows = conn.execute("PRAGMA integrity_check;").fetchall()
+    rows = conn.execute("PRAGMA quick_check;" if quick else "PRAGMA integrity_check;").fetchall()
     conn.close()
     msgs = [r[0] for r in rows] if rows else []
     ok = len(msgs) == 1 and msgs[0] == "ok"
     return {"ok": ok, "messages": msgs}
 
 
-def _checksum_table(conn: sqlite3.Connection, table: str, cols: list[str]) -> str:
-    rows = conn.execute(f"SELECT {', '.join(cols)} FROM {table} ORDER BY {cols[0]} ASC").fetchall()
-    h = hashlib.sha256()
-    for r in rows:
-        h.update(json.dumps(list(r), ensure_ascii=False).encode("utf-8"))
-        h.update(b"\\n")
-    return h.hexdigest()
+# 表 -> (主键列, 参与校验的列)；触发器把变更的主键写入 checksum_dirty。
+CHECKSUM_TABLES: dict[str, tuple[str, list[str]]] = {
+    "l3_categories": ("id", ["id", "updated_at_unix_ms"]),
+    "personas": ("id", ["id", "updated_at_unix_ms"]),
+    "model_catalog": ("id", ["id", "updated_at_unix_ms", "status"]),
+    "layer_presets": ("layer", ["layer", "updated_at_unix_ms"]),
+}
+
+
+def _row_hash(table: str, row: sqlite3.Row) -> int:
+    h = hashlib.sha256(table.encode("utf-8"))
+    h.update(json.dumps(list(row), ensure_ascii=False).encode("utf-8"))
+    return int.from_bytes(h.digest(), "big")
+
+
+def _current_hash(conn: sqlite3.Connection, table: str, row_key: str) -> int | None:
+    key_col, cols = CHECKSUM_TABLES[table]
+    row = conn.execute(f"SELECT {', '.join(cols)} FROM {table} WHERE {key_col}=?", (row_key,)).fetchone()
+    return _row_hash(table, row) if row is not None else None
+
+
+def _stored_hash(conn: sqlite3.Connection, table: str, row_key: str) -> int | None:
+    row = conn.execute("SELECT row_hash FROM checksum_rows WHERE tbl=? AND row_key=?", (table, row_key)).fetchone()
+    return int(row["row_hash"], 16) if row is not None else None
+
+
+def _stored_aggregates(conn: sqlite3.Connection) -> dict[str, int]:
+    rows = conn.execute(
+        f"SELECT key, checksum FROM checksums WHERE key IN ({', '.join('?' for _ in CHECKSUM_TABLES)})",
+        tuple(CHECKSUM_TABLES),
+    ).fetchall()
+    out = {k: 0 for k in CHECKSUM_TABLES}
+    out.update({r["key"]: int(r["checksum"], 16) for r in rows})
+    return out
+
+
+def _hex(v: int) -> str:
+    return f"{v:064x}"
+
+
+def _apply_dirty(conn: sqlite3.Connection, *, limit: int) -> int:
+    # 每批只处理变更过的行：表聚合值 ^= 旧行 hash ^ 新行 hash；写锁只覆盖这一小批。
+    conn.execute("BEGIN IMMEDIATE;")
+    try:
+        dirty = conn.execute("SELECT id, tbl, row_key FROM checksum_dirty ORDER BY id ASC LIMIT ?", (limit,)).fetchall()
+        if not dirty:
+            conn.commit()
+            return 0
+        aggs = _stored_aggregates(conn)
+        touched: set[str] = set()
+        for table, row_key in dict.fromkeys((r["tbl"], r["row_key"]) for r in dirty):
+            if table not in CHECKSUM_TABLES:
+                continue
+            old = _stored_hash(conn, table, row_key)
+            new = _current_hash(conn, table, row_key)
+            if old == new:
+                continue
+            aggs[table] ^= (old or 0) ^ (new or 0)
+            touched.add(table)
+            if new is None:
+                conn.execute("DELETE FROM checksum_rows WHERE tbl=? AND row_key=?", (table, row_key))
+            else:
+                conn.execute(
+                    "INSERT INTO checksum_rows(tbl, row_key, row_hash) VALUES(?,?,?) ON CONFLICT(tbl, row_key) DO UPDATE SET row_hash=excluded.row_hash",
+                    (table, row_key, _hex(new)),
+                )
+        now = _now_ms()
+        for table in touched:
+            conn.execute(
+                "INSERT INTO checksums(key, checksum, computed_at_unix_ms) VALUES(?,?,?) ON CONFLICT(key) DO UPDATE SET checksum=excluded.checksum, computed_at_unix_ms=excluded.computed_at_unix_ms",
+                (table, _hex(aggs[table]), now),
+            )
+        conn.execute("DELETE FROM checksum_dirty WHERE id<=?", (int(dirty[-1]["id"]),))
+        conn.commit()
+        return len(dirty)
+    except Exception:
+        conn.rollback()
+        raise
 
 
 def compute_checksums(*, actor: str) -> dict[str, str]:
     conn = _db()
-    conn.execute("BEGIN IMMEDIATE;")
-    now = _now_ms()
-    out = {
-        "l3_categories": _checksum_table(conn, "l3_categories", ["id", "updated_at_unix_ms"]),
-        "personas": _checksum_table(conn, "personas", ["id", "updated_at_unix_ms"]),
-        "model_catalog": _checksum_table(conn, "model_catalog", ["id", "updated_at_unix_ms", "status"]),
-        "layer_presets": _checksum_table(conn, "layer_presets", ["layer", "updated_at_unix_ms"]),
-    }
-    for k, v in out.items():
-        conn.execute(
-            "INSERT INTO checksums(key, checksum, computed_at_unix_ms) VALUES(?,?,?) ON CONFLICT(key) DO UPDATE SET checksum=excluded.checksum, computed_at_unix_ms=excluded.computed_at_unix_ms",
-            (k, v, now),
-        )
-    conn.commit()
-    conn.close()
+    try:
+        limit = max(1, settings.checksum_batch_size)
+        while _apply_dirty(conn, limit=limit) >= limit:
+            pass
+        aggs = _stored_aggregates(conn)
+    finally:
+        conn.close()
+    out = {k: _hex(v) for k, v in aggs.items()}
     write_audit(actor, "CHECKSUM_COMPUTE", {"checksums": out})
     return out
 
 
+def verify_checksums() -> dict[str, Any]:
+    # 在同一个只读快照里全量重算并与「增量聚合值 + 未处理的变更」比对；WAL 下不阻塞写入。
+    conn = _db()
+    try:
+        conn.execute("BEGIN;")
+        expected = _stored_aggregates(conn)
+        pending = conn.execute("SELECT DISTINCT tbl, row_key FROM checksum_dirty").fetchall()
+        for r in pending:
+            table, row_key = r["tbl"], r["row_key"]
+            if table in CHECKSUM_TABLES:
+                expected[table] ^= (_stored_hash(conn, table, row_key) or 0) ^ (_current_hash(conn, table, row_key) or 0)
+        actual: dict[str, int] = {}
+        for table, (_, cols) in CHECKSUM_TABLES.items():
+            acc = 0
+            for row in conn.execute(f"SELECT {', '.join(cols)} FROM {table}"):
+                acc ^= _row_hash(table, row)
+            actual[table] = acc
+        conn.rollback()
+    finally:
+        conn.close()
+    mismatched = [t for t in CHECKSUM_TABLES if expected[t] != actual[t]]
+    return {"ok": not mismatched, "mismatched": mismatched, "pending_changes": len(pending)}
+
+
 def daily_tick(*, actor: str) -> dict[str, Any]:
     conn = _db()
     row = conn.execute("SELECT value FROM settings WHERE key='self_heal.last_daily_check_ms'").fetchone()
@@ -110,12 +288,24 @@ def daily_tick(*, actor: str) -> dict[str, Any]:
 
 
 def rollback_latest(*, actor: str) -> dict[str, Any]:
-    backups = sorted(_backup_dir().glob("fass_gateway.*.sqlite"), reverse=True)
+    backups = list_backups()
     if not backups:
         return {"ok": False, "error": "no backups"}
     src = backups[0]
-    dst = _db_path()
-    shutil.copy2(src, dst)
+    # 通过 backup API 写回在线库，由 SQLite 处理 WAL，避免直接覆盖文件留下旧的 -wal/-shm。
+    with tempfile.TemporaryDirectory(dir=_backup_dir()) as td:
+        path = src
+        if src.suffix == ".gz":
+            path = Path(td) / src.name[: -len(".gz")]
+            with gzip.open(src, "rb") as g, path.open("wb") as f:
+                shutil.copyfileobj(g, f, 1 << 20)
+        source = sqlite3.connect(str(path))
+        target = sqlite3.connect(str(_db_path()))
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
     write_audit(actor, "DB_ROLLBACK", {"backup": src.name})
     return {"ok": True, "backup": src.name}
 
@@ -124,6 +314,7 @@ def run_full_check(*, actor: str) -> dict[str, Any]:
     backup(actor=actor, reason="manual_full_check")
     check = integrity_check()
     checksums = compute_checksums(actor=actor)
+    verified = verify_checksums()
     pruned_catalog = cleanup_offline(actor=actor)
     pruned_logs = prune_audit_logs()
     write_audit(
@@ -132,8 +323,16 @@ def run_full_check(*, actor: str) -> dict[str, Any]:
         {
             "integrity": check,
             "checksums": checksums,
+            "checksums_verified": verified,
             "pruned_model_catalog": pruned_catalog,
             "pruned_audit_logs": pruned_logs,
         },
     )
-    return {"ok": True, "integrity": check, "checksums": checksums, "pruned_model_catalog": pruned_catalog, "pruned_audit_logs": pruned_logs}
+    return {
+        "ok": True,
+        "integrity": check,
+        "checksums": checksums,
+        "checksums_verified": verified,
+        "pruned_model_catalog": pruned_catalog,
+        "pruned_audit_logs": pruned_logs,
+    }
@@ -2,22 +2,31 @@ from __future__ import annotations
 
 import asyncio
 import json
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
-from time import time
-from typing import Any
+from time import perf_counter, time
+from typing import Any, Awaitable, Callable
 
 from ..db import open_db
 from ..settings import settings
 from .provider_health import monitor as provider_health_monitor
-from .memory import store as memory_store
-from .control_store import get_json
-from .research import tick_research_jobs
+from .cron import CronError, next_run_ms
+from .job_queue import job_queue
 from .dreaming import run_dreaming
 from .timeline import TimelineBuildConfig, build_timeline
 from .self_heal import daily_tick as self_heal_daily_tick
 
 
+OVERLAP_POLICIES = ("skip", "queue")
+
+# 每种任务类型的默认超时与并发上限；payload 可覆盖 timeout_seconds/overlap。
+TASK_TYPES: dict[str, dict[str, Any]] = {
+    "timeline_build": {"timeout_seconds": 1800, "max_concurrency": 1},
+    "dreaming": {"timeout_seconds": 600, "max_concurrency": 1},
+    "automation_rule": {"timeout_seconds": 30, "max_concurrency": 4},
+}
+
+
 def _now_ms() -> int:
     return int(time() * 1000)
 
@@ -28,135 +37,341 @@ def _db():
 
 
 @dataclass
+class JobStats:
+    runs: int = 0
+    running: bool = False
+    last_run_unix_ms: int | None = None
+    last_duration_ms: int | None = None
+    last_status: str | None = None
+    last_error: str | None = None
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "running": self.running,
+            "last_run_unix_ms": self.last_run_unix_ms,
+            "last_duration_ms": self.last_duration_ms,
+            "last_status": self.last_status,
+            "last_error": self.last_error,
+        }
+
+
+@dataclass
+class SystemJob:
+    name: str
+    interval_seconds: float
+    timeout_seconds: float
+    fn: Callable[[], Awaitable[Any]]
+    stats: JobStats = field(default_factory=JobStats)
+
+
+async def _tick_self_heal() -> None:
+    await asyncio.to_thread(self_heal_daily_tick, actor="task_runner")
+
+
+def parse_task_payload(row: dict[str, Any]) -> dict[str, Any] | None:
+    try:
+        payload = json.loads(row.get("payload_json") or "{}")
+    except Exception:
+        return None
+    return payload if isinstance(payload, dict) else None
+
+
+def compute_next_run(row: dict[str, Any], payload: dict[str, Any] | None, now: int, *, after_run: bool = False) -> int | None:
+    # 无法调度（未知类型、非法 cron、无间隔）时返回 None，不进入到期索引。
+    if payload is None or payload.get("type") not in TASK_HANDLERS:
+        return None
+    cron = row.get("cron")
+    if isinstance(cron, str) and cron.strip():
+        try:
+            return next_run_ms(cron, now)
+        except CronError:
+            return None
+    interval_seconds = payload.get("interval_seconds")
+    if not isinstance(interval_seconds, int) or interval_seconds <= 0:
+        return None
+    if after_run:
+        return now + interval_seconds * 1000
+    last = row.get("last_run_unix_ms")
+    if not isinstance(last, int):
+        legacy = payload.get("last_run_unix_ms")
+        last = int(legacy) if isinstance(legacy, int) else 0
+    return max(now, last + interval_seconds * 1000) if last else now
+
+
+async def _run_timeline_build(payload: dict[str, Any]) -> str:
+    diary_root = payload.get("diary_root")
+    project_base_path = payload.get("project_base_path")
+    timeline_dir = payload.get("timeline_dir")
+    summary_model = payload.get("summary_model") or settings.llm_model or "default"
+    min_content_length = payload.get("min_content_length", 100)
+    max_files = payload.get("max_files")
+
+    if not isinstance(diary_root, str) or not isinstance(project_base_path, str):
+        raise ValueError("diary_root and project_base_path are required")
+    if timeline_dir is not None and not isinstance(timeline_dir, str):
+        raise ValueError("timeline_dir must be a string")
+    if not isinstance(min_content_length, int):
+        min_content_length = 100
+    if max_files is not None and not isinstance(max_files, int):
+        max_files = None
+
+    cfg = TimelineBuildConfig(
+        diary_root=Path(diary_root),
+        project_base_path=Path(project_base_path),
+        timeline_dir=Path(timeline_dir) if timeline_dir else Path(project_base_path) / "timeline",
+        summary_model=str(summary_model),
+        min_content_length=min_content_length,
+        max_files=max_files,
+    )
+    result = await build_timeline(cfg, wait_ms_if_busy=0)
+    if not isinstance(result, dict) or result.get("status") == "busy":
+        return "busy"
+    return "ok"
+
+
+async def _run_dreaming(payload: dict[str, Any]) -> str:
+    max_items = payload.get("max_items", 10)
+    collection = payload.get("collection", "shared")
+    if not isinstance(max_items, int):
+        max_items = 10
+    if not isinstance(collection, str):
+        collection = "shared"
+    await run_dreaming(max_items=max_items, collection=collection)
+    return "ok"
+
+
+async def _run_automation_rule(payload: dict[str, Any]) -> str:
+    # 定时任务只负责把规则投入 job_queue，实际执行与重试由队列 worker 完成。
+    rule_id = payload.get("rule_id")
+    if not isinstance(rule_id, int):
+        raise ValueError("rule_id is required")
+    priority = payload.get("priority", 0)
+    job_queue.enqueue("automation_rule", {"rule_id": rule_id}, priority=priority if isinstance(priority, int) else 0, rule_id=rule_id)
+    return "ok"
+
+
+TASK_HANDLERS: dict[str, Callable[[dict[str, Any]], Awaitable[str]]] = {
+    "timeline_build": _run_timeline_build,
+    "dreaming": _run_dreaming,
+    "automation_rule": _run_automation_rule,
+}
+
+
 class TaskRunner:
-    poll_seconds: float = 5.0
-    _task: asyncio.Task | None = None
-    _stop: asyncio.Event | None = None
+    def __init__(self, poll_seconds: float = 5.0, max_idle_seconds: float = 60.0, dispatch_batch: int = 256) -> None:
+        self.poll_seconds = poll_seconds
+        self.max_idle_seconds = max_idle_seconds
+        self.dispatch_batch = dispatch_batch
+        self.next_due_unix_ms: int | None = None
+        self._stop: asyncio.Event | None = None
+        self._wake: asyncio.Event | None = None
+        self._loops: list[asyncio.Task] = []
+        self._running: dict[int, asyncio.Task] = {}
+        self._queued: set[int] = set()
+        self._type_limits: dict[str, asyncio.Semaphore] = {}
+        self._global_limit: asyncio.Semaphore | None = None
+        self.system_jobs = [
+            SystemJob("provider_health", poll_seconds, 120, provider_health_monitor.tick),
+            SystemJob("self_heal", 60, 1800, _tick_self_heal),
+        ]
 
     def start(self) -> None:
-        if self._task and not self._task.done():
+        if any(not t.done() for t in self._loops):
             return
         self._stop = asyncio.Event()
-        self._task = asyncio.create_task(self._loop())
+        self._wake = asyncio.Event()
+        self._global_limit = asyncio.Semaphore(max(1, settings.task_max_concurrency))
+        self._type_limits = {k: asyncio.Semaphore(int(v["max_concurrency"])) for k, v in TASK_TYPES.items()}
+        self._loops = [asyncio.create_task(self._system_loop(job)) for job in self.system_jobs]
+        self._loops.append(asyncio.create_task(self._dispatch_loop()))
 
     async def stop(self) -> None:
         if self._stop:
             self._stop.set()
-        if self._task:
+        self.wake()
+        for t in list(self._running.values()):
+            t.cancel()
+        for t in [*self._loops, *self._running.values()]:
             try:
-                await self._task
-            except Exception:
+                await t
+            except BaseException:
                 pass
+        self._loops = []
+        self._running.clear()
+        self._queued.clear()
+
+    def wake(self) -> None:
+        # 任务增删改后调用，让调度循环立即重新计算最早到期时间。
+        if self._wake is not None:
+            self._wake.set()
 
-    async def _loop(self) -> None:
+    async def _sleep(self, seconds: float) -> None:
         assert self._stop is not None
+        try:
+            await asyncio.wait_for(self._stop.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _system_loop(self, job: SystemJob) -> None:
+        assert self._stop is not None
+        while not self._stop.is_set():
+            job.stats.running = True
+            status, error, started, duration = await self._timed(job.fn(), job.timeout_seconds)
+            job.stats.running = False
+            job.stats.runs += 1
+            job.stats.last_run_unix_ms = started
+            job.stats.last_duration_ms = duration
+            job.stats.last_status = status
+            job.stats.last_error = error
+            await self._sleep(job.interval_seconds)
+
+    async def _timed(self, aw: Awaitable[Any], timeout_seconds: float) -> tuple[str, str | None, int, int]:
+        started = _now_ms()
+        t0 = perf_counter()
+        status, error = "ok", None
+        try:
+            result = await asyncio.wait_for(aw, timeout=timeout_seconds)
+            if isinstance(result, str):
+                status = result
+        except asyncio.TimeoutError:
+            status, error = "timeout", f"exceeded {timeout_seconds}s"
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            status, error = "error", f"{type(e).__name__}: {e}"
+        return status, error, started, int((perf_counter() - t0) * 1000)
+
+    async def _dispatch_loop(self) -> None:
+        assert self._stop is not None and self._wake is not None
+        try:
+            self._backfill()
+        except Exception:
+            pass
         while not self._stop.is_set():
             try:
-                await self._tick()
+                delay = self._dispatch()
             except Exception:
+                delay = self.poll_seconds
+            # 睡到最早到期的任务，或被 wake() 提前唤醒。
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=delay)
+            except asyncio.TimeoutError:
                 pass
-            await asyncio.sleep(self.poll_seconds)
+            self._wake.clear()
 
-    async def _tick(self) -> None:
+    def _backfill(self) -> None:
+        # 迁移前创建的任务没有 next_run_unix_ms，启动时补算一次。
+        now = _now_ms()
         conn = _db()
-        rows = conn.execute("SELECT * FROM tasks WHERE enabled=1 ORDER BY id ASC").fetchall()
-        tasks = [dict(r) for r in rows]
+        rows = [dict(r) for r in conn.execute("SELECT * FROM tasks WHERE enabled=1 AND next_run_unix_ms IS NULL").fetchall()]
+        updates = [(compute_next_run(t, parse_task_payload(t), now), t["id"]) for t in rows]
+        updates = [u for u in updates if u[0] is not None]
+        if updates:
+            conn.executemany("UPDATE tasks SET next_run_unix_ms=? WHERE id=?", updates)
+            conn.commit()
         conn.close()
 
-        for t in tasks:
-            payload = {}
-            try:
-                payload = json.loads(t.get("payload_json") or "{}")
-            except Exception:
-                payload = {}
-
-            if not isinstance(payload, dict):
-                continue
-            if payload.get("type") != "timeline_build":
-                pass
-            else:
-                interval_seconds = payload.get("interval_seconds")
-                if not isinstance(interval_seconds, int) or interval_seconds <= 0:
-                    continue
-
-                last_run = payload.get("last_run_unix_ms")
-                last_run = int(last_run) if isinstance(last_run, int) else 0
-                now = _now_ms()
-                if last_run and now - last_run < interval_seconds * 1000:
-                    continue
-
-                diary_root = payload.get("diary_root")
-                project_base_path = payload.get("project_base_path")
-                timeline_dir = payload.get("timeline_dir")
-                summary_model = payload.get("summary_model") or settings.llm_model or "default"
-                min_content_length = payload.get("min_content_length", 100)
-                max_files = payload.get("max_files")
-
-                if not isinstance(diary_root, str) or not isinstance(project_base_path, str):
-                    continue
-                if timeline_dir is not None and not isinstance(timeline_dir, str):
-                    continue
-                if not isinstance(min_content_length, int):
-                    min_content_length = 100
-                if max_files is not None and not isinstance(max_files, int):
-                    max_files = None
-
-                cfg = TimelineBuildConfig(
-                    diary_root=Path(diary_root),
-                    project_base_path=Path(project_base_path),
-                    timeline_dir=Path(timeline_dir) if timeline_dir else Path(project_base_path) / "timeline",
-                    summary_model=str(summary_model),
-                    min_content_length=min_content_length,
-                    max_files=max_files,
-                )
-
-                result = await build_timeline(cfg, wait_ms_if_busy=0)
-                if not isinstance(result, dict) or result.get("status") == "busy":
-                    continue
-
-                payload["last_run_unix_ms"] = now
-                self._update_task_payload(int(t["id"]), payload)
+    def _dispatch(self) -> float:
+        now = _now_ms()
+        conn = _db()
+        rows = conn.execute(
+            "SELECT * FROM tasks WHERE enabled=1 AND next_run_unix_ms<=? ORDER BY next_run_unix_ms ASC LIMIT ?",
+            (now, self.dispatch_batch),
+        ).fetchall()
+        updates: list[tuple[int | None, int]] = []
+        launches: list[tuple[int, dict[str, Any]]] = []
+        for r in rows:
+            t = dict(r)
+            task_id = int(t["id"])
+            payload = parse_task_payload(t)
+            # 先推进 next_run 再启动，避免同一时间点被重复领取。
+            updates.append((compute_next_run(t, payload, now, after_run=True), task_id))
+            if payload is None or payload.get("type") not in TASK_HANDLERS:
                 continue
-            if payload.get("type") != "dreaming":
+            if task_id in self._running:
+                if payload.get("overlap") == "queue":
+                    self._queued.add(task_id)
                 continue
+            launches.append((task_id, payload))
+        if updates:
+            conn.executemany("UPDATE tasks SET next_run_unix_ms=? WHERE id=?", updates)
+            conn.commit()
+        row = conn.execute("SELECT MIN(next_run_unix_ms) FROM tasks WHERE enabled=1 AND next_run_unix_ms IS NOT NULL").fetchone()
+        conn.close()
 
-            interval_seconds = payload.get("interval_seconds")
-            if not isinstance(interval_seconds, int) or interval_seconds <= 0:
-                continue
-            last_run = payload.get("last_run_unix_ms")
-            last_run = int(last_run) if isinstance(last_run, int) else 0
-            now = _now_ms()
-            if last_run and now - last_run < interval_seconds * 1000:
-                continue
+        for task_id, payload in launches:
+            self._launch(task_id, payload)
 
-            max_items = payload.get("max_items", 10)
-            collection = payload.get("collection", "shared")
-            if not isinstance(max_items, int):
-                max_items = 10
-            if not isinstance(collection, str):
-                collection = "shared"
-            await run_dreaming(max_items=max_items, collection=collection)
-
-            payload["last_run_unix_ms"] = now
-            self._update_task_payload(int(t["id"]), payload)
-
-        await provider_health_monitor.tick()
-        memory_store.sync_indexes(limit=200)
-        base = get_json("web.searxng_base_url")
-        await tick_research_jobs(base if isinstance(base, str) else None)
+        self.next_due_unix_ms = int(row[0]) if row and row[0] is not None else None
+        if self.next_due_unix_ms is None:
+            return self.max_idle_seconds
+        return min(max((self.next_due_unix_ms - _now_ms()) / 1000, 0.0), self.max_idle_seconds)
+
+    def _launch(self, task_id: int, payload: dict[str, Any]) -> None:
+        task = asyncio.create_task(self._run_task(task_id, payload))
+        self._running[task_id] = task
+
+        def _done(_: asyncio.Task) -> None:
+            self._running.pop(task_id, None)
+            if task_id in self._queued and self._stop is not None and not self._stop.is_set():
+                self._queued.discard(task_id)
+                latest = self._queued_payload(task_id)
+                if latest is not None:
+                    self._launch(task_id, latest)
+
+        task.add_done_callback(_done)
+
+    def _queued_payload(self, task_id: int) -> dict[str, Any] | None:
+        # 排队期间任务可能被修改、停用或删除，补跑前按最新配置重新读取。
         try:
-            self_heal_daily_tick(actor="task_runner")
+            conn = _db()
+            row = conn.execute("SELECT * FROM tasks WHERE id=? AND enabled=1", (task_id,)).fetchone()
+            conn.close()
         except Exception:
-            pass
+            return None
+        payload = parse_task_payload(dict(row)) if row else None
+        if payload is None or payload.get("type") not in TASK_HANDLERS or payload.get("overlap") != "queue":
+            return None
+        return payload
+
+    async def _run_task(self, task_id: int, payload: dict[str, Any]) -> None:
+        assert self._global_limit is not None
+        kind = str(payload["type"])
+        defaults = TASK_TYPES[kind]
+        timeout = payload.get("timeout_seconds")
+        if not isinstance(timeout, (int, float)) or timeout <= 0:
+            timeout = defaults["timeout_seconds"]
+        async with self._type_limits[kind], self._global_limit:
+            status, error, started, duration = await self._timed(TASK_HANDLERS[kind](payload), float(timeout))
+        self._record_run(task_id, status, error, started, duration)
 
-    def _update_task_payload(self, task_id: int, payload: dict[str, Any]) -> None:
+    def _record_run(self, task_id: int, status: str, error: str | None, started: int, duration: int) -> None:
         conn = _db()
-        conn.execute(
-            "UPDATE tasks SET payload_json=?, updated_at_unix_ms=? WHERE id=?",
-            (json.dumps(payload, ensure_ascii=False), _now_ms(), task_id),
-        )
+        # busy 表示同类任务正被其他入口占用，不计入 last_run，poll_seconds 后重试。
+        if status == "busy":
+            retry = _now_ms() + int(self.poll_seconds * 1000)
+            conn.execute(
+                "UPDATE tasks SET last_status=?, last_error=NULL, next_run_unix_ms=MIN(COALESCE(next_run_unix_ms, ?), ?) WHERE id=?",
+                (status, retry, retry, task_id),
+            )
+        else:
+            conn.execute(
+                "UPDATE tasks SET last_run_unix_ms=?, last_duration_ms=?, last_status=?, last_error=?, run_count=run_count+1 WHERE id=?",
+                (started, duration, status, error, task_id),
+            )
         conn.commit()
         conn.close()
+        if status == "busy":
+            self.wake()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "system_jobs": {j.name: {**j.stats.to_dict(), "interval_seconds": j.interval_seconds} for j in self.system_jobs},
+            "running_tasks": sorted(self._running),
+            "queued_tasks": sorted(self._queued),
+            "next_due_unix_ms": self.next_due_unix_ms,
+        }
 
 
 runner = TaskRunner()
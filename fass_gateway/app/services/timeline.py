@@ -4,7 +4,9 @@ import asyncio
 import hashlib
 import json
 import os
+import random
 import re
+import sqlite3
 import time
 from dataclasses import dataclass
 from pathlib import Path
@@ -15,6 +17,7 @@ from .llm_proxy import proxy_chat_completions
 from .memory import store
 
 
+_TRANSIENT_RE = re.compile(r"upstream (?:network error|408|409|425|429|5\d\d)", re.IGNORECASE)
 _DATE_RE = re.compile(r"^(?:\[(\d{4}[\.\-]\d{1,2}[\.\-]\d{1,2})\]\s*-\s*(.+)|(\d{4}[\.\-]\d{1,2}[\.\-]\d{1,2})-(.+))$")
 
 
@@ -40,8 +43,11 @@ def _read_json(path: Path, default: Any) -> Any:
 
 
 def _write_json(path: Path, data: Any) -> None:
+    # 先写临时文件再原子替换，中途崩溃不会留下半个 JSON。
     path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
 
 
 @dataclass(frozen=True)
@@ -59,6 +65,89 @@ class TimelineBuildConfig:
     )
 
 
+@dataclass
+class _Pending:
+    normalized_path: str
+    content: str
+    hash: str
+    date_str: str
+    character: str
+    size: int
+    mtime_ns: int
+
+
+# 这些状态在文件未变化时无需重做；error/fallback 等会在下次构建重试。
+_FINAL_STATUSES = ("summarized", "ignored")
+
+
+class _ProcessedFiles:
+    def __init__(self, db_path: Path) -> None:
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL;")
+        self.conn.executescript(
+            """
+CREATE TABLE IF NOT EXISTS processed_files (
+  path TEXT PRIMARY KEY,
+  size INTEGER NOT NULL,
+  mtime_ns INTEGER NOT NULL,
+  hash TEXT NOT NULL,
+  status TEXT NOT NULL,
+  first_processed_unix_ms INTEGER NOT NULL,
+  updated_at_unix_ms INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_processed_files_status ON processed_files(status);
+"""
+        )
+        self._staged: list[tuple[str, int, int, str, str, int, int]] = []
+
+    def import_legacy(self, json_path: Path) -> None:
+        # 旧版 processed_files_db.json 一次性导入；stat 未知，首次构建按 hash 校验后补齐。
+        if not json_path.exists() or self.conn.execute("SELECT 1 FROM processed_files LIMIT 1").fetchone():
+            return
+        data = _read_json(json_path, {})
+        if not isinstance(data, dict):
+            return
+        now = _now_ms()
+        rows = [
+            (str(path), -1, -1, str(rec["hash"]), str(rec.get("status") or ""), now, now)
+            for path, rec in data.items()
+            if isinstance(rec, dict) and rec.get("hash")
+        ]
+        self.conn.executemany("INSERT OR IGNORE INTO processed_files VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        self.conn.commit()
+
+    def get(self, path: str) -> sqlite3.Row | None:
+        return self.conn.execute("SELECT * FROM processed_files WHERE path=?", (path,)).fetchone()
+
+    def stage(self, path: str, size: int, mtime_ns: int, file_hash: str, status: str) -> None:
+        now = _now_ms()
+        self._staged.append((path, size, mtime_ns, file_hash, status, now, now))
+
+    def commit(self) -> None:
+        if not self._staged:
+            return
+        self.conn.executemany(
+            "INSERT INTO processed_files VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(path) DO UPDATE SET size=excluded.size, mtime_ns=excluded.mtime_ns, hash=excluded.hash, status=excluded.status, updated_at_unix_ms=excluded.updated_at_unix_ms",
+            self._staged,
+        )
+        self.conn.commit()
+        self._staged.clear()
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def _empty_timeline(character: str) -> dict[str, Any]:
+    return {"character": character, "lastUpdated": "", "version": "1.0.0", "entries": {}}
+
+
+def summary_concurrency(model: str) -> int:
+    limit = settings.timeline_summary_concurrency_by_model.get(model, settings.timeline_summary_concurrency)
+    return max(1, int(limit))
+
+
 class _Lock:
     def __init__(self, lock_path: Path, *, stale_ms: int = 6 * 3600 * 1000) -> None:
         self.lock_path = lock_path
@@ -107,22 +196,30 @@ def _summary_system_prompt() -> str:
 
 
 async def _summarize(text: str, *, model: str) -> tuple[str | None, str]:
-    try:
-        resp = await proxy_chat_completions(
-            {
-                "model": model or settings.llm_model or "default",
-                "messages": [
-                    {"role": "system", "content": _summary_system_prompt()},
-                    {"role": "user", "content": text},
-                ],
-                "stream": False,
-            }
-        )
-    except Exception as e:
-        msg = str(e)
-        if "no candidates returned" in msg.lower():
-            return None, "skipped_sensitive"
-        return None, "error"
+    attempt = 0
+    while True:
+        try:
+            resp = await proxy_chat_completions(
+                {
+                    "model": model or settings.llm_model or "default",
+                    "messages": [
+                        {"role": "system", "content": _summary_system_prompt()},
+                        {"role": "user", "content": text},
+                    ],
+                    "stream": False,
+                }
+            )
+            break
+        except Exception as e:
+            msg = str(e)
+            if "no candidates returned" in msg.lower():
+                return None, "skipped_sensitive"
+            # 仅对网络错误、限流与 5xx 退避重试，其余错误直接记为 error。
+            if attempt >= settings.timeline_summary_retries or not _TRANSIENT_RE.search(msg):
+                return None, "error"
+            delay = settings.timeline_summary_retry_base_seconds * (2**attempt)
+            await asyncio.sleep(delay * (0.5 + random.random() / 2))
+            attempt += 1
 
     content = ((resp.get("choices") or [{}])[0].get("message") or {}).get("content") or ""
     m = re.search(r"<<<summary>>>(.*?)<<<\s*\/?\s*summary\s*>>>", content, re.IGNORECASE | re.DOTALL)
@@ -144,11 +241,9 @@ async def build_timeline(cfg: TimelineBuildConfig, *, wait_ms_if_busy: int = 0)
         waited += 200
 
     async with _GLOBAL_ASYNC_LOCK:
+        processed = _ProcessedFiles(cfg.timeline_dir / "processed_files.sqlite")
         try:
-            processed_db_path = cfg.timeline_dir / "processed_files_db.json"
-            processed_db = _read_json(processed_db_path, {})
-            if not isinstance(processed_db, dict):
-                processed_db = {}
+            processed.import_legacy(cfg.timeline_dir / "processed_files_db.json")
 
             files: list[Path] = []
             for p in cfg.diary_root.rglob("*"):
@@ -171,97 +266,130 @@ async def build_timeline(cfg: TimelineBuildConfig, *, wait_ms_if_busy: int = 0)
             timeline_paths: set[str] = set()
             entries_written = 0
 
+            pending: list[_Pending] = []
             for fp in files:
+                normalized_path = fp.resolve().as_posix()
+                st = fp.stat()
+                record = processed.get(normalized_path)
+                # 大小与 mtime 未变且已处理完成的文件只看 stat，不再读取与哈希。
+                if record and record["size"] == st.st_size and record["mtime_ns"] == st.st_mtime_ns and record["status"] in _FINAL_STATUSES:
+                    skipped += 1
+                    continue
+
                 try:
                     content = fp.read_text(encoding="utf-8")
                 except Exception:
                     content = fp.read_text(encoding="utf-8", errors="ignore")
+                h = _sha256_text(content)
                 if len(content) < cfg.min_content_length:
+                    processed.stage(normalized_path, st.st_size, st.st_mtime_ns, h, "ignored")
                     skipped += 1
                     continue
 
                 first_line = content.splitlines()[0].strip() if content else ""
                 m = _DATE_RE.match(first_line)
                 if not m:
+                    processed.stage(normalized_path, st.st_size, st.st_mtime_ns, h, "ignored")
                     skipped += 1
                     continue
                 date_str = (m.group(1) or m.group(3) or "").replace(".", "-")
                 character = (m.group(2) or m.group(4) or "").strip()
                 character = character.strip()
                 if not date_str or not character:
+                    processed.stage(normalized_path, st.st_size, st.st_mtime_ns, h, "ignored")
                     skipped += 1
                     continue
 
-                normalized_path = fp.resolve().as_posix()
-                h = _sha256_text(content)
-                record = processed_db.get(normalized_path) if isinstance(processed_db, dict) else None
-                if isinstance(record, dict) and record.get("hash") == h and record.get("status") == "summarized":
+                if record and record["hash"] == h and record["status"] == "summarized":
+                    # 内容未变（仅 touch）：刷新 stat 以便下次直接跳过。
+                    processed.stage(normalized_path, st.st_size, st.st_mtime_ns, h, "summarized")
                     skipped += 1
                     continue
+                pending.append(_Pending(normalized_path, content, h, date_str, character, st.st_size, st.st_mtime_ns))
+            processed.commit()
 
-                summary, status = await _summarize(content, model=cfg.summary_model)
-                if status == "skipped_sensitive":
-                    processed_db[normalized_path] = {
-                        **(record if isinstance(record, dict) else {}),
-                        "hash": h,
-                        "status": "skipped_sensitive",
-                        "lastUpdated": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
-                        "firstProcessed": (record or {}).get("firstProcessed") if isinstance(record, dict) else time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
-                    }
-                    skipped += 1
-                    continue
+            limit = asyncio.Semaphore(summary_concurrency(cfg.summary_model))
 
-                summary_text = summary or content.strip().splitlines()[-1][:200]
+            async def _bounded(text: str) -> tuple[str | None, str]:
+                async with limit:
+                    return await _summarize(text, model=cfg.summary_model)
 
+            # 每个角色的 timeline 只读一次，条目在内存累积，按检查点统一写盘并批量写入 memory。
+            timelines: dict[Path, dict[str, Any]] = {}
+            dirty: set[Path] = set()
+            memory_items: list[dict[str, str]] = []
+
+            def _timeline(character: str) -> tuple[Path, dict[str, Any]]:
                 timeline_file = cfg.timeline_dir / f"{_safe_name(character)}_timeline.json"
-                timeline_data = _read_json(
-                    timeline_file,
-                    {"character": character, "lastUpdated": "", "version": "1.0.0", "entries": {}},
-                )
-                if not isinstance(timeline_data, dict):
-                    timeline_data = {"character": character, "lastUpdated": "", "version": "1.0.0", "entries": {}}
-                entries = timeline_data.get("entries")
-                if not isinstance(entries, dict):
-                    entries = {}
-                    timeline_data["entries"] = entries
-                day_list = entries.get(date_str)
-                if not isinstance(day_list, list):
-                    day_list = []
-                    entries[date_str] = day_list
-                if not any(isinstance(e, dict) and e.get("sourceHash") == h for e in day_list):
-                    day_list.append(
-                        {
-                            "summary": summary_text,
-                            "sourceHash": h,
-                            "sourcePath": normalized_path,
-                            "addedOn": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
-                        }
-                    )
-                    timeline_data["lastUpdated"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
-                    _write_json(timeline_file, timeline_data)
+                data = timelines.get(timeline_file)
+                if data is None:
+                    data = _read_json(timeline_file, _empty_timeline(character))
+                    if not isinstance(data, dict):
+                        data = _empty_timeline(character)
+                    if not isinstance(data.get("entries"), dict):
+                        data["entries"] = {}
+                    timelines[timeline_file] = data
+                return timeline_file, data
+
+            async def _checkpoint() -> None:
+                # 先落盘 timeline 与 memory，再提交处理状态；中途崩溃时未提交的文件下次重做。
+                for timeline_file in sorted(dirty):
+                    _write_json(timeline_file, timelines[timeline_file])
                     timeline_paths.add(str(timeline_file))
-                    entries_written += 1
-
-                    await store.upsert_texts(
-                        "timeline",
-                        [
+                dirty.clear()
+                if memory_items:
+                    await store.upsert_texts("timeline", list(memory_items))
+                    memory_items.clear()
+                processed.commit()
+
+            # 摘要并发执行，结果按文件顺序依次合并，保证输出与串行时一致。
+            jobs = [asyncio.create_task(_bounded(item.content)) for item in pending]
+            try:
+                for n, (item, job) in enumerate(zip(pending, jobs), 1):
+                    summary, status = await job
+                    normalized_path, h = item.normalized_path, item.hash
+                    date_str, character = item.date_str, item.character
+                    if status == "skipped_sensitive":
+                        processed.stage(normalized_path, item.size, item.mtime_ns, h, status)
+                        skipped += 1
+                        continue
+
+                    summary_text = summary or item.content.strip().splitlines()[-1][:200]
+
+                    timeline_file, timeline_data = _timeline(character)
+                    entries = timeline_data["entries"]
+                    day_list = entries.get(date_str)
+                    if not isinstance(day_list, list):
+                        day_list = []
+                        entries[date_str] = day_list
+                    if not any(isinstance(e, dict) and e.get("sourceHash") == h for e in day_list):
+                        day_list.append(
+                            {
+                                "summary": summary_text,
+                                "sourceHash": h,
+                                "sourcePath": normalized_path,
+                                "addedOn": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                            }
+                        )
+                        timeline_data["lastUpdated"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+                        dirty.add(timeline_file)
+                        entries_written += 1
+                        memory_items.append(
                             {
                                 "path": f"{_safe_name(character)}/{date_str}/{h}.txt",
                                 "content": f"{date_str} {character}: {summary_text}\nsource: {normalized_path}",
                             }
-                        ],
-                    )
-
-                processed_db[normalized_path] = {
-                    **(record if isinstance(record, dict) else {}),
-                    "hash": h,
-                    "status": status,
-                    "lastUpdated": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
-                    "firstProcessed": (record or {}).get("firstProcessed") if isinstance(record, dict) else time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
-                }
-                changed += 1
+                        )
 
-            _write_json(processed_db_path, processed_db)
+                    processed.stage(normalized_path, item.size, item.mtime_ns, h, status)
+                    changed += 1
+                    if n % max(1, settings.timeline_checkpoint_files) == 0:
+                        await _checkpoint()
+            finally:
+                for job in jobs:
+                    job.cancel()
+
+            await _checkpoint()
             return {
                 "ok": True,
                 "status": "done",
@@ -272,5 +400,5 @@ async def build_timeline(cfg: TimelineBuildConfig, *, wait_ms_if_busy: int = 0)
                 "elapsed_ms": _now_ms() - start,
             }
         finally:
+            processed.close()
             lock.release()
-
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+from pathlib import Path
+from time import time
+from typing import Any
+
+from ..db import open_db
+
+
+DEFAULT_STATS_WINDOW_MS = 24 * 3600 * 1000
+
+_EVENT_COLUMNS = (
+    "id, conversation_id, trace_id, parent_id, layer, from_agent, to_agent, event_kind, "
+    "raw_command_text, content, ts_unix_ms, status, provider_id, model_id"
+)
+
+
+def _now_ms() -> int:
+    return int(time() * 1000)
+
+
+def _db():
+    base = Path(__file__).resolve().parents[2]
+    return open_db(str(base / "data" / "fass_gateway.sqlite"))
+
+
+def encode_cursor(ts_unix_ms: int, event_id: int) -> str:
+    return f"{int(ts_unix_ms)}:{int(event_id)}"
+
+
+def decode_cursor(cursor: str) -> tuple[int, int]:
+    ts, sep, eid = cursor.partition(":")
+    if not sep:
+        raise ValueError("invalid cursor")
+    try:
+        return int(ts), int(eid)
+    except ValueError:
+        raise ValueError("invalid cursor") from None
+
+
+def list_events(
+    conversation_id: int,
+    *,
+    cursor: str | None = None,
+    since_unix_ms: int | None = None,
+    until_unix_ms: int | None = None,
+    layer: str | None = None,
+    order: str = "asc",
+    limit: int = 200,
+) -> dict[str, Any]:
+    if order not in ("asc", "desc"):
+        raise ValueError("order must be asc or desc")
+    # 键集分页：按 (ts_unix_ms, id) 排序，游标为上一页最后一行，走 idx_trace_events_conversation。
+    where = ["conversation_id=?"]
+    params: list[Any] = [int(conversation_id)]
+    if cursor:
+        ts, eid = decode_cursor(cursor)
+        where.append("(ts_unix_ms, id) > (?, ?)" if order == "asc" else "(ts_unix_ms, id) < (?, ?)")
+        params.extend([ts, eid])
+    if since_unix_ms is not None:
+        where.append("ts_unix_ms>=?")
+        params.append(int(since_unix_ms))
+    if until_unix_ms is not None:
+        where.append("ts_unix_ms<=?")
+        params.append(int(until_unix_ms))
+    if layer is not None:
+        where.append("layer=?")
+        params.append(str(layer))
+    direction = "ASC" if order == "asc" else "DESC"
+    limit = min(max(1, int(limit)), 1000)
+    sql = f"SELECT {_EVENT_COLUMNS} FROM trace_events WHERE {' AND '.join(where)} ORDER BY ts_unix_ms {direction}, id {direction} LIMIT ?"
+    params.append(limit + 1)
+    conn = _db()
+    rows = conn.execute(sql, tuple(params)).fetchall()
+    conn.close()
+    items = [dict(r) for r in rows[:limit]]
+    next_cursor = encode_cursor(items[-1]["ts_unix_ms"], items[-1]["id"]) if len(rows) > limit else None
+    return {"items": items, "next_cursor": next_cursor}
+
+
+def model_stats(
+    *,
+    since_unix_ms: int | None = None,
+    until_unix_ms: int | None = None,
+    provider_id: str | None = None,
+) -> dict[str, Any]:
+    until = int(until_unix_ms) if until_unix_ms is not None else _now_ms()
+    since = int(since_unix_ms) if since_unix_ms is not None else until - DEFAULT_STATS_WINDOW_MS
+    # 时间窗口内按 provider/model 聚合，只读覆盖索引 idx_trace_events_time_model。
+    where = ["ts_unix_ms>=?", "ts_unix_ms<=?"]
+    params: list[Any] = [since, until]
+    if provider_id is not None:
+        where.append("provider_id=?")
+        params.append(str(provider_id))
+    sql = f"""
+SELECT provider_id, model_id,
+  COUNT(*) AS events,
+  SUM(status='streaming') AS deltas,
+  SUM(status='done') AS done,
+  SUM(status='error') AS errors,
+  MIN(ts_unix_ms) AS first_ts_unix_ms,
+  MAX(ts_unix_ms) AS last_ts_unix_ms
+FROM trace_events INDEXED BY idx_trace_events_time_model
+WHERE {' AND '.join(where)}
+GROUP BY provider_id, model_id
+ORDER BY events DESC
+"""
+    conn = _db()
+    rows = conn.execute(sql, tuple(params)).fetchall()
+    conn.close()
+    return {"since_unix_ms": since, "until_unix_ms": until, "items": [dict(r) for r in rows]}
@@ -1,39 +1,299 @@
 from __future__ import annotations
 
 import asyncio
-from collections import defaultdict
-from typing import Any
+import itertools
+import json
+import os
+import socket
+from collections import OrderedDict, defaultdict, deque
+from pathlib import Path
+from time import monotonic, time
+from typing import Any, Callable
+from uuid import uuid4
 
+from ..db import open_db
+from ..settings import settings
+from .trace_writer import DELTA_STATUS
 
-class TraceHub:
-    def __init__(self) -> None:
-        self._subs: dict[int, set[asyncio.Queue]] = defaultdict(set)
-        self._lock = asyncio.Lock()
-
-    async def subscribe(self, conversation_id: int) -> asyncio.Queue:
-        q: asyncio.Queue = asyncio.Queue(maxsize=200)
-        async with self._lock:
-            self._subs[conversation_id].add(q)
-        return q
-
-    async def unsubscribe(self, conversation_id: int, q: asyncio.Queue) -> None:
-        async with self._lock:
-            s = self._subs.get(conversation_id)
-            if not s:
+
+SLOW_CONSUMER_POLICIES = ("coalesce", "drop_oldest", "disconnect")
+BROADCAST_BACKENDS = ("local", "unix", "sqlite")
+
+TraceItem = tuple[str, dict[str, Any]]
+Deliver = Callable[[int, str, dict[str, Any]], None]
+
+
+def _now_ms() -> int:
+    return int(time() * 1000)
+
+
+def _db():
+    base = Path(__file__).resolve().parents[2]
+    return open_db(str(base / "data" / "fass_gateway.sqlite"))
+
+
+class Subscription:
+    def __init__(self, maxsize: int, policy: str) -> None:
+        self.maxsize = maxsize
+        self.policy = policy
+        self.closed = False
+        self.dropped = 0
+        self._items: deque[TraceItem] = deque()
+        self._ready = asyncio.Event()
+
+    def push(self, item: TraceItem) -> None:
+        if self.closed:
+            return
+        if len(self._items) >= self.maxsize:
+            if self.policy == "disconnect":
+                # 断开后客户端带 Last-Event-ID 重连，由环形缓冲补齐。
+                self.closed = True
+                self._ready.set()
+                return
+            if self.policy == "coalesce" and self._coalesce(item):
                 return
-            s.discard(q)
-            if not s:
-                self._subs.pop(conversation_id, None)
-
-    async def publish(self, conversation_id: int, event: dict[str, Any]) -> None:
-        async with self._lock:
-            subs = list(self._subs.get(conversation_id, set()))
-        for q in subs:
+            self._items.popleft()
+            self.dropped += 1
+        self._items.append(item)
+        self._ready.set()
+
+    def _coalesce(self, item: TraceItem) -> bool:
+        # 只与队尾同一 trace 的增量合并，保证合并后的事件 id 仍按序。
+        eid, ev = item
+        if not self._items or ev.get("status") != DELTA_STATUS:
+            return False
+        _, last = self._items[-1]
+        if last.get("status") != DELTA_STATUS or last.get("trace_id") != ev.get("trace_id"):
+            return False
+        self._items[-1] = (eid, {**last, "content": (last.get("content") or "") + (ev.get("content") or ""), "ts_unix_ms": ev.get("ts_unix_ms")})
+        return True
+
+    async def get(self) -> TraceItem | None:
+        while not self._items:
+            if self.closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+        # 断开前已排队的事件先交付完，客户端重连时的 Last-Event-ID 才会前进。
+        return self._items.popleft()
+
+
+class _UnixSocketBroadcast:
+    name = "unix"
+
+    def __init__(self, directory: Path, deliver: Deliver) -> None:
+        self.directory = directory
+        self.deliver = deliver
+        self.path: Path | None = None
+        self.dropped = 0
+        self._transport: asyncio.DatagramTransport | None = None
+        self._sock: socket.socket | None = None
+        self._peers: list[Path] = []
+        self._peers_at = 0.0
+
+    async def start(self) -> None:
+        # 每个 worker 绑定一个 datagram socket，发布时直接发给目录下的其他 worker。
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.path = self.directory / f"{os.getpid()}-{uuid4().hex[:8]}.sock"
+        loop = asyncio.get_running_loop()
+        deliver = self.deliver
+
+        class _Protocol(asyncio.DatagramProtocol):
+            def datagram_received(self, data: bytes, addr: Any) -> None:
+                try:
+                    msg = json.loads(data)
+                    deliver(int(msg["c"]), str(msg["i"]), msg["e"])
+                except Exception:
+                    pass
+
+        self._transport, _ = await loop.create_datagram_endpoint(_Protocol, local_addr=str(self.path), family=socket.AF_UNIX)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.setblocking(False)
+
+    def _peer_paths(self) -> list[Path]:
+        now = monotonic()
+        if now - self._peers_at > 1.0:
+            self._peers = [p for p in self.directory.glob("*.sock") if p != self.path]
+            self._peers_at = now
+        return self._peers
+
+    def publish(self, conversation_id: int, event_id: str, ev: dict[str, Any]) -> None:
+        if self._sock is None:
+            return
+        data = json.dumps({"c": conversation_id, "i": event_id, "e": ev}, ensure_ascii=False).encode("utf-8")
+        for peer in self._peer_paths():
             try:
-                q.put_nowait(event)
+                self._sock.sendto(data, str(peer))
+            except (ConnectionRefusedError, FileNotFoundError):
+                # 对端进程已退出，清理残留 socket 文件。
+                peer.unlink(missing_ok=True)
+                self._peers_at = 0.0
+            except OSError:
+                self.dropped += 1
+
+    async def stop(self) -> None:
+        if self._transport is not None:
+            self._transport.close()
+        if self._sock is not None:
+            self._sock.close()
+        if self.path is not None:
+            self.path.unlink(missing_ok=True)
+
+
+class _SQLiteBroadcast:
+    name = "sqlite"
+
+    def __init__(self, deliver: Deliver, origin: str) -> None:
+        self.deliver = deliver
+        self.origin = origin
+        self.dropped = 0
+        self._pending: list[tuple[str, int, str, str, int]] = []
+        self._last_id = 0
+        self._conn = None
+        self._task: asyncio.Task | None = None
+        self._stop: asyncio.Event | None = None
+
+    async def start(self) -> None:
+        self._conn = _db()
+        self._last_id = int(self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM trace_broadcast").fetchone()[0])
+        self._stop = asyncio.Event()
+        self._task = asyncio.create_task(self._loop())
+
+    def publish(self, conversation_id: int, event_id: str, ev: dict[str, Any]) -> None:
+        self._pending.append((self.origin, conversation_id, event_id, json.dumps(ev, ensure_ascii=False), _now_ms()))
+
+    def _sync(self, pending: list[tuple[str, int, str, str, int]], prune: bool) -> list[Any]:
+        assert self._conn is not None
+        if pending:
+            self._conn.executemany(
+                "INSERT INTO trace_broadcast(origin, conversation_id, event_id, event_json, created_at_unix_ms) VALUES (?, ?, ?, ?, ?)",
+                pending,
+            )
+        if prune:
+            self._conn.execute("DELETE FROM trace_broadcast WHERE created_at_unix_ms<?", (_now_ms() - 60_000,))
+        self._conn.commit()
+        return self._conn.execute(
+            "SELECT id, conversation_id, event_id, event_json FROM trace_broadcast WHERE id>? AND origin!=? ORDER BY id ASC",
+            (self._last_id, self.origin),
+        ).fetchall()
+
+    async def _loop(self) -> None:
+        assert self._stop is not None
+        # 轮询表模拟 notify：批量写入本进程事件，读取其他进程新事件，定期清理一分钟前的记录。
+        for n in itertools.count():
+            pending, self._pending = self._pending, []
+            try:
+                rows = await asyncio.to_thread(self._sync, pending, n % 100 == 0)
             except Exception:
-                continue
+                self.dropped += len(pending)
+                rows = []
+            for r in rows:
+                self._last_id = max(self._last_id, int(r["id"]))
+                try:
+                    self.deliver(int(r["conversation_id"]), str(r["event_id"]), json.loads(r["event_json"]))
+                except Exception:
+                    continue
+            if self._stop.is_set():
+                break
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=settings.trace_broadcast_poll_ms / 1000)
+            except asyncio.TimeoutError:
+                pass
 
+    async def stop(self) -> None:
+        if self._stop is not None:
+            self._stop.set()
+        if self._task is not None:
+            try:
+                await self._task
+            except Exception:
+                pass
+        if self._conn is not None:
+            self._conn.close()
 
-hub = TraceHub()
 
+class TraceHub:
+    def __init__(self) -> None:
+        self._subs: dict[int, set[Subscription]] = defaultdict(set)
+        self._rings: OrderedDict[int, deque[TraceItem]] = OrderedDict()
+        self._instance = uuid4().hex[:8]
+        self._counter = itertools.count(1)
+        self._backend: _UnixSocketBroadcast | _SQLiteBroadcast | None = None
+        self.dropped = 0
+        self.disconnected = 0
+
+    async def start(self, backend: str | None = None) -> None:
+        kind = backend or settings.trace_broadcast_backend
+        if self._backend is not None or kind == "local":
+            return
+        if kind == "unix":
+            self._backend = _UnixSocketBroadcast(Path(settings.trace_broadcast_dir), self._deliver)
+        elif kind == "sqlite":
+            self._backend = _SQLiteBroadcast(self._deliver, self._instance)
+        else:
+            raise ValueError(f"unsupported trace_broadcast_backend: {kind}")
+        await self._backend.start()
+
+    async def stop(self) -> None:
+        if self._backend is not None:
+            await self._backend.stop()
+            self._backend = None
+
+    async def subscribe(self, conversation_id: int, last_event_id: str | None = None) -> Subscription:
+        sub = Subscription(max(1, settings.trace_subscriber_queue), settings.trace_slow_consumer_policy)
+        # 先回放环形缓冲（Last-Event-ID 之后的部分；找不到时回放全部），再登记订阅，中间没有 await。
+        items = list(self._rings.get(conversation_id, ()))
+        if last_event_id:
+            for i, (eid, _) in enumerate(items):
+                if eid == last_event_id:
+                    items = items[i + 1 :]
+                    break
+        # 回放不超过订阅队列容量，只保留最新的部分，避免一订阅就触发溢出策略。
+        if len(items) > sub.maxsize:
+            sub.dropped += len(items) - sub.maxsize
+            items = items[-sub.maxsize :]
+        sub._items.extend(items)
+        self._subs[conversation_id].add(sub)
+        return sub
+
+    async def unsubscribe(self, conversation_id: int, sub: Subscription) -> None:
+        s = self._subs.get(conversation_id)
+        if not s or sub not in s:
+            return
+        s.discard(sub)
+        self.dropped += sub.dropped
+        self.disconnected += int(sub.closed)
+        if not s:
+            self._subs.pop(conversation_id, None)
+
+    async def publish(self, conversation_id: int, event: dict[str, Any]) -> str:
+        event_id = f"{_now_ms()}-{self._instance}-{next(self._counter)}"
+        self._deliver(conversation_id, event_id, event)
+        if self._backend is not None:
+            self._backend.publish(conversation_id, event_id, event)
+        return event_id
+
+    def _deliver(self, conversation_id: int, event_id: str, event: dict[str, Any]) -> None:
+        ring = self._rings.get(conversation_id)
+        if ring is None:
+            ring = self._rings[conversation_id] = deque(maxlen=max(1, settings.trace_replay_buffer))
+            while len(self._rings) > settings.trace_hub_max_conversations:
+                self._rings.popitem(last=False)
+        self._rings.move_to_end(conversation_id)
+        ring.append((event_id, event))
+        for sub in list(self._subs.get(conversation_id, ())):
+            sub.push((event_id, event))
+
+    def stats(self) -> dict[str, Any]:
+        subs = [s for group in self._subs.values() for s in group]
+        return {
+            "backend": self._backend.name if self._backend is not None else "local",
+            "conversations": len(self._rings),
+            "subscribers": len(subs),
+            "dropped": self.dropped + sum(s.dropped for s in subs),
+            "disconnected": self.disconnected + sum(1 for s in subs if s.closed),
+            "broadcast_dropped": self._backend.dropped if self._backend is not None else 0,
+        }
+
+
+hub = TraceHub()
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import asyncio
+import sqlite3
+from pathlib import Path
+from typing import Any
+
+from ..db import open_db
+from ..settings import settings
+
+
+# 流式片段事件只存增量，最终事件（status=done）存完整内容。
+DELTA_STATUS = "streaming"
+
+_INSERT_SQL = """
+INSERT INTO trace_events(
+  conversation_id, trace_id, parent_id, layer, from_agent, to_agent, event_kind,
+  raw_command_text, content, ts_unix_ms, status, provider_id, model_id
+) VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?)
+"""
+
+
+def _db():
+    base = Path(__file__).resolve().parents[2]
+    return open_db(str(base / "data" / "fass_gateway.sqlite"))
+
+
+def _row(conversation_id: int, ev: dict[str, Any]) -> tuple:
+    return (
+        conversation_id,
+        ev.get("trace_id"),
+        ev.get("parent_id"),
+        ev.get("layer"),
+        ev.get("from_agent"),
+        ev.get("to_agent"),
+        ev.get("event_kind"),
+        ev.get("raw_command_text"),
+        ev.get("content"),
+        ev.get("ts_unix_ms"),
+        ev.get("status"),
+        ev.get("provider_id"),
+        ev.get("model_id"),
+    )
+
+
+def coalesce_deltas(batch: list[tuple[int, dict[str, Any]]]) -> list[tuple[int, dict[str, Any]]]:
+    # 同一批内同一 trace 的连续增量合并为一行；遇到该 trace 的非增量事件后重新开始。
+    out: list[tuple[int, dict[str, Any]]] = []
+    open_delta: dict[tuple[int, Any], int] = {}
+    for cid, ev in batch:
+        key = (cid, ev.get("trace_id"))
+        if ev.get("status") != DELTA_STATUS:
+            open_delta.pop(key, None)
+            out.append((cid, ev))
+            continue
+        idx = open_delta.get(key)
+        if idx is None:
+            open_delta[key] = len(out)
+            out.append((cid, dict(ev)))
+        else:
+            prev = out[idx][1]
+            prev["content"] = (prev.get("content") or "") + (ev.get("content") or "")
+    return out
+
+
+class TraceWriter:
+    def __init__(self) -> None:
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self._conn: sqlite3.Connection | None = None
+        self.written = 0
+        self.batches = 0
+        self.retries = 0
+        self.dropped = 0
+        self.last_error: str | None = None
+
+    def start(self) -> None:
+        if self._task and not self._task.done():
+            return
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._queue is not None and self._task is not None:
+            self._queue.put_nowait(None)
+            try:
+                await self._task
+            except Exception:
+                pass
+        self._queue = None
+        self._task = None
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def enqueue(self, conversation_id: int, ev: dict[str, Any]) -> None:
+        # 未启动（脚本/测试场景）时同步写入，保证事件不丢。
+        if self._queue is None:
+            self._write([(conversation_id, ev)])
+            return
+        self._queue.put_nowait((conversation_id, ev))
+
+    async def flush(self) -> None:
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def _loop(self) -> None:
+        assert self._queue is not None
+        q = self._queue
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await q.get()
+            taken = 1
+            batch: list[tuple[int, dict[str, Any]]] = []
+            if item is None:
+                stopping = True
+            else:
+                batch.append(item)
+            deadline = loop.time() + settings.trace_writer_flush_ms / 1000
+            # 攒批：达到条数上限或等待超过 flush 间隔即写入。
+            while not stopping and len(batch) < settings.trace_writer_batch_size:
+                try:
+                    item = q.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(q.get(), timeout=remaining)
+                    except asyncio.TimeoutError:
+                        break
+                taken += 1
+                if item is None:
+                    stopping = True
+                else:
+                    batch.append(item)
+            if stopping:
+                # 停止前把剩余事件一并写完。
+                while True:
+                    try:
+                        item = q.get_nowait()
+                    except asyncio.QueueEmpty:
+                        break
+                    taken += 1
+                    if item is not None:
+                        batch.append(item)
+            try:
+                if batch:
+                    await self._write_with_retry(batch)
+            finally:
+                for _ in range(taken):
+                    q.task_done()
+
+    async def _write_with_retry(self, batch: list[tuple[int, dict[str, Any]]]) -> None:
+        # 整批写入失败时按指数退避重试；仍失败则逐条写入，只丢弃写不进去的事件并计入 dropped。
+        attempts = max(1, settings.trace_writer_retry_attempts)
+        for i in range(attempts):
+            try:
+                await asyncio.to_thread(self._write, batch)
+                self.last_error = None
+                return
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+            if i + 1 < attempts:
+                self.retries += 1
+                await asyncio.sleep(settings.trace_writer_retry_ms / 1000 * (2**i))
+        await asyncio.to_thread(self._write_each, batch)
+
+    def _reset_conn(self) -> None:
+        # 出错后的连接可能处于未提交/损坏状态，丢弃后下次重新打开。
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+    def _write(self, batch: list[tuple[int, dict[str, Any]]]) -> None:
+        rows = [_row(cid, ev) for cid, ev in coalesce_deltas(batch)]
+        try:
+            if self._conn is None:
+                self._conn = _db()
+            self._conn.executemany(_INSERT_SQL, rows)
+            self._conn.commit()
+        except Exception:
+            self._reset_conn()
+            raise
+        self.written += len(rows)
+        self.batches += 1
+
+    def _write_each(self, batch: list[tuple[int, dict[str, Any]]]) -> None:
+        for cid, ev in coalesce_deltas(batch):
+            try:
+                if self._conn is None:
+                    self._conn = _db()
+                self._conn.execute(_INSERT_SQL, _row(cid, ev))
+                self._conn.commit()
+                self.written += 1
+            except Exception as e:
+                self._reset_conn()
+                self.dropped += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "written": self.written,
+            "batches": self.batches,
+            "retries": self.retries,
+            "dropped": self.dropped,
+            "last_error": self.last_error,
+        }
+
+
+trace_writer = TraceWriter()
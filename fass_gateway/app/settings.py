@@ -7,6 +7,20 @@ class Settings(BaseSettings):
 
     api_key: str | None = None
     audit_log_key: str | None = None
+    audit_writer_batch_size: int = 200
+    audit_writer_flush_ms: float = 200.0
+    audit_decrypt_workers: int = 4
+    audit_decrypt_parallel_min: int = 256
+    audit_export_page_size: int = 1000
+
+    backup_method: str = "backup_api"
+    backup_pages_per_step: int = 1024
+    backup_step_sleep_ms: float = 5.0
+    backup_max_restarts: int = 3
+    backup_compress: bool = False
+    backup_keep: int = 7
+    backup_keep_days: int = 30
+    checksum_batch_size: int = 1000
 
     fs_store_enabled: bool = True
     fs_store_dir: str = str((Path(__file__).resolve().parents[2] / "data" / "fs_store").resolve())
@@ -14,6 +28,74 @@ class Settings(BaseSettings):
     embedding_provider: str = "local"
     embedding_model_path: str = str((Path(__file__).resolve().parents[2] / "assets" / "models" / "embeddinggemma-300m").resolve())
     embedding_model: str = "default"
+    embedding_dim: int = 768
+    embedding_storage_dtype: str = "f32"
+
+    memory_fusion: str = "weighted"
+    memory_fusion_text_weight: float = 0.55
+    memory_fusion_vector_weight: float = 0.45
+    memory_fusion_rrf_k: float = 60.0
+    memory_search_cache_size: int = 1024
+    memory_search_cache_ttl_seconds: float = 60.0
+
+    index_sync_min_batch: int = 64
+    index_sync_max_batch: int = 1024
+    index_sync_target_batch_ms: float = 50.0
+    index_sync_commit_docs: int = 10_000
+    index_sync_commit_seconds: float = 2.0
+    index_sync_idle_seconds: float = 5.0
+
+    task_max_concurrency: int = 4
+
+    trace_writer_batch_size: int = 256
+    trace_writer_flush_ms: float = 50.0
+    trace_writer_retry_attempts: int = 3
+    trace_writer_retry_ms: float = 100.0
+    trace_replay_buffer: int = 500
+    trace_hub_max_conversations: int = 1000
+    trace_subscriber_queue: int = 200
+    trace_slow_consumer_policy: str = "coalesce"
+    trace_broadcast_backend: str = "local"
+    trace_broadcast_dir: str = "data/trace_sockets"
+    trace_broadcast_poll_ms: float = 100.0
+
+    retention_enabled: bool = True
+    retention_interval_seconds: float = 3600.0
+    retention_batch_size: int = 500
+    retention_batch_pause_ms: float = 20.0
+    retention_trace_days: int = 30
+    retention_trace_max_per_conversation: int = 20_000
+    retention_conversation_days: int = 90
+    retention_research_history_days: int = 90
+    retention_research_jobs_days: int = 30
+    retention_automation_jobs_days: int = 30
+    retention_vacuum_pages: int = 2000
+    retention_convert_vacuum: bool = False
+    retention_convert_min_free_pages: int = 10_000
+
+    job_queue_workers: int = 2
+    job_queue_claim_batch: int = 4
+    job_queue_lease_seconds: float = 300.0
+    job_queue_timeout_seconds: float = 1800.0
+    job_queue_max_attempts: int = 5
+    job_queue_retry_base_seconds: float = 10.0
+    job_queue_retry_max_seconds: float = 3600.0
+    job_queue_idle_seconds: float = 30.0
+
+    rerank_provider: str = "disabled"
+    rerank_model: str = ""
+    rerank_base_url: str | None = None
+    rerank_budget_ms: int = 300
+    rerank_fetch_multiplier: int = 4
+    rerank_max_inflight: int = 4
+
+    rag_token_budget: int = 1500
+
+    timeline_summary_concurrency: int = 4
+    timeline_summary_concurrency_by_model: dict[str, int] = {}
+    timeline_summary_retries: int = 3
+    timeline_summary_retry_base_seconds: float = 2.0
+    timeline_checkpoint_files: int = 200
 
     llm_provider: str = "openai_compat"
     llm_base_url: str = "http://localhost:11434"
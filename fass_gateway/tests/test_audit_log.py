@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from app.db import open_db
+from app.services import audit_log
+from app.settings import settings
+
+
+class TestAuditWriter(unittest.TestCase):
+    def setUp(self) -> None:
+        self._td = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._td.name, "t.sqlite")
+        self._old = (settings.audit_writer_batch_size, settings.audit_writer_flush_ms, settings.audit_log_key)
+        self._patch = mock.patch.object(audit_log, "_db", lambda: open_db(self.path))
+        self._patch.start()
+
+    def tearDown(self) -> None:
+        self._patch.stop()
+        settings.audit_writer_batch_size, settings.audit_writer_flush_ms, settings.audit_log_key = self._old
+        self._td.cleanup()
+
+    def _count(self) -> int:
+        conn = open_db(self.path)
+        n = int(conn.execute("SELECT COUNT(*) FROM audit_logs").fetchone()[0])
+        conn.close()
+        return n
+
+    def test_cipher_cached_per_key(self) -> None:
+        self.assertIs(audit_log._fernet(), audit_log._fernet())
+        before = audit_log._fernet()
+        settings.audit_log_key = "bXlzZWNyZXRrZXlteXNlY3JldGtleW15c2VjcmV0a2U="
+        self.assertIsNot(audit_log._fernet(), before)
+
+    def test_sync_write_when_not_started(self) -> None:
+        writer = audit_log.AuditWriter()
+        writer.write("t", "A", {"x": 1}, retention_days=1)
+        self.assertEqual(self._count(), 1)
+
+    def test_buffered_batches(self) -> None:
+        settings.audit_writer_batch_size = 1000
+        settings.audit_writer_flush_ms = 10_000
+        writer = audit_log.AuditWriter()
+        counts: list[int] = []
+
+        async def run() -> None:
+            writer.start()
+            for i in range(50):
+                writer.write("t", "A", {"i": i}, retention_days=1)
+            # 未达到批量上限且未到 flush 间隔，记录仍在缓冲中。
+            await asyncio.sleep(0.01)
+            counts.append(self._count())
+            for i in range(50, 60):
+                writer.write("t", "B", {"i": i}, retention_days=1)
+            await writer.stop()
+
+        asyncio.run(run())
+        self.assertEqual(counts, [0])
+        self.assertEqual(self._count(), 60)
+        self.assertEqual(writer.batches, 1)
+
+        with mock.patch.object(audit_log, "audit_writer", writer):
+            items = audit_log.list_logs(action="B", decrypt=True, limit=100)
+        self.assertEqual(sorted(x["payload"]["i"] for x in items), list(range(50, 60)))
+
+    def test_flush_on_batch_size(self) -> None:
+        settings.audit_writer_batch_size = 5
+        settings.audit_writer_flush_ms = 10_000
+        writer = audit_log.AuditWriter()
+
+        async def run() -> int:
+            writer.start()
+            for i in range(5):
+                writer.write("t", "A", {"i": i}, retention_days=1)
+            for _ in range(100):
+                await asyncio.sleep(0.01)
+                if writer.written:
+                    break
+            n = self._count()
+            await writer.stop()
+            return n
+
+        self.assertEqual(asyncio.run(run()), 5)
+
+
+class TestAuditSearch(unittest.TestCase):
+    def setUp(self) -> None:
+        self._td = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._td.name, "t.sqlite")
+        self._old = (settings.audit_decrypt_parallel_min, settings.audit_export_page_size)
+        self._patch = mock.patch.object(audit_log, "_db", lambda: open_db(self.path))
+        self._patch.start()
+        writer = audit_log.AuditWriter()
+        for i in range(30):
+            writer.write("alice" if i % 3 == 0 else "bob", "A" if i % 2 else "B", {"i": i}, retention_days=1)
+
+    def tearDown(self) -> None:
+        self._patch.stop()
+        settings.audit_decrypt_parallel_min, settings.audit_export_page_size = self._old
+        self._td.cleanup()
+
+    def test_keyset_pages_with_actor_filter(self) -> None:
+        seen: list[int] = []
+        cursor = None
+        while True:
+            page = audit_log.page_logs(actor="alice", cursor=cursor, limit=3, decrypt=True)
+            seen.extend(x["payload"]["i"] for x in page["items"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        self.assertEqual(seen, list(range(27, -1, -3)))
+
+    def test_parallel_decrypt_keeps_order(self) -> None:
+        settings.audit_decrypt_parallel_min = 2
+        items = audit_log.page_logs(limit=100, decrypt=True)["items"]
+        self.assertEqual([x["payload"]["i"] for x in items], list(range(29, -1, -1)))
+
+    def test_export_ndjson(self) -> None:
+        settings.audit_export_page_size = 4
+        lines = b"".join(audit_log.export_ndjson(action="A", decrypt=True)).decode("utf-8").splitlines()
+        self.assertEqual([json.loads(x)["payload"]["i"] for x in lines], list(range(29, 0, -2)))
+
+
+if __name__ == "__main__":
+    unittest.main()
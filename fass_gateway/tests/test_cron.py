@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from typing import Any
+from unittest import mock
+
+from app.db import open_db
+from app.services import task_runner as tr
+from app.services.cron import CronError, next_run_ms
+from app.services.task_runner import compute_next_run
+
+
+def _ms(*args: int) -> int:
+    return int(datetime(*args).timestamp() * 1000)
+
+
+class TestCron(unittest.TestCase):
+    def test_next_run(self) -> None:
+        self.assertEqual(next_run_ms("*/15 * * * *", _ms(2026, 1, 1, 10, 7)), _ms(2026, 1, 1, 10, 15))
+        self.assertEqual(next_run_ms("0 9 * * mon-fri", _ms(2026, 1, 3, 10, 0)), _ms(2026, 1, 5, 9, 0))
+        self.assertEqual(next_run_ms("@monthly", _ms(2026, 1, 31, 10, 0)), _ms(2026, 2, 1))
+        self.assertEqual(next_run_ms("0 0 29 2 *", _ms(2026, 3, 1)), _ms(2028, 2, 29))
+        # 日与星期都受限时取并集。
+        self.assertEqual(next_run_ms("30 8 1 * 5", _ms(2026, 1, 1, 9, 0)), _ms(2026, 1, 2, 8, 30))
+
+    def test_invalid(self) -> None:
+        for expr in ("* * *", "61 * * * *", "*/0 * * * *", "0 0 31 2 *"):
+            with self.assertRaises(CronError):
+                next_run_ms(expr, _ms(2026, 1, 1))
+
+
+class TestComputeNextRun(unittest.TestCase):
+    def test_cron_task(self) -> None:
+        now = _ms(2026, 1, 1, 10, 7)
+        row = {"cron": "*/15 * * * *"}
+        self.assertEqual(compute_next_run(row, {"type": "dreaming"}, now), _ms(2026, 1, 1, 10, 15))
+        self.assertIsNone(compute_next_run({"cron": "bad"}, {"type": "dreaming"}, now))
+        self.assertIsNone(compute_next_run(row, {"type": "unknown"}, now))
+
+    def test_interval_task(self) -> None:
+        now = _ms(2026, 1, 1, 10, 0)
+        payload = {"type": "dreaming", "interval_seconds": 600}
+        # 从未运行过的任务立即到期；运行后按间隔推进。
+        self.assertEqual(compute_next_run({}, payload, now), now)
+        self.assertEqual(compute_next_run({"last_run_unix_ms": now - 60_000}, payload, now), now + 540_000)
+        self.assertEqual(compute_next_run({"last_run_unix_ms": now - 60_000}, payload, now, after_run=True), now + 600_000)
+        self.assertIsNone(compute_next_run({}, {"type": "dreaming"}, now))
+
+
+class TestQueuedRun(unittest.TestCase):
+    def setUp(self) -> None:
+        self._td = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._td.name, "t.sqlite")
+        self._patch = mock.patch.object(tr, "_db", lambda: open_db(self.path))
+        self._patch.start()
+        conn = open_db(self.path)
+        self.task_id = int(
+            conn.execute(
+                "INSERT INTO tasks(name, cron, payload_json, enabled, created_at_unix_ms, updated_at_unix_ms) VALUES ('t', NULL, ?, 1, 0, 0)",
+                (json.dumps(self._payload("v1")),),
+            ).lastrowid
+        )
+        conn.commit()
+        conn.close()
+
+    def tearDown(self) -> None:
+        self._patch.stop()
+        self._td.cleanup()
+
+    def _payload(self, tag: str) -> dict[str, Any]:
+        return {"type": "dreaming", "overlap": "queue", "interval_seconds": 600, "tag": tag}
+
+    def _update(self, sql: str, params: tuple) -> None:
+        conn = open_db(self.path)
+        conn.execute(sql, params)
+        conn.commit()
+        conn.close()
+
+    def test_queued_run_uses_latest_row(self) -> None:
+        seen: list[str] = []
+
+        async def run() -> None:
+            release: asyncio.Queue = asyncio.Queue()
+
+            async def handler(payload: dict[str, Any]) -> None:
+                seen.append(payload["tag"])
+                await release.get()
+
+            runner = tr.TaskRunner()
+            runner._stop = asyncio.Event()
+            runner._global_limit = asyncio.Semaphore(4)
+            runner._type_limits = {k: asyncio.Semaphore(1) for k in tr.TASK_TYPES}
+            with mock.patch.dict(tr.TASK_HANDLERS, {"dreaming": handler}):
+                runner._launch(self.task_id, self._payload("v1"))
+                await asyncio.sleep(0)
+                # 排队期间任务被修改：补跑使用最新 payload。
+                runner._queued.add(self.task_id)
+                self._update("UPDATE tasks SET payload_json=? WHERE id=?", (json.dumps(self._payload("v2")), self.task_id))
+                release.put_nowait(None)
+                await asyncio.sleep(0.05)
+                self.assertIn(self.task_id, runner._running)
+                runner._queued.add(self.task_id)
+                # 再次排队后任务被停用：补跑被丢弃。
+                self._update("UPDATE tasks SET enabled=0 WHERE id=?", (self.task_id,))
+                release.put_nowait(None)
+                await asyncio.sleep(0.05)
+            self.assertEqual(runner._running, {})
+            self.assertEqual(runner._queued, set())
+
+        asyncio.run(run())
+        self.assertEqual(seen, ["v1", "v2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
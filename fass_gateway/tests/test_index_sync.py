@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+from time import time
+from typing import Any
+from unittest import mock
+
+from app.services import index_sync
+from app.services.memory import MemoryStore, _FallbackCore
+from app.settings import settings
+
+
+class TestIndexSync(unittest.TestCase):
+    def setUp(self) -> None:
+        self._td = tempfile.TemporaryDirectory()
+        self._keys = [k for k in type(settings).model_fields if k.startswith("index_sync_")] + ["embedding_provider", "fs_store_enabled"]
+        self._old = {k: getattr(settings, k) for k in self._keys}
+        settings.embedding_provider = "disabled"
+        settings.fs_store_enabled = False
+        settings.index_sync_idle_seconds = 60.0
+        self.store = MemoryStore(Path(self._td.name))
+        self.store._core = _FallbackCore(Path(self._td.name) / "fallback.sqlite")
+        # 回退核心没有 Tantivy/USearch 索引，用已同步条数模拟 index_tasks 积压。
+        self.synced = 0
+        self.limits: list[int] = []
+        self.commit_calls = 0
+        self.batch_ms = 0.0
+        self._patches = [
+            mock.patch.object(index_sync, "store", self.store),
+            mock.patch.object(self.store, "sync_indexes", self._sync),
+            mock.patch.object(self.store, "commit_indexes", self._commit),
+            mock.patch.object(self.store, "index_backlog", self._backlog),
+        ]
+        for p in self._patches:
+            p.start()
+
+    def tearDown(self) -> None:
+        for p in self._patches:
+            p.stop()
+        for k, v in self._old.items():
+            setattr(settings, k, v)
+        self._td.cleanup()
+
+    def _pending(self) -> int:
+        return int(self.store._core.conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]) - self.synced
+
+    def _sync(self, limit: int = 200, *, commit: bool = True) -> int:
+        self.limits.append(limit)
+        n = min(limit, self._pending())
+        self.synced += n
+        return n
+
+    def _commit(self) -> int:
+        self.commit_calls += 1
+        return 1
+
+    def _backlog(self) -> dict[str, Any]:
+        pending = self._pending()
+        return {"pending": pending, "failed": 0, "staged": 0, "oldest_pending_unix_ms": int(time() * 1000) - 5000 if pending else None}
+
+    def _seed(self, n: int) -> None:
+        self.store._core.upsert_documents("c", [{"path": f"u://{i}", "content": f"doc {i}"} for i in range(n)])
+
+    def test_wake_on_upsert_and_commit_after_drain(self) -> None:
+        worker = index_sync.IndexSyncWorker()
+
+        async def run() -> dict[str, Any]:
+            worker.start()
+            await asyncio.sleep(0.05)
+            self._seed(5)
+            stats = worker.stats()
+            self.assertEqual((stats["backlog"]["pending"], worker.synced_total), (5, 0))
+            self.assertGreaterEqual(stats["lag_ms"], 5000)
+            # 通过 upsert_texts 写入会通知 worker，不需要等空闲超时。
+            await self.store.upsert_texts("c", [{"path": "u://new", "content": "fresh"}])
+            for _ in range(100):
+                if worker.synced_total == 6:
+                    break
+                await asyncio.sleep(0.01)
+            out = worker.stats()
+            await worker.stop()
+            return out
+
+        stats = asyncio.run(run())
+        self.assertEqual(stats["synced_total"], 6)
+        self.assertEqual((stats["backlog"]["pending"], stats["lag_ms"]), (0, 0))
+        self.assertEqual((stats["commits"], self.commit_calls), (1, 1))
+
+    def test_batch_size_moves_between_min_and_max(self) -> None:
+        settings.index_sync_min_batch = 4
+        settings.index_sync_max_batch = 64
+        settings.index_sync_target_batch_ms = 10.0
+        worker = index_sync.IndexSyncWorker()
+        worker.batch_size = 4
+        # 快批：每步最多翻倍，直到上限。
+        for _ in range(6):
+            worker.last_batch_ms = 0.1
+            worker._adapt(worker.batch_size, worker.batch_size)
+        self.assertEqual(worker.batch_size, 64)
+        # 慢批：按单条耗时收缩到目标耗时对应的大小，不低于下限。
+        worker.last_batch_ms = 40.0
+        worker._adapt(64, 64)
+        self.assertEqual(worker.batch_size, 16)
+        worker.last_batch_ms = 1000.0
+        worker._adapt(16, 16)
+        self.assertEqual(worker.batch_size, 4)
+        # 积压已清空的小批不据此放大。
+        worker.last_batch_ms = 0.1
+        worker._adapt(2, 4)
+        self.assertEqual(worker.batch_size, 4)
+
+        self._seed(300)
+        worker._stop = asyncio.Event()
+        asyncio.run(worker._drain())
+        self.assertEqual(worker.synced_total, 300)
+        self.assertEqual(self.limits[:5], [4, 8, 16, 32, 64])
+        self.assertLessEqual(max(self.limits), 64)
+
+    def test_commit_policy(self) -> None:
+        settings.index_sync_min_batch = settings.index_sync_max_batch = 16
+        settings.index_sync_commit_docs = 50
+        settings.index_sync_commit_seconds = 1000.0
+        self._seed(200)
+        worker = index_sync.IndexSyncWorker()
+        worker._stop = asyncio.Event()
+        asyncio.run(worker._drain())
+        # 每满 50 条提交一次（64/128/192），积压清空后再提交剩余 8 条。
+        self.assertEqual(worker.commits, 4)
+
+        settings.index_sync_commit_docs = 1_000_000
+        settings.index_sync_commit_seconds = 0.0
+        self._seed(248)
+        before = worker.commits
+        asyncio.run(worker._drain())
+        # 按时间策略每批都提交；最后一批已提交，清空后无需再提交。
+        self.assertEqual(worker.commits - before, 3)
+        self.assertEqual(self.commit_calls, worker.commits)
+
+
+if __name__ == "__main__":
+    unittest.main()
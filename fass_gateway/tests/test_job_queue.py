@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import tempfile
+import unittest
+from typing import Any
+from unittest import mock
+
+from app.db import open_db
+from app.services import job_queue as jq
+from app.services import research
+from app.settings import settings
+
+
+class TestJobQueue(unittest.TestCase):
+    def setUp(self) -> None:
+        self._td = tempfile.TemporaryDirectory()
+        path = os.path.join(self._td.name, "q.sqlite")
+        self._patch = mock.patch.object(jq, "_db", lambda: open_db(path))
+        self._patch.start()
+        self.q = jq.JobQueue()
+        self._old = (settings.job_queue_lease_seconds, settings.job_queue_workers, settings.job_queue_claim_batch)
+
+    def tearDown(self) -> None:
+        self._patch.stop()
+        settings.job_queue_lease_seconds, settings.job_queue_workers, settings.job_queue_claim_batch = self._old
+        self._td.cleanup()
+
+    def _row(self, job_id: int) -> dict[str, Any]:
+        conn = jq._db()
+        row = dict(conn.execute("SELECT * FROM automation_jobs WHERE id=?", (job_id,)).fetchone())
+        conn.close()
+        return row
+
+    def test_claim_priority_and_exclusive(self) -> None:
+        low = self.q.enqueue("k", {"n": 1})
+        high = self.q.enqueue("k", {"n": 2}, priority=5)
+        later = self.q.enqueue("k", {"n": 3}, delay_seconds=3600)
+        jobs = self.q.claim("a", 10)
+        self.assertEqual([j.id for j in jobs], [high, low])
+        self.assertEqual(self.q.claim("b", 10), [])
+        self.assertEqual(self._row(later)["status"], "queued")
+
+    def test_retry_then_dead_letter(self) -> None:
+        job_id = self.q.enqueue("k", {}, max_attempts=2)
+        job = self.q.claim("a", 1)[0]
+        self.q.fail(job, "a", "boom")
+        row = self._row(job_id)
+        self.assertEqual(row["status"], "queued")
+        self.assertGreater(row["run_at_unix_ms"], row["updated_at_unix_ms"])
+
+        conn = jq._db()
+        conn.execute("UPDATE automation_jobs SET run_at_unix_ms=0 WHERE id=?", (job_id,))
+        conn.commit()
+        conn.close()
+        job = self.q.claim("a", 1)[0]
+        self.assertEqual(job.attempts, 2)
+        self.q.fail(job, "a", "boom")
+        self.assertEqual(self._row(job_id)["status"], "dead")
+        self.assertTrue(self.q.requeue(job_id))
+        self.assertEqual(self._row(job_id)["attempts"], 0)
+
+    def test_deferred_job_keeps_attempts(self) -> None:
+        job_id = self.q.enqueue("k", {}, max_attempts=1)
+
+        async def handler(payload: dict[str, Any]) -> dict[str, Any]:
+            raise jq.JobDeferred("not configured", delay_seconds=3600)
+
+        self.q.handlers["k"] = handler
+        for _ in range(3):
+            job = self.q.claim("a", 1)[0]
+            asyncio.run(self.q._run_one("a", job))
+            row = self._row(job_id)
+            self.assertEqual((row["status"], row["attempts"], row["error"]), ("queued", 0, "not configured"))
+            self.assertGreater(row["run_at_unix_ms"], row["updated_at_unix_ms"])
+            conn = jq._db()
+            conn.execute("UPDATE automation_jobs SET run_at_unix_ms=0 WHERE id=?", (job_id,))
+            conn.commit()
+            conn.close()
+        self.assertEqual((self.q.deferred, self.q.failed), (3, 0))
+
+    def test_expired_lease_is_reclaimed(self) -> None:
+        job_id = self.q.enqueue("k", {})
+        job = self.q.claim("crashed", 1)[0]
+        conn = jq._db()
+        conn.execute("UPDATE automation_jobs SET lease_expires_unix_ms=0 WHERE id=?", (job_id,))
+        conn.commit()
+        conn.close()
+        again = self.q.claim("b", 1)
+        self.assertEqual([j.id for j in again], [job_id])
+        # 原持有者的迟到提交不能覆盖新租约。
+        self.q.complete(job, "crashed", {"stale": True})
+        self.assertEqual(self._row(job_id)["status"], "running")
+        self.q.complete(again[0], "b", {"ok": True})
+        self.assertEqual(self._row(job_id)["status"], "done")
+
+    def test_workers_run_handlers(self) -> None:
+        seen: list[int] = []
+
+        async def handler(payload: dict[str, Any]) -> dict[str, Any]:
+            seen.append(payload["n"])
+            return {"n": payload["n"]}
+
+        async def run() -> None:
+            self.q.start({"k": handler})
+            for n in range(5):
+                self.q.enqueue("k", {"n": n})
+            for _ in range(100):
+                if len(seen) == 5:
+                    break
+                await asyncio.sleep(0.02)
+            await self.q.stop()
+
+        old = settings.job_queue_workers
+        settings.job_queue_workers = 3
+        try:
+            asyncio.run(run())
+        finally:
+            settings.job_queue_workers = old
+        self.assertEqual(sorted(seen), list(range(5)))
+        self.assertEqual(self.q.stats()["jobs"]["k"], {"done": 5})
+
+    def test_batch_leases_renewed_while_running(self) -> None:
+        settings.job_queue_lease_seconds = 0.3
+        ran: list[int] = []
+
+        async def slow(payload: dict[str, Any]) -> None:
+            ran.append(payload["n"])
+            await asyncio.sleep(0.8)
+
+        async def run() -> list[jq.Job]:
+            self.q.handlers["k"] = slow
+            ids = [self.q.enqueue("k", {"n": n}) for n in range(2)]
+            batch = self.q.claim("a", 2)
+            runner = asyncio.create_task(self.q._run_batch("a", batch))
+            await asyncio.sleep(0.6)
+            # 第一个任务仍在执行，排队中的第二个任务租约被续上，其他 worker 领不走。
+            stolen = self.q.claim("b", 2)
+            await runner
+            self.assertEqual([self._row(i)["status"] for i in ids], ["done", "done"])
+            return stolen
+
+        self.assertEqual(asyncio.run(run()), [])
+        self.assertEqual(ran, [0, 1])
+
+    def test_reclaimed_job_is_skipped(self) -> None:
+        ran: list[str] = []
+        ids = [self.q.enqueue("k", {"n": n}) for n in range(2)]
+
+        async def handler(payload: dict[str, Any]) -> None:
+            ran.append(f"a{payload['n']}")
+            if payload["n"] == 0:
+                # 模拟心跳中断：第二个任务租约过期并被 worker b 领取。
+                conn = jq._db()
+                conn.execute("UPDATE automation_jobs SET lease_expires_unix_ms=0 WHERE id=?", (ids[1],))
+                conn.commit()
+                conn.close()
+                self.assertEqual([j.id for j in self.q.claim("b", 1)], [ids[1]])
+
+        self.q.handlers["k"] = handler
+        asyncio.run(self.q._run_batch("a", self.q.claim("a", 2)))
+        self.assertEqual(ran, ["a0"])
+        self.assertEqual(self._row(ids[1])["lease_owner"], "b")
+
+    def test_dead_handler_and_research_status(self) -> None:
+        conn = jq._db()
+        rid = int(
+            conn.execute(
+                "INSERT INTO research_jobs(query, collection, status, scheduled_at_unix_ms, created_at_unix_ms, updated_at_unix_ms) VALUES ('q', 'c', 'queued', 0, 0, 0)"
+            ).lastrowid
+        )
+        conn.commit()
+        conn.close()
+
+        async def broken(tool: str, args: dict[str, Any]) -> dict[str, Any]:
+            raise RuntimeError("search down")
+
+        with (
+            mock.patch.object(research, "_db", jq._db),
+            mock.patch.object(research, "get_json", lambda key: "http://searx"),
+            mock.patch.object(research, "execute_tool", broken),
+        ):
+            self.q.register("research", research.run_research_job, on_dead=research.mark_research_dead)
+            job_id = self.q.enqueue("research", {"research_job_id": rid}, max_attempts=2)
+            statuses = []
+            for _ in range(2):
+                conn = jq._db()
+                conn.execute("UPDATE automation_jobs SET run_at_unix_ms=0 WHERE id=?", (job_id,))
+                conn.commit()
+                conn.close()
+                asyncio.run(self.q._run_one("a", self.q.claim("a", 1)[0]))
+                conn = jq._db()
+                statuses.append(conn.execute("SELECT status FROM research_jobs WHERE id=?", (rid,)).fetchone()[0])
+                conn.close()
+        # 还有重试次数时保持 queued，进入死信后才标记 failed。
+        self.assertEqual(statuses, ["queued", "failed"])
+        self.assertEqual(self._row(job_id)["status"], "dead")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routers import memory_api
+from app.services.fusion import FusionConfig, fuse
+from app.services.memory import MemoryStore, _FallbackCore, check_search_fields, decode_embedding, encode_embedding, make_snippet
+from app.settings import settings
+
+
+class TestFallbackEmbeddingStorage(unittest.TestCase):
+    def test_encode_roundtrip(self) -> None:
+        vec = [0.1, -0.5, 0.25, 1.0]
+        self.assertEqual(len(encode_embedding(vec, "f32")), 16)
+        for dtype, places in (("f32", 6), ("f16", 3), ("i8", 1)):
+            out = decode_embedding(encode_embedding(vec, dtype), dtype)
+            for a, b in zip(vec, out, strict=True):
+                self.assertAlmostEqual(a, b, places=places)
+
+    def test_migrates_json_rows(self) -> None:
+        with tempfile.TemporaryDirectory() as td:
+            db_path = Path(td) / "fallback.sqlite"
+            db = sqlite3.connect(db_path)
+            db.execute(
+                "CREATE TABLE documents (id INTEGER PRIMARY KEY AUTOINCREMENT, collection TEXT NOT NULL, path TEXT NOT NULL, content TEXT NOT NULL, embedding_json TEXT, UNIQUE(collection, path))"
+            )
+            db.execute(
+                "INSERT INTO documents(collection, path, content, embedding_json) VALUES ('shared', 'u://1', 'hello world', ?)",
+                (json.dumps([1.0, 0.0, 0.0]),),
+            )
+            db.commit()
+            db.close()
+
+            core = _FallbackCore(db_path)
+            row = core.conn.execute("SELECT embedding_json, embedding_dim, embedding_blob FROM documents").fetchone()
+            self.assertIsNone(row["embedding_json"])
+            self.assertEqual(int(row["embedding_dim"]), 3)
+            self.assertEqual(len(row["embedding_blob"]), 12)
+
+            core.upsert_documents("shared", [{"path": "u://2", "content": "hello fass", "embedding": [0.0, 1.0, 0.0]}])
+            out = core.search("shared", "hello", [1.0, 0.1, 0.0], 5)
+            self.assertEqual([r["path"] for r in out], ["u://1", "u://2"])
+
+
+class TestFusion(unittest.TestCase):
+    def test_rrf_uses_ranks_only(self) -> None:
+        text_hits = [(1, 50.0), (2, 49.0), (3, 1.0)]
+        vector_hits = [(2, 0.9), (3, 0.8)]
+        weighted = fuse(text_hits, vector_hits, FusionConfig(text_weight=0.9, vector_weight=0.1))
+        rrf = fuse(text_hits, vector_hits, FusionConfig(strategy="rrf", text_weight=1.0, vector_weight=1.0))
+        self.assertEqual(weighted[0][0], 2)
+        self.assertEqual([d for d, _, _ in rrf], [2, 3, 1])
+        self.assertEqual(dict((d, s) for d, _, s in rrf), {1: "bm25", 2: "hybrid", 3: "hybrid"})
+
+    def test_rejects_unknown_strategy(self) -> None:
+        with self.assertRaises(ValueError):
+            FusionConfig.from_dict({"strategy": "learned"})
+
+
+class TestSearchCache(unittest.TestCase):
+    def test_upsert_invalidates_collection(self) -> None:
+        with tempfile.TemporaryDirectory() as td:
+            store = MemoryStore(Path(td))
+            store._core = _FallbackCore(Path(td) / "fallback.sqlite")
+            store._core.upsert_documents("shared", [{"path": "u://1", "content": "hello world"}])
+            first = store.search(collection="shared", query_text="hello", query_vec=None, top_k=5)
+            store._core.upsert_documents("shared", [{"path": "u://2", "content": "hello fass"}])
+            self.assertEqual(store.search(collection="shared", query_text=" hello ", query_vec=None, top_k=5), first)
+            store.bump_generation("shared")
+            self.assertEqual(len(store.search(collection="shared", query_text="hello", query_vec=None, top_k=5)), 2)
+            self.assertEqual(store.cache_stats()["search"]["hits"], 1)
+
+    def test_batch_matches_single_queries(self) -> None:
+        with tempfile.TemporaryDirectory() as td:
+            store = MemoryStore(Path(td))
+            store._core = _FallbackCore(Path(td) / "fallback.sqlite")
+            store._core.upsert_documents(
+                "shared",
+                [
+                    {"path": "u://1", "content": "apple banana", "embedding": [1.0, 0.0]},
+                    {"path": "u://2", "content": "banana", "embedding": [0.0, 1.0]},
+                ],
+            )
+            queries = [("apple", [1.0, 0.0]), ("banana", [0.0, 1.0]), ("cherry", None)]
+            single = [store.search(collection="shared", query_text=q, query_vec=v, top_k=2, use_cache=False) for q, v in queries]
+            batch = store.search_batch(collection="shared", queries=[q for q, _ in queries], query_vecs=[v for _, v in queries], top_k=2)
+            self.assertEqual(batch, single)
+
+
+class TestSearchFields(unittest.TestCase):
+    def setUp(self) -> None:
+        self._td = tempfile.TemporaryDirectory()
+        self.store = MemoryStore(Path(self._td.name))
+        self.store._core = _FallbackCore(Path(self._td.name) / "fallback.sqlite")
+        long_text = "lorem ipsum " * 40 + "the needle sits here " + "dolor sit amet " * 40
+        self.store._core.upsert_documents("shared", [{"path": "u://1", "content": long_text}, {"path": "u://2", "content": "<b>needle</b> & co"}])
+
+    def tearDown(self) -> None:
+        self._td.cleanup()
+
+    def test_check_search_fields(self) -> None:
+        self.assertIn("content", check_search_fields(None))
+        self.assertEqual(check_search_fields(["path", "score", "path"]), ("path", "score"))
+        with self.assertRaises(ValueError):
+            check_search_fields(["path", "embedding"])
+
+    def test_make_snippet_window(self) -> None:
+        text = "a" * 500 + " Needle " + "b" * 500
+        snip = make_snippet(text, "needle", 100)
+        self.assertIn("<b>Needle</b>", snip)
+        self.assertLessEqual(len(snip.replace("<b>", "").replace("</b>", "")), 100)
+        self.assertEqual(make_snippet("x" * 50, None, 10), "x" * 10)
+        # 原文中的 HTML 会被转义，只保留高亮标签。
+        self.assertEqual(make_snippet("<i>needle</i>", "needle", 50), "&lt;i&gt;<b>needle</b>&lt;/i&gt;")
+
+    def test_field_projection(self) -> None:
+        out = self.store.search(collection="shared", query_text="needle", query_vec=None, top_k=5, fields=["path", "snippet"], snippet_chars=60)
+        self.assertEqual(sorted(r["path"] for r in out), ["u://1", "u://2"])
+        for r in out:
+            self.assertEqual(set(r), {"path", "snippet"})
+            self.assertIn("<b>needle</b>", r["snippet"])
+        self.assertEqual(set(self.store.search(collection="shared", query_text="needle", query_vec=None, top_k=5)[0]), {"id", "collection", "path", "content", "score", "source"})
+
+    def test_search_endpoint_rejects_bad_options(self) -> None:
+        app = FastAPI()
+        app.include_router(memory_api.router)
+        client = TestClient(app)
+        old = settings.api_key
+        settings.api_key = None
+        try:
+            with mock.patch.object(memory_api, "store", self.store):
+                ok = client.post("/api/memory/search", json={"query": "needle", "collection": "shared", "use_vector": False, "fields": ["path"]})
+                self.assertEqual(ok.status_code, 200)
+                self.assertEqual(sorted(r["path"] for r in ok.json()["results"]), ["u://1", "u://2"])
+                for body in ({"fields": ["secret"]}, {"fields": "path"}, {"snippet_chars": 0}):
+                    resp = client.post("/api/memory/search", json={"query": "needle", "use_vector": False, **body})
+                    self.assertEqual(resp.status_code, 400, body)
+                resp = client.post("/api/memory/search_batch", json={"queries": ["needle"], "use_vector": False, "fields": ["nope"]})
+                self.assertEqual(resp.status_code, 400)
+        finally:
+            settings.api_key = old
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,6 +3,10 @@ from __future__ import annotations
 import sqlite3
 import tempfile
 import unittest
+from pathlib import Path
+
+from app.services.memory import MemoryStore
+from app.settings import settings
 
 
 class TestMemoscoreIndexTasks(unittest.TestCase):
@@ -30,5 +34,45 @@ class TestMemoscoreIndexTasks(unittest.TestCase):
             self.assertTrue(len(out) >= 1)
 
 
+class TestSearchBatchParity(unittest.TestCase):
+    def test_batch_matches_single_search(self) -> None:
+        # 使用当前可用的核心（已编译 memoscore 时走 Rust，否则走 SQLite 回退）。
+        old = settings.embedding_dim
+        settings.embedding_dim = 4
+        try:
+            with tempfile.TemporaryDirectory() as td:
+                store = MemoryStore(Path(td))
+                core = store._get_core()
+                core.upsert_documents(
+                    "shared",
+                    [
+                        {"path": "u://1", "content": "hello world", "embedding": [1.0, 0.0, 0.0, 0.0]},
+                        {"path": "u://2", "content": "hello fass gateway", "embedding": [0.0, 1.0, 0.0, 0.0]},
+                        {"path": "u://3", "content": "gateway routing", "embedding": [0.0, 0.0, 1.0, 0.0]},
+                    ],
+                )
+                core.upsert_documents("other", [{"path": "u://4", "content": "other collection hello", "embedding": [1.0, 0.0, 0.0, 0.0]}])
+                store.sync_indexes(200)
+                queries = [
+                    ("hello", [1.0, 0.0, 0.0, 0.0]),
+                    ("gateway", [0.0, 0.0, 1.0, 0.0]),
+                    ("hello", None),
+                    ("routing", [0.0, 1.0, 0.0]),
+                    ("missing", None),
+                ]
+                for collection in ("shared", None):
+                    single = [
+                        store.search(collection=collection, query_text=q, query_vec=v, top_k=3, fields=["path", "score", "source"], use_cache=False)
+                        for q, v in queries
+                    ]
+                    batch = store.search_batch(
+                        collection=collection, queries=[q for q, _ in queries], query_vecs=[v for _, v in queries], top_k=3, fields=["path", "score", "source"]
+                    )
+                    self.assertEqual(batch, single)
+                    self.assertTrue(single[0])
+        finally:
+            settings.embedding_dim = old
+
+
 if __name__ == "__main__":
     unittest.main()
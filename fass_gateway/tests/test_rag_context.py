@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+import unittest
+
+from app.services.rag_context import assemble_context, estimate_tokens
+
+
+class TestRagContext(unittest.TestCase):
+    def test_respects_budget_and_dedups(self) -> None:
+        para = "网关负责路由请求。网关还会做鉴权。"
+        hits = [
+            {"path": "a", "content": para * 3 + "无关内容" * 200},
+            {"path": "b", "content": para * 3},
+            {"path": "c", "content": "The gateway checks auth before routing."},
+        ]
+        ctx = assemble_context("网关鉴权", hits, token_budget=120)
+        self.assertIsNotNone(ctx.text)
+        self.assertLessEqual(ctx.tokens, 120)
+        self.assertEqual(ctx.tokens, estimate_tokens(ctx.text or ""))
+        self.assertEqual([c["path"] for c in ctx.chunks], ["a", "c"])
+        self.assertNotIn("无关内容", ctx.text or "")
+
+    def test_trims_last_chunk_to_fit(self) -> None:
+        hits = [{"path": "a", "content": "memory gateway " * 400}]
+        ctx = assemble_context("gateway", hits, token_budget=100)
+        self.assertLessEqual(ctx.tokens, 100)
+        self.assertTrue((ctx.text or "").endswith("…"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Any
+from unittest import mock
+
+from app.services import reembed
+from app.services.memory import MemoryStore, _FallbackCore
+from app.settings import settings
+
+DOCS = {"u://1": "apple pie", "u://2": "banana bread", "u://3": "cherry tart"}
+OLD = {"u://1": [1.0, 0.0], "u://2": [0.0, 1.0], "u://3": [0.7, 0.7]}
+
+
+def _new_vec(text: str) -> list[float]:
+    # 新模型输出 3 维向量，与旧模型维度不同。
+    return {"apple pie": [1.0, 0.0, 0.0], "banana bread": [0.0, 1.0, 0.0], "cherry tart": [0.0, 0.0, 1.0]}[text]
+
+
+class TestReembed(unittest.TestCase):
+    def setUp(self) -> None:
+        self._td = tempfile.TemporaryDirectory()
+        self.store = MemoryStore(Path(self._td.name))
+        self.store._core = _FallbackCore(Path(self._td.name) / "fallback.sqlite")
+        self.store._core.upsert_documents(
+            "c",
+            [{"path": p, "content": t, "embedding": OLD[p], "embedding_model": "old", "updated_at_unix_ms": 1} for p, t in DOCS.items()],
+        )
+        self.store.set_serving_model("c", "old")
+        self.calls = 0
+        self._patches = [
+            mock.patch.object(reembed, "store", self.store),
+            mock.patch.object(reembed, "embed_texts", self._embed),
+        ]
+        for p in self._patches:
+            p.start()
+
+    def tearDown(self) -> None:
+        for p in self._patches:
+            p.stop()
+        self._td.cleanup()
+
+    async def _embed(self, texts: list[str], *, model_id: str | None = None) -> list[list[float]]:
+        self.calls += 1
+        return [_new_vec(t) for t in texts]
+
+    def _vector_paths(self, vec: list[float]) -> list[str]:
+        hits = self.store.search(collection="c", query_text="zzz", query_vec=vec, top_k=3, use_cache=False)
+        return [h["path"] for h in hits]
+
+    def _run(self, **kw: Any) -> reembed.ReembedJob:
+        async def run() -> reembed.ReembedJob:
+            mgr = reembed.ReembedManager()
+            job = mgr.start("c", model_id="new", batch_size=1, interval_seconds=0, **kw)
+            await mgr._tasks["c"]
+            return job
+
+        return asyncio.run(run())
+
+    def test_stage_then_promote(self) -> None:
+        seen: list[tuple[str, list[str]]] = []
+        embed = self._embed
+
+        async def observing(texts: list[str], *, model_id: str | None = None) -> list[list[float]]:
+            # 迁移过程中仍由旧模型服务，旧向量照常参与检索。
+            seen.append((self.store.serving_model("c"), self._vector_paths([1.0, 0.0])))
+            return await embed(texts, model_id=model_id)
+
+        with mock.patch.object(reembed, "embed_texts", observing):
+            job = self._run()
+        self.assertEqual((job.status, job.processed, job.promoted), ("done", 3, 3))
+        self.assertEqual({m for m, _ in seen}, {"old"})
+        self.assertTrue(all(paths and paths[0] == "u://1" for _, paths in seen))
+        self.assertEqual(self.store.serving_model("c"), "new")
+        self.assertEqual(self._vector_paths([0.0, 0.0, 1.0])[0], "u://3")
+        self.assertEqual(self._vector_paths([1.0, 0.0]), [])
+
+    def test_stale_vectors_not_served_under_new_model(self) -> None:
+        core = self.store._core
+        rows = self.store.reembed_candidates("c", "new2", 10)
+        # 只有 u://1 完成重嵌入；其余文档的旧向量不能以新模型的名义返回。
+        self.store.stage_embeddings("new2", [{"id": r["id"], "updated_at_unix_ms": r["updated_at_unix_ms"], "embedding": [0.0, 1.0]} for r in rows if r["path"] == "u://1"])
+        self.assertEqual(self.store.promote_embeddings("c", "new2"), 1)
+        hits = core.search("c", "zzz", [0.0, 1.0], 3, embedding_model="new2")
+        self.assertEqual([h["path"] for h in hits], ["u://1"])
+
+    def test_dimension_mismatch_keeps_serving_model(self) -> None:
+        with mock.patch.object(self.store, "vector_dim", lambda: 2):
+            job = self._run()
+        self.assertEqual(job.status, "failed")
+        self.assertEqual(self.store.serving_model("c"), "old")
+        staged = self.store._core.conn.execute("SELECT COUNT(*) FROM embedding_staging").fetchone()[0]
+        self.assertEqual(staged, 0)
+
+
+class TestQueryDimension(unittest.TestCase):
+    def test_mismatched_query_vec_is_text_only(self) -> None:
+        calls: list[Any] = []
+
+        class Core:
+            def search(self, *args: Any) -> list[dict[str, Any]]:
+                calls.append(args[2])
+                return []
+
+            def search_batch(self, *args: Any) -> list[list[dict[str, Any]]]:
+                calls.extend(args[2])
+                return [[] for _ in args[1]]
+
+        old = settings.embedding_dim
+        settings.embedding_dim = 2
+        try:
+            with tempfile.TemporaryDirectory() as td:
+                store = MemoryStore(Path(td))
+                store._core = Core()
+                store.search(collection="c", query_text="q", query_vec=[1.0, 0.0, 0.0], top_k=3)
+                store.search(collection="c", query_text="q", query_vec=[1.0, 0.0], top_k=3)
+                store.search_batch(collection="c", queries=["a", "b"], query_vecs=[[1.0, 0.0, 0.0], [0.0, 1.0]], top_k=3)
+        finally:
+            settings.embedding_dim = old
+        self.assertEqual(calls, [None, [1.0, 0.0], None, [0.0, 1.0]])
+
+
+if __name__ == "__main__":
+    unittest.main()
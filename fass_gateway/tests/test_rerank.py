@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import asyncio
+import unittest
+from unittest import mock
+
+from app.services import rerank as rr
+from app.settings import settings
+
+
+class TestRerank(unittest.TestCase):
+    def setUp(self) -> None:
+        rr._cache.clear()
+        self._old = (settings.rerank_provider, settings.rerank_model)
+        settings.rerank_provider, settings.rerank_model = "openai_compat", "fake"
+
+    def tearDown(self) -> None:
+        settings.rerank_provider, settings.rerank_model = self._old
+
+    def test_reorders_and_caches(self) -> None:
+        hits = [{"path": "a", "content": "x"}, {"path": "b", "content": "yy"}, {"path": "c", "content": "zzz"}]
+        calls: list[int] = []
+
+        async def fake(query: str, docs: list[str]) -> list[float]:
+            calls.append(len(docs))
+            return [float(len(d)) for d in docs]
+
+        with mock.patch.object(rr, "_score_pairs", fake):
+            out, done = asyncio.run(rr.rerank("q", hits, top_k=2))
+            self.assertTrue(done)
+            self.assertEqual([h["path"] for h in out], ["c", "b"])
+            asyncio.run(rr.rerank("q", hits, top_k=2))
+        self.assertEqual(calls, [3])
+
+    def test_budget_exceeded_keeps_fused_order(self) -> None:
+        hits = [{"path": "a", "content": "x"}, {"path": "b", "content": "yy"}]
+
+        async def slow(query: str, docs: list[str]) -> list[float]:
+            await asyncio.sleep(0.2)
+            return [float(len(d)) for d in docs]
+
+        with mock.patch.object(rr, "_score_pairs", slow):
+            out, done = asyncio.run(rr.rerank("q", hits, top_k=2, budget_ms=10))
+        self.assertFalse(done)
+        self.assertEqual([h["path"] for h in out], ["a", "b"])
+
+    def test_inflight_fills_are_bounded(self) -> None:
+        hits = [{"path": "a", "content": "x"}, {"path": "b", "content": "yy"}]
+        running: list[int] = []
+        peak: list[int] = [0]
+
+        async def stuck(query: str, docs: list[str]) -> list[float]:
+            running.append(1)
+            peak[0] = max(peak[0], len(running))
+            try:
+                await asyncio.sleep(10)
+            finally:
+                running.pop()
+            return [0.0] * len(docs)
+
+        async def run() -> tuple[int, int]:
+            # 重排器一直超时：相同查询复用任务，不同查询最多 rerank_max_inflight 个后台任务。
+            for i in range(20):
+                out, done = await rr.rerank(f"q{i % 5}", hits, top_k=2, budget_ms=1)
+                self.assertFalse(done)
+                self.assertEqual([h["path"] for h in out], ["a", "b"])
+            return len(rr._inflight), peak[0]
+
+        old = settings.rerank_max_inflight
+        settings.rerank_max_inflight = 3
+        try:
+            with mock.patch.object(rr, "_score_pairs", stuck):
+                inflight, most = asyncio.run(run())
+        finally:
+            settings.rerank_max_inflight = old
+        self.assertEqual((inflight, most), (3, 3))
+        # 事件循环结束时后台任务被取消并从登记表移除。
+        self.assertEqual(rr._inflight, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
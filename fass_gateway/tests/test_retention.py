@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from app.db import open_db
+from app.services import retention
+from app.settings import settings
+
+NOW = 1_000 * retention.DAY_MS
+
+
+class TestRetention(unittest.TestCase):
+    def setUp(self) -> None:
+        self._td = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._td.name, "t.sqlite")
+        self._keys = [k for k in type(settings).model_fields if k.startswith("retention_")]
+        self._old = {k: getattr(settings, k) for k in self._keys}
+        settings.retention_batch_size = 7
+        settings.retention_batch_pause_ms = 0.0
+        self._patch = mock.patch.object(retention, "_db", lambda: open_db(self.path))
+        self._patch.start()
+
+    def tearDown(self) -> None:
+        self._patch.stop()
+        for k, v in self._old.items():
+            setattr(settings, k, v)
+        self._td.cleanup()
+
+    def _seed(self) -> None:
+        conn = open_db(self.path)
+        old, recent = NOW - 200 * retention.DAY_MS, NOW - retention.DAY_MS
+        # 会话 1：旧会话且无新事件；会话 2：旧会话但有新事件；会话 3：新会话，事件很多。
+        conn.execute(
+            "INSERT INTO conversations(id, created_at_unix_ms, updated_at_unix_ms) VALUES (1, ?, ?), (2, ?, ?), (3, ?, ?)",
+            (old, old, old, old, recent, recent),
+        )
+        rows = [(1, old + i, "x" * 2000) for i in range(20)]
+        rows += [(2, old + i, "x") for i in range(10)] + [(2, recent + i, "x") for i in range(5)]
+        rows += [(3, recent + i, "x") for i in range(40)]
+        conn.executemany(
+            "INSERT INTO trace_events(conversation_id, trace_id, layer, event_kind, content, ts_unix_ms, status) VALUES (?, 't', 'L1', 'execution', ?, ?, 'done')",
+            [(c, content, ts) for c, ts, content in rows],
+        )
+        conn.executemany(
+            "INSERT INTO research_history(query, created_at_unix_ms) VALUES ('q', ?)",
+            [(old,)] * 9 + [(recent,)],
+        )
+        conn.executemany(
+            "INSERT INTO research_jobs(query, collection, status, scheduled_at_unix_ms, created_at_unix_ms, updated_at_unix_ms) VALUES ('q', 'c', ?, 0, 0, ?)",
+            [("done", old), ("failed", old), ("queued", old), ("done", recent)],
+        )
+        conn.executemany(
+            "INSERT INTO automation_jobs(kind, status, run_at_unix_ms, payload_json, created_at_unix_ms, updated_at_unix_ms) VALUES ('k', ?, 0, '{}', 0, ?)",
+            [("done", old), ("dead", old), ("queued", old), ("running", old), ("done", recent)],
+        )
+        conn.commit()
+        conn.close()
+
+    def test_prune_policies(self) -> None:
+        self._seed()
+        settings.retention_trace_days = 30
+        settings.retention_trace_max_per_conversation = 25
+        settings.retention_conversation_days = 90
+        settings.retention_research_history_days = 90
+        settings.retention_research_jobs_days = 30
+        settings.retention_automation_jobs_days = 30
+        out = retention.prune_once(now=NOW)
+        self.assertEqual(out["trace_events_by_age"], 30)
+        self.assertEqual(out["automation_jobs"], 2)
+        self.assertEqual(out["trace_events_by_count"], 15)
+        self.assertEqual((out["conversations"], out["research_history"], out["research_jobs"]), (1, 9, 2))
+
+        conn = open_db(self.path)
+        convs = [r[0] for r in conn.execute("SELECT id FROM conversations ORDER BY id")]
+        counts = dict(conn.execute("SELECT conversation_id, COUNT(*) FROM trace_events GROUP BY conversation_id").fetchall())
+        oldest3 = conn.execute("SELECT MIN(ts_unix_ms) FROM trace_events WHERE conversation_id=3").fetchone()[0]
+        statuses = sorted(r[0] for r in conn.execute("SELECT status FROM research_jobs"))
+        conn.close()
+        self.assertEqual(convs, [2, 3])
+        # 按条数只保留最新的 25 条。
+        self.assertEqual(counts, {2: 5, 3: 25})
+        self.assertEqual(oldest3, NOW - retention.DAY_MS + 15)
+        self.assertEqual(statuses, ["done", "queued"])
+
+    def test_incremental_vacuum_reclaims_pages(self) -> None:
+        self._seed()
+        settings.retention_trace_days = 30
+        settings.retention_vacuum_pages = 100_000
+        out = retention.prune_once(now=NOW)
+        self.assertEqual(out["vacuum"]["mode"], "incremental")
+        self.assertGreater(out["vacuum"]["free_pages_before"], 0)
+        self.assertEqual(out["vacuum"]["free_pages_after"], 0)
+
+    def test_count_policy_only_checks_touched_conversations(self) -> None:
+        self._seed()
+        settings.retention_trace_days = 0
+        settings.retention_trace_max_per_conversation = 25
+        first = retention.prune_once(now=NOW)
+        self.assertEqual(first["trace_events_by_count"], 15)
+        conn = open_db(self.path)
+        # 绕过水位线直接让会话 3 超限：早于水位线的写入不会被再次检查。
+        conn.execute("DELETE FROM trace_events WHERE conversation_id=1")
+        conn.executemany(
+            "INSERT INTO trace_events(id, conversation_id, trace_id, layer, event_kind, content, ts_unix_ms, status) VALUES (?, 3, 't', 'L1', 'execution', 'x', 0, 'done')",
+            [(i,) for i in range(1, 6)],
+        )
+        conn.commit()
+        conn.close()
+        second = retention.prune_once(now=NOW, since_trace_id=first["trace_watermark"])
+        self.assertEqual(second["trace_events_by_count"], 0)
+
+        conn = open_db(self.path)
+        conn.executemany(
+            "INSERT INTO trace_events(conversation_id, trace_id, layer, event_kind, content, ts_unix_ms, status) VALUES (3, 't', 'L1', 'execution', 'x', ?, 'done')",
+            [(NOW + i,) for i in range(3)],
+        )
+        conn.commit()
+        conn.close()
+        third = retention.prune_once(now=NOW, since_trace_id=second["trace_watermark"])
+        self.assertEqual(third["trace_events_by_count"], 8)
+
+    def test_convert_vacuum_is_explicit(self) -> None:
+        raw = sqlite3.connect(self.path)
+        raw.execute("CREATE TABLE filler(x TEXT)")
+        raw.executemany("INSERT INTO filler VALUES (?)", [("x" * 2000,)] * 200)
+        raw.commit()
+        raw.execute("DELETE FROM filler")
+        raw.commit()
+        raw.close()
+        settings.retention_convert_min_free_pages = 10
+        # 周期清理不做全库 VACUUM。
+        self.assertEqual(retention.prune_once(now=NOW)["vacuum"]["mode"], "none")
+        self.assertEqual(retention.convert_vacuum(min_free_pages=1_000_000)["reason"], "below_min_free_pages")
+        out = retention.convert_vacuum(min_free_pages=settings.retention_convert_min_free_pages)
+        self.assertTrue(out["converted"])
+        self.assertEqual(out["free_pages_after"], 0)
+        self.assertEqual(retention.convert_vacuum()["reason"], "already_incremental")
+        self.assertEqual(retention.prune_once(now=NOW)["vacuum"]["mode"], "incremental")
+
+    def test_disabled_policies_keep_everything(self) -> None:
+        self._seed()
+        for k in ("trace_days", "trace_max_per_conversation", "conversation_days", "research_history_days", "research_jobs_days", "automation_jobs_days"):
+            setattr(settings, f"retention_{k}", 0)
+        out = retention.prune_once(now=NOW)
+        self.assertEqual(sum(v for k, v in out.items() if isinstance(v, int) and k != "trace_watermark"), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from app.db import open_db
+from app.services import self_heal as sh
+from app.settings import settings
+
+
+class TestBackup(unittest.TestCase):
+    def setUp(self) -> None:
+        self._td = tempfile.TemporaryDirectory()
+        base = Path(self._td.name)
+        self.db = base / "live.sqlite"
+        self.backups = base / "backups"
+        self.backups.mkdir()
+        self.audits: list[tuple[str, dict]] = []
+        self._keys = [k for k in type(settings).model_fields if k.startswith("backup_")]
+        self._old = {k: getattr(settings, k) for k in self._keys}
+        self._patches = [
+            mock.patch.object(sh, "_db_path", lambda: self.db),
+            mock.patch.object(sh, "_backup_dir", lambda: self.backups),
+            mock.patch.object(sh, "write_audit", lambda actor, action, payload: self.audits.append((action, payload))),
+        ]
+        for p in self._patches:
+            p.start()
+        # 保持一个连接不关闭，数据停留在 -wal 中未 checkpoint。
+        self.live = sqlite3.connect(str(self.db))
+        self.live.execute("PRAGMA journal_mode=WAL")
+        self.live.execute("PRAGMA wal_autocheckpoint=0")
+        self.live.execute("CREATE TABLE t(x TEXT)")
+        self.live.executemany("INSERT INTO t VALUES (?)", [("x" * 500,)] * 200)
+        self.live.commit()
+
+    def tearDown(self) -> None:
+        self.live.close()
+        for p in self._patches:
+            p.stop()
+        for k, v in self._old.items():
+            setattr(settings, k, v)
+        self._td.cleanup()
+
+    def _rows(self, path: Path) -> int:
+        conn = sqlite3.connect(str(path))
+        n = int(conn.execute("SELECT COUNT(*) FROM t").fetchone()[0])
+        conn.close()
+        return n
+
+    def test_backup_includes_wal_contents(self) -> None:
+        settings.backup_pages_per_step = 4
+        settings.backup_step_sleep_ms = 0.0
+        name = sh.backup(actor="t", reason="test")
+        self.assertEqual(self._rows(self.backups / name), 200)
+        self.assertEqual(self.audits[-1][1]["method"], "backup_api")
+        self.assertEqual(list(self.backups.glob("*.tmp")), [])
+
+    def test_falls_back_to_vacuum_into(self) -> None:
+        def restarted(src: Path, dst: Path) -> None:
+            raise sh._BackupRestarted()
+
+        with mock.patch.object(sh, "_backup_api", restarted):
+            name = sh.backup(actor="t", reason="test")
+        self.assertEqual(self._rows(self.backups / name), 200)
+        self.assertEqual(self.audits[-1][1]["method"], "vacuum_into")
+
+    def test_compress_rotate_and_rollback(self) -> None:
+        settings.backup_compress = True
+        settings.backup_keep = 3
+        settings.backup_keep_days = 30
+        now = sh._now_ms()
+        recent = [f"fass_gateway.{now - i * 24 * 3600 * 1000}.sqlite" for i in (1, 2, 3)]
+        for n in [*recent, "fass_gateway.1000.sqlite"]:
+            (self.backups / n).write_bytes(b"old")
+        name = sh.backup(actor="t", reason="test")
+        self.assertTrue(name.endswith(".sqlite.gz"))
+        # 超出数量上限和超过保留天数的备份都被删除。
+        self.assertEqual([p.name for p in sh.list_backups()], [name, *recent[:2]])
+        self.assertEqual(sorted(self.audits[-1][1]["rotated"]), sorted([recent[2], "fass_gateway.1000.sqlite"]))
+
+        self.live.execute("DELETE FROM t")
+        self.live.commit()
+        out = sh.rollback_latest(actor="t")
+        self.assertEqual(out, {"ok": True, "backup": name})
+        self.assertEqual(int(self.live.execute("SELECT COUNT(*) FROM t").fetchone()[0]), 200)
+
+
+class TestChecksums(unittest.TestCase):
+    def setUp(self) -> None:
+        self._td = tempfile.TemporaryDirectory()
+        self.path = str(Path(self._td.name) / "t.sqlite")
+        self._patches = [
+            mock.patch.object(sh, "_db", lambda: open_db(self.path)),
+            mock.patch.object(sh, "write_audit", lambda actor, action, payload: None),
+        ]
+        for p in self._patches:
+            p.start()
+        self.conn = open_db(self.path)
+        self.conn.executemany(
+            "INSERT INTO l3_categories(id, name, identity, system_prompt, routing_strategy_json, capability_requirements_json, created_at_unix_ms, updated_at_unix_ms) VALUES (?, 'n', 'i', 's', '{}', '{}', 0, ?)",
+            [(f"c{i}", i) for i in range(20)],
+        )
+        self.conn.executemany(
+            "INSERT INTO model_catalog(provider_id, model_id, raw_json, capabilities_json, fetched_at_unix_ms, created_at_unix_ms, updated_at_unix_ms) VALUES ('p', ?, '{}', '{}', 0, 0, 0)",
+            [(f"m{i}",) for i in range(10)],
+        )
+        self.conn.commit()
+
+    def tearDown(self) -> None:
+        self.conn.close()
+        for p in self._patches:
+            p.stop()
+        self._td.cleanup()
+
+    def _dirty(self) -> int:
+        return int(self.conn.execute("SELECT COUNT(*) FROM checksum_dirty").fetchone()[0])
+
+    def test_incremental_matches_full_recompute(self) -> None:
+        first = sh.compute_checksums(actor="t")
+        self.assertEqual(self._dirty(), 0)
+        self.assertTrue(sh.verify_checksums()["ok"])
+
+        self.conn.execute("UPDATE l3_categories SET updated_at_unix_ms=99 WHERE id='c3'")
+        self.conn.execute("UPDATE model_catalog SET status='offline' WHERE model_id='m4'")
+        self.conn.execute("DELETE FROM model_catalog WHERE model_id='m5'")
+        # 未参与校验的列不产生变更记录。
+        self.conn.execute("UPDATE l3_categories SET name='x'")
+        self.conn.commit()
+        self.assertEqual(self._dirty(), 3)
+        pending = sh.verify_checksums()
+        self.assertEqual((pending["ok"], pending["pending_changes"]), (True, 3))
+
+        second = sh.compute_checksums(actor="t")
+        self.assertEqual(self._dirty(), 0)
+        self.assertNotEqual(first["l3_categories"], second["l3_categories"])
+        self.assertNotEqual(first["model_catalog"], second["model_catalog"])
+        self.assertEqual(first["layer_presets"], second["layer_presets"])
+        self.assertTrue(sh.verify_checksums()["ok"])
+
+        # 改回原值后聚合值也回到原值。
+        self.conn.execute("UPDATE l3_categories SET updated_at_unix_ms=3 WHERE id='c3'")
+        self.conn.commit()
+        self.assertEqual(sh.compute_checksums(actor="t")["l3_categories"], first["l3_categories"])
+
+    def test_detects_tampering(self) -> None:
+        sh.compute_checksums(actor="t")
+        # 绕过触发器直接改写表内容（模拟损坏/外部篡改）。
+        self.conn.execute("DROP TRIGGER trg_checksum_l3_categories_upd")
+        self.conn.execute("UPDATE l3_categories SET updated_at_unix_ms=1000 WHERE id='c7'")
+        self.conn.commit()
+        self.assertEqual(sh.verify_checksums()["mismatched"], ["l3_categories"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Any
+from unittest import mock
+
+from app.services import timeline as tl
+from app.settings import settings
+
+
+def _write_diary(root: Path, n: int) -> None:
+    for i in range(n):
+        day = f"2026-01-{i % 28 + 1:02d}"
+        who = "Alice" if i % 2 else "Bob"
+        (root / f"{i:03d}.txt").write_text(f"[{day}] - {who}\n" + f"entry {i} " * 20, encoding="utf-8")
+
+
+class TestTimelineBuild(unittest.TestCase):
+    def setUp(self) -> None:
+        self._td = tempfile.TemporaryDirectory()
+        self.base = Path(self._td.name)
+        (self.base / "diary").mkdir()
+        self._old = (settings.timeline_summary_concurrency, settings.timeline_summary_retry_base_seconds, settings.timeline_checkpoint_files)
+        settings.timeline_summary_retry_base_seconds = 0.0
+        self.upserts: list[list[dict[str, Any]]] = []
+
+        async def upsert(collection: str, items: list[dict[str, Any]]) -> int:
+            self.upserts.append(items)
+            return len(items)
+
+        self._patch = mock.patch.object(tl.store, "upsert_texts", upsert)
+        self._patch.start()
+
+    def tearDown(self) -> None:
+        self._patch.stop()
+        settings.timeline_summary_concurrency, settings.timeline_summary_retry_base_seconds, settings.timeline_checkpoint_files = self._old
+        self._td.cleanup()
+
+    def _cfg(self) -> tl.TimelineBuildConfig:
+        return tl.TimelineBuildConfig(
+            diary_root=self.base / "diary",
+            project_base_path=self.base,
+            timeline_dir=self.base / "timeline",
+            summary_model="m",
+        )
+
+    def _entries(self, who: str) -> list[str]:
+        data = json.loads((self.base / "timeline" / f"{who}_timeline.json").read_text(encoding="utf-8"))
+        return [e["summary"] for day in sorted(data["entries"]) for e in data["entries"][day]]
+
+    def test_concurrent_summaries_keep_file_order(self) -> None:
+        _write_diary(self.base / "diary", 12)
+        active = 0
+        peak = 0
+
+        async def fake(text: str, *, model: str) -> tuple[str | None, str]:
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(random.random() / 100)
+            active -= 1
+            return text.split()[4], "summarized"
+
+        settings.timeline_summary_concurrency = 3
+        with mock.patch.object(tl, "_summarize", fake):
+            out = asyncio.run(tl.build_timeline(self._cfg()))
+        self.assertEqual(out["entries_written"], 12)
+        self.assertEqual(peak, 3)
+        # 每个角色文件只写一次，memory 一次批量写入。
+        self.assertEqual(len(out["timeline_files"]), 2)
+        self.assertEqual([len(b) for b in self.upserts], [12])
+        self.assertEqual(list((self.base / "timeline").glob("*.tmp")), [])
+        self.assertEqual(self._entries("Alice"), [str(i) for i in sorted(range(1, 12, 2), key=lambda i: (i % 28, i))])
+
+        # 第二次构建全部按 hash 跳过。
+        with mock.patch.object(tl, "_summarize", fake):
+            again = asyncio.run(tl.build_timeline(self._cfg()))
+        self.assertEqual((again["changed"], again["skipped"]), (0, 12))
+
+    def test_resume_after_interrupted_build(self) -> None:
+        _write_diary(self.base / "diary", 10)
+        seen: list[str] = []
+
+        async def crash_at_8(text: str, *, model: str) -> tuple[str | None, str]:
+            n = text.split()[4]
+            if n == "7":
+                raise RuntimeError("crash")
+            seen.append(n)
+            return n, "summarized"
+
+        settings.timeline_checkpoint_files = 5
+        with mock.patch.object(tl, "_summarize", crash_at_8), self.assertRaises(RuntimeError):
+            asyncio.run(tl.build_timeline(self._cfg()))
+
+        async def ok(text: str, *, model: str) -> tuple[str | None, str]:
+            seen.append(text.split()[4])
+            return text.split()[4], "summarized"
+
+        seen.clear()
+        with mock.patch.object(tl, "_summarize", ok):
+            out = asyncio.run(tl.build_timeline(self._cfg()))
+        # 前 5 个文件已在检查点提交，重启后只处理剩余文件。
+        self.assertEqual(sorted(seen, key=int), ["5", "6", "7", "8", "9"])
+        self.assertEqual((out["changed"], out["skipped"]), (5, 5))
+        self.assertEqual(len(self._entries("Alice")) + len(self._entries("Bob")), 10)
+
+    def test_imports_legacy_json(self) -> None:
+        _write_diary(self.base / "diary", 2)
+        legacy = {}
+        for fp in (self.base / "diary").iterdir():
+            legacy[fp.resolve().as_posix()] = {"hash": tl._sha256_text(fp.read_text(encoding="utf-8")), "status": "summarized"}
+        (self.base / "timeline").mkdir()
+        (self.base / "timeline" / "processed_files_db.json").write_text(json.dumps(legacy), encoding="utf-8")
+
+        async def never(text: str, *, model: str) -> tuple[str | None, str]:
+            raise AssertionError("should not summarize")
+
+        with mock.patch.object(tl, "_summarize", never):
+            out = asyncio.run(tl.build_timeline(self._cfg()))
+        self.assertEqual((out["changed"], out["skipped"]), (0, 2))
+
+    def test_retries_transient_errors(self) -> None:
+        calls = 0
+
+        async def flaky(payload: dict[str, Any]) -> dict[str, Any]:
+            nonlocal calls
+            calls += 1
+            if calls < 3:
+                raise RuntimeError("upstream 503: overloaded (request_id=x)")
+            return {"choices": [{"message": {"content": "<<<summary>>>ok<<</summary>>>"}}]}
+
+        with mock.patch.object(tl, "proxy_chat_completions", flaky):
+            self.assertEqual(asyncio.run(tl._summarize("t", model="m")), ("ok", "summarized"))
+        self.assertEqual(calls, 3)
+
+        async def bad(payload: dict[str, Any]) -> dict[str, Any]:
+            raise RuntimeError("upstream 400: bad request (request_id=x)")
+
+        with mock.patch.object(tl, "proxy_chat_completions", bad):
+            self.assertEqual(asyncio.run(tl._summarize("t", model="m")), (None, "error"))
+
+
+if __name__ == "__main__":
+    unittest.main()
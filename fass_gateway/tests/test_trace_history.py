@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from app.db import open_db
+from app.services import trace_history as th
+
+
+class TestTraceHistory(unittest.TestCase):
+    def setUp(self) -> None:
+        self._td = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._td.name, "t.sqlite")
+        conn = open_db(self.path)
+        conn.execute("INSERT INTO conversations(id, created_at_unix_ms, updated_at_unix_ms) VALUES (1, 0, 0), (2, 0, 0)")
+        rows = []
+        for i in range(25):
+            # 每两条共用一个时间戳，验证游标在 ts 相同时按 id 续页。
+            status = "error" if i % 5 == 0 else "done"
+            rows.append((1, "t", "L1", "execution", str(i), 1000 + i // 2, status, "p1", "m1" if i % 2 else "m2"))
+        rows.append((2, "t", "L1", "execution", "x", 1000, "done", "p2", "m3"))
+        conn.executemany(
+            "INSERT INTO trace_events(conversation_id, trace_id, layer, event_kind, content, ts_unix_ms, status, provider_id, model_id) VALUES (?,?,?,?,?,?,?,?,?)",
+            rows,
+        )
+        conn.commit()
+        conn.close()
+        self._patch = mock.patch.object(th, "_db", lambda: open_db(self.path))
+        self._patch.start()
+
+    def tearDown(self) -> None:
+        self._patch.stop()
+        self._td.cleanup()
+
+    def _all_pages(self, **kw) -> list[str]:
+        out: list[str] = []
+        cursor = None
+        while True:
+            page = th.list_events(1, cursor=cursor, limit=4, **kw)
+            out.extend(e["content"] for e in page["items"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return out
+
+    def test_keyset_pages(self) -> None:
+        self.assertEqual(self._all_pages(), [str(i) for i in range(25)])
+        self.assertEqual(self._all_pages(order="desc"), [str(i) for i in reversed(range(25))])
+        self.assertEqual(self._all_pages(since_unix_ms=1010), [str(i) for i in range(20, 25)])
+        with self.assertRaises(ValueError):
+            th.list_events(1, cursor="bad")
+
+    def test_model_stats(self) -> None:
+        out = th.model_stats(since_unix_ms=0, until_unix_ms=2000, provider_id="p1")
+        got = {r["model_id"]: (r["events"], r["errors"], r["done"]) for r in out["items"]}
+        self.assertEqual(got, {"m1": (12, 2, 10), "m2": (13, 3, 10)})
+        self.assertEqual(len(th.model_stats(since_unix_ms=0, until_unix_ms=2000)["items"]), 3)
+        self.assertEqual(th.model_stats(since_unix_ms=5000, until_unix_ms=6000)["items"], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
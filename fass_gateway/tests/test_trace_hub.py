@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from app.db import open_db
+from app.services import trace_hub as th
+from app.settings import settings
+
+
+def _ev(trace_id: str, content: str, status: str = "streaming") -> dict:
+    return {"trace_id": trace_id, "content": content, "status": status}
+
+
+class TestTraceHub(unittest.TestCase):
+    def setUp(self) -> None:
+        self._old = (settings.trace_subscriber_queue, settings.trace_slow_consumer_policy, settings.trace_replay_buffer, settings.trace_broadcast_poll_ms)
+        settings.trace_broadcast_poll_ms = 10.0
+
+    def tearDown(self) -> None:
+        settings.trace_subscriber_queue, settings.trace_slow_consumer_policy, settings.trace_replay_buffer, settings.trace_broadcast_poll_ms = self._old
+
+    def test_replay_from_last_event_id(self) -> None:
+        settings.trace_replay_buffer = 3
+
+        async def run() -> tuple[list[str], list[str]]:
+            hub = th.TraceHub()
+            ids = [await hub.publish(1, _ev("a", str(i), "done")) for i in range(5)]
+            resumed = await hub.subscribe(1, last_event_id=ids[2])
+            late = await hub.subscribe(1)
+            return [ev["content"] for _, ev in resumed._items], [ev["content"] for _, ev in late._items]
+
+        resumed, late = asyncio.run(run())
+        self.assertEqual(resumed, ["3", "4"])
+        # 缓冲只保留最近 3 条，新订阅者回放全部缓冲。
+        self.assertEqual(late, ["2", "3", "4"])
+
+    def test_slow_consumer_policies(self) -> None:
+        settings.trace_subscriber_queue = 2
+
+        async def run(policy: str) -> tuple[list[str] | None, th.Subscription]:
+            settings.trace_slow_consumer_policy = policy
+            hub = th.TraceHub()
+            sub = await hub.subscribe(1)
+            await hub.publish(1, _ev("x", "start", "running"))
+            for piece in ("a", "b", "c", "d"):
+                await hub.publish(1, _ev("a", piece))
+            first = await sub.get()
+            if first is None:
+                return None, sub
+            return [first[1]["content"]] + [ev["content"] for _, ev in sub._items], sub
+
+        got, sub = asyncio.run(run("coalesce"))
+        self.assertEqual(got, ["start", "abcd"])
+        self.assertEqual(sub.dropped, 0)
+
+        got, sub = asyncio.run(run("drop_oldest"))
+        self.assertEqual(got, ["c", "d"])
+        self.assertEqual(sub.dropped, 3)
+
+        got, sub = asyncio.run(run("disconnect"))
+        # 断开前已排队的事件仍会交付，之后 get 返回 None。
+        self.assertEqual(got, ["start", "a"])
+        self.assertTrue(sub.closed)
+        sub._items.clear()
+        self.assertIsNone(asyncio.run(sub.get()))
+
+    def test_replay_capped_to_subscriber_queue(self) -> None:
+        settings.trace_replay_buffer = 10
+        settings.trace_subscriber_queue = 4
+        settings.trace_slow_consumer_policy = "disconnect"
+
+        async def run() -> tuple[list[str], int]:
+            hub = th.TraceHub()
+            for i in range(10):
+                await hub.publish(1, _ev("a", str(i), "done"))
+            sub = await hub.subscribe(1)
+            self.assertEqual(sub.dropped, 6)
+            # 回放填满队列后又来新事件，订阅被断开；已回放的事件仍先交付。
+            await hub.publish(1, _ev("a", "10", "done"))
+            self.assertTrue(sub.closed)
+            got: list[str] = []
+            last = None
+            while (item := await sub.get()) is not None:
+                last = item[0]
+                got.append(item[1]["content"])
+            # 带最后收到的 id 重连，从断点继续而不是重复同一段回放。
+            sub = await hub.subscribe(1, last_event_id=last)
+            return got + [ev["content"] for _, ev in sub._items], int(sub.closed)
+
+        got, closed = asyncio.run(run())
+        self.assertEqual(got, [str(i) for i in range(6, 11)])
+        self.assertEqual(closed, 0)
+
+    def _cross_process(self, backend: str) -> list[str]:
+        async def run() -> list[str]:
+            a, b = th.TraceHub(), th.TraceHub()
+            await a.start(backend)
+            await b.start(backend)
+            try:
+                sub = await b.subscribe(7)
+                await a.publish(7, _ev("t", "hello", "done"))
+                item = await asyncio.wait_for(sub.get(), timeout=2)
+                self.assertEqual(a.stats()["subscribers"], 0)
+                return [item[1]["content"]] + [ev["content"] for _, ev in a._rings[7]]
+            finally:
+                await a.stop()
+                await b.stop()
+
+        return asyncio.run(run())
+
+    def test_unix_socket_broadcast(self) -> None:
+        with tempfile.TemporaryDirectory() as td, mock.patch.object(settings, "trace_broadcast_dir", td):
+            self.assertEqual(self._cross_process("unix"), ["hello", "hello"])
+            self.assertEqual(os.listdir(td), [])
+
+    def test_sqlite_broadcast(self) -> None:
+        with tempfile.TemporaryDirectory() as td:
+            path = os.path.join(td, "t.sqlite")
+            with mock.patch.object(th, "_db", lambda: open_db(path)):
+                self.assertEqual(self._cross_process("sqlite"), ["hello", "hello"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import unittest
+from typing import Any
+from unittest import mock
+
+import httpx
+
+from app.routers import trace_api
+from app.services import newapi_client
+
+
+def _sse(*pieces: str) -> bytes:
+    lines = [f"data: {json.dumps({'choices': [{'delta': {'content': p}}]})}\n\n" for p in pieces]
+    return ("".join(lines) + "data: [DONE]\n\n").encode("utf-8")
+
+
+class TestUpstreamStream(unittest.TestCase):
+    def _client(self, handler):
+        real = httpx.AsyncClient
+        return mock.patch.object(newapi_client.httpx, "AsyncClient", lambda **kw: real(transport=httpx.MockTransport(handler), **kw))
+
+    def test_yields_deltas(self) -> None:
+        def handler(request: httpx.Request) -> httpx.Response:
+            self.assertTrue(json.loads(request.content)["stream"])
+            return httpx.Response(200, content=_sse("你", "好", "!"), headers={"content-type": "text/event-stream"})
+
+        async def run() -> list[str]:
+            return [p async for p in newapi_client.chat_completions_stream({"model": "m"}, base_url="http://x", api_key="k")]
+
+        with self._client(handler):
+            self.assertEqual(asyncio.run(run()), ["你", "好", "!"])
+
+    def test_upstream_error(self) -> None:
+        def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(503, text="busy")
+
+        async def run() -> None:
+            async for _ in newapi_client.chat_completions_stream({"model": "m"}, base_url="http://x", api_key="k"):
+                pass
+
+        with self._client(handler), self.assertRaises(newapi_client.UpstreamError) as ctx:
+            asyncio.run(run())
+        self.assertEqual(ctx.exception.status_code, 503)
+
+
+class TestStreamLayer(unittest.TestCase):
+    def test_emits_deltas_then_done(self) -> None:
+        events: list[dict[str, Any]] = []
+
+        async def emit(conversation_id: int, ev: dict[str, Any]) -> None:
+            events.append(ev)
+
+        async def fake_stream(payload: dict[str, Any]):
+            for p in ("a", "b", "c"):
+                yield p
+
+        with mock.patch.object(trace_api, "_emit", emit), mock.patch.object(trace_api, "proxy_chat_completions_stream", fake_stream):
+            text = asyncio.run(trace_api._stream_layer(1, {"trace_id": "t"}, [], "fallback"))
+        self.assertEqual(text, "abc")
+        self.assertEqual([(e["content"], e["status"]) for e in events], [("a", "streaming"), ("b", "streaming"), ("c", "streaming"), ("abc", "done")])
+
+    def test_fallback_on_error(self) -> None:
+        events: list[dict[str, Any]] = []
+
+        async def emit(conversation_id: int, ev: dict[str, Any]) -> None:
+            events.append(ev)
+
+        async def broken(payload: dict[str, Any]):
+            raise RuntimeError("upstream 500")
+            yield ""
+
+        with mock.patch.object(trace_api, "_emit", emit), mock.patch.object(trace_api, "proxy_chat_completions_stream", broken):
+            text = asyncio.run(trace_api._stream_layer(1, {"trace_id": "t"}, [], "fallback"))
+        self.assertEqual(text, "fallback")
+        self.assertEqual(events[-1]["status"], "error")
+
+
+if __name__ == "__main__":
+    unittest.main()
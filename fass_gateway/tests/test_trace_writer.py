@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from app.db import open_db
+from app.services import trace_writer as tw
+from app.settings import settings
+
+
+def _ev(trace_id: str, content: str, status: str = tw.DELTA_STATUS) -> dict:
+    return {"trace_id": trace_id, "layer": "L1", "event_kind": "execution", "content": content, "ts_unix_ms": 1, "status": status}
+
+
+class TestTraceWriter(unittest.TestCase):
+    def test_coalesce_deltas(self) -> None:
+        batch = [
+            (1, _ev("a", "he")),
+            (1, _ev("b", "x")),
+            (1, _ev("a", "llo")),
+            (1, _ev("a", "hello", "done")),
+            (1, _ev("a", "!")),
+        ]
+        out = [(ev["trace_id"], ev["content"], ev["status"]) for _, ev in tw.coalesce_deltas(batch)]
+        self.assertEqual(
+            out,
+            [("a", "hello", tw.DELTA_STATUS), ("b", "x", tw.DELTA_STATUS), ("a", "hello", "done"), ("a", "!", tw.DELTA_STATUS)],
+        )
+
+    def test_background_batches(self) -> None:
+        with tempfile.TemporaryDirectory() as td:
+            path = os.path.join(td, "t.sqlite")
+            conn = open_db(path)
+            conn.execute("INSERT INTO conversations(id, created_at_unix_ms, updated_at_unix_ms) VALUES (1, 0, 0)")
+            conn.commit()
+            conn.close()
+            writer = tw.TraceWriter()
+
+            async def run() -> None:
+                writer.start()
+                for i in range(100):
+                    writer.enqueue(1, _ev("a", str(i % 10)))
+                writer.enqueue(1, _ev("a", "full", "done"))
+                await writer.flush()
+                await writer.stop()
+
+            with mock.patch.object(tw, "_db", lambda: open_db(path)):
+                asyncio.run(run())
+            conn = open_db(path)
+            rows = conn.execute("SELECT content, status FROM trace_events ORDER BY id").fetchall()
+            conn.close()
+            self.assertEqual(rows[-1]["status"], "done")
+            self.assertEqual("".join(r["content"] for r in rows[:-1]), "0123456789" * 10)
+            self.assertLess(len(rows), 10)
+            self.assertLessEqual(writer.batches, 3)
+
+    def test_failed_write_is_retried(self) -> None:
+        with tempfile.TemporaryDirectory() as td:
+            path = os.path.join(td, "t.sqlite")
+            conn = open_db(path)
+            conn.execute("INSERT INTO conversations(id, created_at_unix_ms, updated_at_unix_ms) VALUES (1, 0, 0)")
+            conn.commit()
+            conn.close()
+            writer = tw.TraceWriter()
+            opened: list[int] = []
+
+            class Flaky:
+                # 第一次打开的连接写入时报错，模拟磁盘/锁异常。
+                def __init__(self) -> None:
+                    self.conn = open_db(path)
+                    self.broken = not opened
+                    opened.append(1)
+
+                def executemany(self, sql: str, rows: list) -> None:
+                    if self.broken:
+                        raise OSError("disk I/O error")
+                    self.conn.executemany(sql, rows)
+
+                def execute(self, sql: str, row: tuple) -> None:
+                    self.conn.execute(sql, row)
+
+                def commit(self) -> None:
+                    self.conn.commit()
+
+                def close(self) -> None:
+                    self.conn.close()
+
+            async def run() -> None:
+                writer.start()
+                for i in range(5):
+                    writer.enqueue(1, _ev("a", str(i)))
+                # 外键不存在的会话：整批失败后逐条写入，只丢弃这一条。
+                writer.enqueue(99, _ev("b", "x", "done"))
+                await writer.flush()
+                await writer.stop()
+
+            old = (settings.trace_writer_retry_attempts, settings.trace_writer_retry_ms)
+            settings.trace_writer_retry_attempts, settings.trace_writer_retry_ms = 2, 1.0
+            try:
+                with mock.patch.object(tw, "_db", Flaky):
+                    asyncio.run(run())
+            finally:
+                settings.trace_writer_retry_attempts, settings.trace_writer_retry_ms = old
+            conn = open_db(path)
+            rows = conn.execute("SELECT content FROM trace_events ORDER BY id").fetchall()
+            conn.close()
+            self.assertEqual("".join(r["content"] for r in rows), "01234")
+            self.assertEqual((writer.retries, writer.dropped, writer.written), (1, 1, 1))
+            self.assertGreaterEqual(len(opened), 2)
+            self.assertIsNotNone(writer.last_error)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -7,9 +7,10 @@ use std::cell::RefCell;
 use std::collections::{HashMap, HashSet};
 use std::path::{Path, PathBuf};
 use tantivy::collector::TopDocs;
-use tantivy::query::QueryParser;
-use tantivy::schema::{Field, Schema, Value, STORED, TEXT};
-use tantivy::{doc, Index, IndexReader, IndexWriter, TantivyDocument};
+use tantivy::query::{BooleanQuery, Occur, Query, QueryParser, TermQuery};
+use tantivy::schema::{Field, IndexRecordOption, Schema, Value, INDEXED, STORED, STRING, TEXT};
+use tantivy::snippet::SnippetGenerator;
+use tantivy::{doc, Index, IndexReader, IndexWriter, TantivyDocument, Term};
 use usearch::Index as USearchIndex;
 
 #[derive(Debug, Clone, Deserialize)]
@@ -17,6 +18,7 @@ struct DocInput {
     path: String,
     content: String,
     embedding: Option<Vec<f32>>,
+    embedding_model: Option<String>,
     updated_at_unix_ms: Option<i64>,
 }
 
@@ -25,12 +27,14 @@ struct TextIndex {
     reader: IndexReader,
     writer: IndexWriter,
     fields: TextIndexFields,
+    needs_rebuild: bool,
 }
 
 #[derive(Clone)]
 struct TextIndexFields {
     id: Field,
     collection: Field,
+    collection_key: Field,
     path: Field,
     content: Field,
 }
@@ -40,19 +44,37 @@ impl TextIndex {
         std::fs::create_dir_all(dir).context("create tantivy dir")?;
 
         let mut schema_builder = Schema::builder();
-        schema_builder.add_u64_field("id", STORED);
+        schema_builder.add_u64_field("id", INDEXED | STORED);
         schema_builder.add_text_field("collection", TEXT | STORED);
+        schema_builder.add_text_field("collection_key", STRING);
         schema_builder.add_text_field("path", TEXT | STORED);
         schema_builder.add_text_field("content", TEXT);
         let schema = schema_builder.build();
 
-        let index = Index::open_in_dir(dir)
+        let mut needs_rebuild = false;
+        let mut index = Index::open_in_dir(dir)
             .or_else(|_| Index::create_in_dir(dir, schema.clone()))
             .context("open or create tantivy index")?;
+        let outdated = match index.schema().get_field("collection_key") {
+            Err(_) => true,
+            Ok(_) => {
+                let id = index.schema().get_field("id").context("id field")?;
+                !index.schema().get_field_entry(id).is_indexed()
+            }
+        };
+        if outdated {
+            // Older indexes lack the raw collection term used for pre-filtering; rebuild from SQLite.
+            drop(index);
+            std::fs::remove_dir_all(dir).context("remove outdated tantivy index")?;
+            std::fs::create_dir_all(dir).context("create tantivy dir")?;
+            index = Index::create_in_dir(dir, schema.clone()).context("create tantivy index")?;
+            needs_rebuild = true;
+        }
 
         let fields = TextIndexFields {
             id: index.schema().get_field("id").context("id field")?,
             collection: index.schema().get_field("collection").context("collection field")?,
+            collection_key: index.schema().get_field("collection_key").context("collection_key field")?,
             path: index.schema().get_field("path").context("path field")?,
             content: index.schema().get_field("content").context("content field")?,
         };
@@ -65,19 +87,122 @@ impl TextIndex {
             reader,
             writer,
             fields,
+            needs_rebuild,
         })
     }
 }
 
+#[derive(Default)]
+struct DocPartitions {
+    names: Vec<String>,
+    name_ids: HashMap<String, u32>,
+    docs: HashMap<u64, DocPartition>,
+    vector_counts: HashMap<u32, usize>,
+}
+
+#[derive(Clone, Copy)]
+struct DocPartition {
+    collection: u32,
+    model: Option<u32>,
+    has_vector: bool,
+}
+
+impl DocPartitions {
+    fn load(conn: &Connection, vectors: &VectorIndex) -> Result<Self> {
+        let mut parts = Self::default();
+        let mut stmt = conn.prepare("SELECT id, collection, embedding_model FROM documents")?;
+        let rows = stmt.query_map([], |r| {
+            Ok((r.get::<_, i64>(0)?, r.get::<_, String>(1)?, r.get::<_, Option<String>>(2)?))
+        })?;
+        for r in rows {
+            let (id, collection, model) = r?;
+            let id = id as u64;
+            parts.set(id, &collection, model.as_deref());
+            parts.set_has_vector(id, vectors.index.contains(id));
+        }
+        Ok(parts)
+    }
+
+    fn intern(&mut self, name: &str) -> u32 {
+        if let Some(k) = self.name_ids.get(name) {
+            return *k;
+        }
+        let k = self.names.len() as u32;
+        self.names.push(name.to_string());
+        self.name_ids.insert(name.to_string(), k);
+        k
+    }
+
+    fn lookup(&self, name: &str) -> Option<u32> {
+        self.name_ids.get(name).copied()
+    }
+
+    fn set(&mut self, id: u64, collection: &str, model: Option<&str>) {
+        let collection = self.intern(collection);
+        let model = model.map(|m| self.intern(m));
+        let has_vector = self.docs.get(&id).map(|p| p.has_vector).unwrap_or(false);
+        self.set_has_vector(id, false);
+        self.docs.insert(
+            id,
+            DocPartition {
+                collection,
+                model,
+                has_vector: false,
+            },
+        );
+        self.set_has_vector(id, has_vector);
+    }
+
+    fn set_has_vector(&mut self, id: u64, has_vector: bool) {
+        let Some(p) = self.docs.get_mut(&id) else {
+            return;
+        };
+        if p.has_vector == has_vector {
+            return;
+        }
+        p.has_vector = has_vector;
+        let n = self.vector_counts.entry(p.collection).or_insert(0);
+        if has_vector {
+            *n += 1;
+        } else {
+            *n = n.saturating_sub(1);
+        }
+    }
+
+    fn vector_count(&self, collection: Option<u32>) -> usize {
+        match collection {
+            Some(k) => self.vector_counts.get(&k).copied().unwrap_or(0),
+            None => self.vector_counts.values().sum(),
+        }
+    }
+
+    // Untagged (legacy) vectors match any model; a model that was never seen matches only those.
+    fn matches(&self, id: u64, collection: Option<u32>, model: Option<Option<u32>>) -> bool {
+        let Some(p) = self.docs.get(&id) else {
+            return false;
+        };
+        if let Some(c) = collection {
+            if p.collection != c {
+                return false;
+            }
+        }
+        match (model, p.model) {
+            (Some(want), Some(have)) => want == Some(have),
+            _ => true,
+        }
+    }
+}
+
 struct VectorIndex {
     index: USearchIndex,
     dim: usize,
     index_path: PathBuf,
+    needs_rebuild: bool,
 }
 
 impl VectorIndex {
-    fn open_or_create(index_path: PathBuf, dim: usize, capacity: usize) -> Result<Self> {
-        let index = USearchIndex::new(&usearch::IndexOptions {
+    fn new_index(dim: usize) -> Result<USearchIndex> {
+        USearchIndex::new(&usearch::IndexOptions {
             dimensions: dim,
             metric: usearch::MetricKind::L2sq,
             quantization: usearch::ScalarKind::F32,
@@ -86,12 +211,24 @@ impl VectorIndex {
             expansion_search: 64,
             multi: false,
         })
-        .map_err(|e| anyhow!("create usearch index: {:?}", e))?;
+        .map_err(|e| anyhow!("create usearch index: {:?}", e))
+    }
+
+    fn open_or_create(index_path: PathBuf, dim: usize, capacity: usize) -> Result<Self> {
+        let mut index = Self::new_index(dim)?;
+        let mut needs_rebuild = false;
 
         if index_path.exists() {
             index
                 .load(index_path.to_string_lossy().as_ref())
                 .map_err(|e| anyhow!("load usearch index: {:?}", e))?;
+            if index.dimensions() != dim {
+                index = Self::new_index(dim)?;
+                index
+                    .reserve(capacity)
+                    .map_err(|e| anyhow!("reserve usearch: {:?}", e))?;
+                needs_rebuild = true;
+            }
         } else {
             std::fs::create_dir_all(index_path.parent().unwrap_or(Path::new(".")))
                 .context("create usearch parent dir")?;
@@ -104,6 +241,7 @@ impl VectorIndex {
             index,
             dim,
             index_path,
+            needs_rebuild,
         })
     }
 
@@ -134,6 +272,10 @@ CREATE TABLE IF NOT EXISTS documents (
   updated_at_unix_ms INTEGER,
   indexed_at_unix_ms INTEGER,
   embedding_json TEXT,
+  embedding_blob BLOB,
+  embedding_dim INTEGER,
+  embedding_model TEXT,
+  embedding_dtype TEXT,
   UNIQUE(collection, path)
 );
 
@@ -146,6 +288,14 @@ CREATE TABLE IF NOT EXISTS index_tasks (
   last_error TEXT,
   updated_at_unix_ms INTEGER NOT NULL
 );
+
+CREATE TABLE IF NOT EXISTS embedding_staging (
+  doc_id INTEGER PRIMARY KEY,
+  embedding_model TEXT NOT NULL,
+  embedding_dim INTEGER NOT NULL,
+  embedding_dtype TEXT NOT NULL,
+  embedding_blob BLOB NOT NULL
+);
 "#,
     )?;
     let cols: HashSet<String> = {
@@ -164,15 +314,143 @@ CREATE TABLE IF NOT EXISTS index_tasks (
     if !cols.contains("embedding_json") {
         let _ = conn.execute("ALTER TABLE documents ADD COLUMN embedding_json TEXT", []);
     }
+    for (name, ty) in [
+        ("embedding_blob", "BLOB"),
+        ("embedding_dim", "INTEGER"),
+        ("embedding_model", "TEXT"),
+        ("embedding_dtype", "TEXT"),
+    ] {
+        if !cols.contains(name) {
+            let _ = conn.execute(&format!("ALTER TABLE documents ADD COLUMN {} {}", name, ty), []);
+        }
+    }
+    migrate_embedding_json(&conn)?;
     Ok(conn)
 }
 
+const EMBEDDING_DTYPE_F32: &str = "f32";
+
+const SEARCH_FIELDS: [&str; 7] = ["id", "collection", "path", "content", "snippet", "score", "source"];
+const DEFAULT_SEARCH_FIELDS: [&str; 6] = ["id", "collection", "path", "content", "score", "source"];
+
+const FUSION_STRATEGIES: [&str; 2] = ["weighted", "rrf"];
+
+#[derive(Default, Clone, Copy)]
+struct Signals {
+    text: f64,
+    vector: f64,
+    text_rank: Option<usize>,
+    vector_rank: Option<usize>,
+}
+
+impl Signals {
+    fn fuse(&self, strategy: &str, text_weight: f64, vector_weight: f64, rrf_k: f64) -> f64 {
+        if strategy == "rrf" {
+            let part = |rank: Option<usize>, w: f64| rank.map(|r| w / (rrf_k + r as f64 + 1.0)).unwrap_or(0.0);
+            part(self.text_rank, text_weight) + part(self.vector_rank, vector_weight)
+        } else {
+            self.text * text_weight + self.vector * vector_weight
+        }
+    }
+}
+
+fn html_escape(s: &str) -> String {
+    let mut out = String::with_capacity(s.len());
+    for c in s.chars() {
+        match c {
+            '&' => out.push_str("&amp;"),
+            '<' => out.push_str("&lt;"),
+            '>' => out.push_str("&gt;"),
+            '"' => out.push_str("&quot;"),
+            '\'' => out.push_str("&#x27;"),
+            _ => out.push(c),
+        }
+    }
+    out
+}
+
+fn encode_f32_le(v: &[f32]) -> Vec<u8> {
+    let mut out = Vec::with_capacity(v.len() * 4);
+    for x in v {
+        out.extend_from_slice(&x.to_le_bytes());
+    }
+    out
+}
+
+fn decode_embedding(blob: &[u8], dtype: Option<&str>) -> Result<Vec<f32>> {
+    match dtype.unwrap_or(EMBEDDING_DTYPE_F32) {
+        EMBEDDING_DTYPE_F32 => {
+            if blob.len() % 4 != 0 {
+                return Err(anyhow!("embedding_blob length {} is not a multiple of 4", blob.len()));
+            }
+            Ok(blob
+                .chunks_exact(4)
+                .map(|c| f32::from_le_bytes([c[0], c[1], c[2], c[3]]))
+                .collect())
+        }
+        other => Err(anyhow!("unsupported embedding_dtype: {}", other)),
+    }
+}
+
+fn requeue_index_tasks(conn: &Connection, where_sql: &str, args: &[&dyn rusqlite::ToSql]) -> Result<usize> {
+    let sql = format!(
+        r#"
+INSERT INTO index_tasks(doc_id, need_text, need_vector, status, retries, last_error, updated_at_unix_ms)
+SELECT id, 1, 1, 'pending', 0, NULL, {now} FROM documents WHERE {where_sql}
+ON CONFLICT(doc_id) DO UPDATE SET
+  need_text=1,
+  need_vector=1,
+  status='pending',
+  updated_at_unix_ms=excluded.updated_at_unix_ms
+"#,
+        now = chrono_unix_ms(),
+        where_sql = where_sql,
+    );
+    Ok(conn.execute(&sql, args)?)
+}
+
+fn migrate_embedding_json(conn: &Connection) -> Result<()> {
+    loop {
+        let rows: Vec<(i64, String)> = {
+            let mut stmt = conn.prepare(
+                "SELECT id, embedding_json FROM documents WHERE embedding_json IS NOT NULL AND embedding_blob IS NULL LIMIT 500",
+            )?;
+            let it = stmt.query_map([], |r| Ok((r.get::<_, i64>(0)?, r.get::<_, String>(1)?)))?;
+            let mut out = Vec::new();
+            for r in it {
+                out.push(r?);
+            }
+            out
+        };
+        if rows.is_empty() {
+            return Ok(());
+        }
+        let tx = conn.unchecked_transaction()?;
+        for (id, s) in rows {
+            match serde_json::from_str::<Vec<f32>>(&s) {
+                Ok(v) => {
+                    tx.execute(
+                        "UPDATE documents SET embedding_blob=?2, embedding_dim=?3, embedding_dtype=?4, embedding_json=NULL WHERE id=?1",
+                        params![id, encode_f32_le(&v), v.len() as i64, EMBEDDING_DTYPE_F32],
+                    )?;
+                }
+                Err(_) => {
+                    tx.execute("UPDATE documents SET embedding_json=NULL WHERE id=?1", params![id])?;
+                }
+            }
+        }
+        tx.commit()?;
+    }
+}
+
 #[pyclass(unsendable)]
 struct MemosCore {
     base_dir: PathBuf,
     db: RefCell<Connection>,
     text: RefCell<TextIndex>,
     vectors: RefCell<VectorIndex>,
+    partitions: RefCell<DocPartitions>,
+    staged: RefCell<u64>,
 }
 
 #[pymethods]
@@ -185,14 +463,27 @@ impl MemosCore {
         let usearch_path = base_dir.join("usearch_index.bin");
 
         let db = sqlite_open_or_create(&db_path).map_err(to_pyerr)?;
-        let text = TextIndex::open_or_create(&tantivy_dir).map_err(to_pyerr)?;
-        let vectors = VectorIndex::open_or_create(usearch_path, embedding_dim, capacity).map_err(to_pyerr)?;
+        // Staged rows were indexed but never committed before the last shutdown.
+        db.execute("UPDATE index_tasks SET status='pending' WHERE status='staged'", [])
+            .map_err(to_pyerr)?;
+        let mut text = TextIndex::open_or_create(&tantivy_dir).map_err(to_pyerr)?;
+        let mut vectors = VectorIndex::open_or_create(usearch_path, embedding_dim, capacity).map_err(to_pyerr)?;
+        if text.needs_rebuild {
+            requeue_index_tasks(&db, "1=1", &[]).map_err(to_pyerr)?;
+            text.needs_rebuild = false;
+        } else if vectors.needs_rebuild {
+            requeue_index_tasks(&db, "embedding_dim=?1", &[&(embedding_dim as i64)]).map_err(to_pyerr)?;
+        }
+        vectors.needs_rebuild = false;
+        let partitions = DocPartitions::load(&db, &vectors).map_err(to_pyerr)?;
 
         Ok(Self {
             base_dir,
             db: RefCell::new(db),
             text: RefCell::new(text),
             vectors: RefCell::new(vectors),
+            partitions: RefCell::new(partitions),
+            staged: RefCell::new(0),
         })
     }
 
@@ -210,8 +501,12 @@ impl MemosCore {
                 .ok_or_else(|| pyo3::exceptions::PyValueError::new_err("missing content"))?
                 .extract()?;
             let embedding: Option<Vec<f32>> = match dict.get_item("embedding")? {
-                Some(v) => Some(v.extract()?),
-                None => None,
+                Some(v) if !v.is_none() => Some(v.extract()?),
+                _ => None,
+            };
+            let embedding_model: Option<String> = match dict.get_item("embedding_model")? {
+                Some(v) if !v.is_none() => Some(v.extract()?),
+                _ => None,
             };
             let updated_at_unix_ms: Option<i64> = match dict.get_item("updated_at_unix_ms")? {
                 Some(v) => Some(v.extract()?),
@@ -221,33 +516,55 @@ impl MemosCore {
                 path,
                 content,
                 embedding,
+                embedding_model,
                 updated_at_unix_ms,
             });
         }
 
         let db = self.db.borrow_mut();
+        let vectors = self.vectors.borrow_mut();
+        let mut partitions = self.partitions.borrow_mut();
         let mut changed = 0u64;
 
         for d in parsed {
             let updated_at = d
                 .updated_at_unix_ms
                 .unwrap_or_else(|| chrono_unix_ms());
-            let embedding_json: Option<String> = match d.embedding.as_ref() {
-                Some(v) => Some(serde_json::to_string(v).map_err(|e| to_pyerr(anyhow!("serialize embedding_json: {:?}", e)))?),
+            let embedding_blob: Option<Vec<u8>> = d.embedding.as_ref().map(|v| encode_f32_le(v));
+            let embedding_dim: Option<i64> = d.embedding.as_ref().map(|v| v.len() as i64);
+            let embedding_dtype: Option<&str> = d.embedding.as_ref().map(|_| EMBEDDING_DTYPE_F32);
+            let embedding_model: Option<&str> = match d.embedding {
+                Some(_) => d.embedding_model.as_deref(),
                 None => None,
             };
 
             db.execute(
                 r#"
-INSERT INTO documents(collection, path, content, updated_at_unix_ms, indexed_at_unix_ms, embedding_json)
-VALUES (?1, ?2, ?3, ?4, NULL, ?5)
+INSERT INTO documents(
+  collection, path, content, updated_at_unix_ms, indexed_at_unix_ms,
+  embedding_json, embedding_blob, embedding_dim, embedding_model, embedding_dtype
+)
+VALUES (?1, ?2, ?3, ?4, NULL, NULL, ?5, ?6, ?7, ?8)
 ON CONFLICT(collection, path) DO UPDATE SET
   content=excluded.content,
   updated_at_unix_ms=excluded.updated_at_unix_ms,
   indexed_at_unix_ms=NULL,
-  embedding_json=excluded.embedding_json
+  embedding_json=NULL,
+  embedding_blob=excluded.embedding_blob,
+  embedding_dim=excluded.embedding_dim,
+  embedding_model=excluded.embedding_model,
+  embedding_dtype=excluded.embedding_dtype
 "#,
-                params![collection, d.path, d.content, updated_at, embedding_json],
+                params![
+                    collection,
+                    d.path,
+                    d.content,
+                    updated_at,
+                    embedding_blob,
+                    embedding_dim,
+                    embedding_model,
+                    embedding_dtype
+                ],
             )
             .map_err(to_pyerr)?;
 
@@ -259,6 +576,13 @@ ON CONFLICT(collection, path) DO UPDATE SET
                 )
                 .map_err(to_pyerr)?;
 
+            db.execute("DELETE FROM embedding_staging WHERE doc_id=?1", params![id])
+                .map_err(to_pyerr)?;
+            partitions.set(id as u64, &collection, embedding_model);
+            // The old vector may belong to another model; keep it out of ANN results until re-indexed.
+            let _ = vectors.index.remove(id as u64);
+            partitions.set_has_vector(id as u64, false);
+
             db.execute(
                 r#"
 INSERT INTO index_tasks(doc_id, need_text, need_vector, status, retries, last_error, updated_at_unix_ms)
@@ -279,15 +603,16 @@ ON CONFLICT(doc_id) DO UPDATE SET
         Ok(changed)
     }
 
-    #[pyo3(signature=(limit=200))]
-    fn sync_index_tasks(&self, limit: usize) -> PyResult<u64> {
+    #[pyo3(signature=(limit=200, commit=true))]
+    fn sync_index_tasks(&self, limit: usize, commit: bool) -> PyResult<u64> {
         let db = self.db.borrow_mut();
         let mut text = self.text.borrow_mut();
         let vectors = self.vectors.borrow_mut();
+        let mut partitions = self.partitions.borrow_mut();
 
         let ids: Vec<i64> = {
             let mut stmt = db
-                .prepare("SELECT doc_id FROM index_tasks WHERE status!='done' ORDER BY updated_at_unix_ms ASC LIMIT ?1")
+                .prepare("SELECT doc_id FROM index_tasks WHERE status NOT IN ('done', 'staged') ORDER BY updated_at_unix_ms ASC LIMIT ?1")
                 .map_err(to_pyerr)?;
             let ids_iter = stmt
                 .query_map(params![limit as i64], |row| row.get::<_, i64>(0))
@@ -304,24 +629,27 @@ ON CONFLICT(doc_id) DO UPDATE SET
 
         let mut changed = 0u64;
         let now = chrono_unix_ms();
+        // Rows stay 'staged' until the Tantivy/USearch commit lands, so a crash in between re-indexes them.
+        let tx = db.unchecked_transaction().map_err(to_pyerr)?;
 
         for id in ids {
             let row = db
                 .query_row(
-                    "SELECT collection, path, content, embedding_json FROM documents WHERE id=?1",
+                    "SELECT collection, path, content, embedding_blob, embedding_dtype FROM documents WHERE id=?1",
                     params![id],
                     |r| {
                         let collection: String = r.get(0)?;
                         let path: String = r.get(1)?;
                         let content: String = r.get(2)?;
-                        let embedding_json: Option<String> = r.get(3)?;
-                        Ok((collection, path, content, embedding_json))
+                        let embedding_blob: Option<Vec<u8>> = r.get(3)?;
+                        let embedding_dtype: Option<String> = r.get(4)?;
+                        Ok((collection, path, content, embedding_blob, embedding_dtype))
                     },
                 )
                 .optional()
                 .map_err(to_pyerr)?;
 
-            let Some((collection, path, content, embedding_json)) = row else {
+            let Some((collection, path, content, embedding_blob, embedding_dtype)) = row else {
                 let _ = db.execute("UPDATE index_tasks SET status='done' WHERE doc_id=?1", params![id]);
                 continue;
             };
@@ -333,6 +661,7 @@ ON CONFLICT(doc_id) DO UPDATE SET
             if let Err(e) = text.writer.add_document(doc!(
                 text.fields.id => id as u64,
                 text.fields.collection => collection.as_str(),
+                text.fields.collection_key => collection.as_str(),
                 text.fields.path => path.as_str(),
                 text.fields.content => content.as_str(),
             )) {
@@ -340,18 +669,21 @@ ON CONFLICT(doc_id) DO UPDATE SET
             }
 
             let _ = vectors.index.remove(id as u64);
+            partitions.set_has_vector(id as u64, false);
             if err.is_none() {
-                if let Some(s) = embedding_json.as_ref() {
-                    match serde_json::from_str::<Vec<f32>>(s) {
+                if let Some(blob) = embedding_blob.as_ref() {
+                    match decode_embedding(blob, embedding_dtype.as_deref()) {
                         Ok(embedding) => {
-                            if embedding.len() != vectors.dim {
-                                err = Some(format!("embedding dim mismatch: expected {}, got {}", vectors.dim, embedding.len()));
-                            } else if let Err(e) = vectors.index.add(id as u64, &embedding) {
-                                err = Some(format!("usearch add failed: {:?}", e));
+                            // Vectors from a model with another dimension stay text-only until re-embedded.
+                            if embedding.len() == vectors.dim {
+                                match vectors.index.add(id as u64, &embedding) {
+                                    Ok(_) => partitions.set_has_vector(id as u64, true),
+                                    Err(e) => err = Some(format!("usearch add failed: {:?}", e)),
+                                }
                             }
                         }
                         Err(e) => {
-                            err = Some(format!("embedding_json parse: {:?}", e));
+                            err = Some(format!("embedding_blob decode: {}", e));
                         }
                     }
                 }
@@ -366,7 +698,7 @@ ON CONFLICT(doc_id) DO UPDATE SET
             }
 
             let _ = db.execute(
-                "UPDATE index_tasks SET status='done', last_error=NULL WHERE doc_id=?1",
+                "UPDATE index_tasks SET status='staged', last_error=NULL WHERE doc_id=?1",
                 params![id],
             );
             let _ = db.execute(
@@ -376,36 +708,261 @@ ON CONFLICT(doc_id) DO UPDATE SET
             changed += 1;
         }
 
-        if changed > 0 {
-            text.writer.commit().map_err(to_pyerr)?;
-            let _ = text.reader.reload();
-            vectors.save().map_err(to_pyerr)?;
+        tx.commit().map_err(to_pyerr)?;
+        *self.staged.borrow_mut() += changed;
+        drop(partitions);
+        drop(vectors);
+        drop(text);
+        drop(db);
+        if commit {
+            self.commit_indexes()?;
         }
 
         Ok(changed)
     }
 
-    #[pyo3(signature=(collection=None, query_text=None, query_vec=None, top_k=8))]
+    fn commit_indexes(&self) -> PyResult<u64> {
+        let staged = *self.staged.borrow();
+        if staged == 0 {
+            return Ok(0);
+        }
+        let db = self.db.borrow();
+        let mut text = self.text.borrow_mut();
+        let vectors = self.vectors.borrow();
+        text.writer.commit().map_err(to_pyerr)?;
+        let _ = text.reader.reload();
+        vectors.save().map_err(to_pyerr)?;
+        db.execute("UPDATE index_tasks SET status='done' WHERE status='staged'", [])
+            .map_err(to_pyerr)?;
+        *self.staged.borrow_mut() = 0;
+        Ok(staged)
+    }
+
+    fn index_backlog(&self, py: Python<'_>) -> PyResult<PyObject> {
+        let db = self.db.borrow();
+        let (pending, failed, oldest): (i64, i64, Option<i64>) = db
+            .query_row(
+                "SELECT \
+                   COALESCE(SUM(CASE WHEN status='pending' THEN 1 ELSE 0 END), 0), \
+                   COALESCE(SUM(CASE WHEN status='failed' THEN 1 ELSE 0 END), 0), \
+                   MIN(CASE WHEN status NOT IN ('done', 'staged') THEN updated_at_unix_ms END) \
+                 FROM index_tasks",
+                [],
+                |r| Ok((r.get(0)?, r.get(1)?, r.get(2)?)),
+            )
+            .map_err(to_pyerr)?;
+        let d = PyDict::new(py);
+        d.set_item("pending", pending)?;
+        d.set_item("failed", failed)?;
+        d.set_item("staged", *self.staged.borrow())?;
+        d.set_item("oldest_pending_unix_ms", oldest)?;
+        Ok(d.into_py(py))
+    }
+
+    #[pyo3(signature=(collection, embedding_model, limit=64))]
+    fn list_reembed_candidates(
+        &self,
+        py: Python<'_>,
+        collection: String,
+        embedding_model: String,
+        limit: usize,
+    ) -> PyResult<Vec<PyObject>> {
+        let db = self.db.borrow();
+        let mut stmt = db
+            .prepare(
+                r#"
+SELECT d.id, d.path, d.content, d.updated_at_unix_ms FROM documents d
+LEFT JOIN embedding_staging s ON s.doc_id=d.id AND s.embedding_model=?2
+WHERE d.collection=?1 AND (d.embedding_model IS NULL OR d.embedding_model!=?2) AND s.doc_id IS NULL
+ORDER BY d.id ASC LIMIT ?3
+"#,
+            )
+            .map_err(to_pyerr)?;
+        let rows = stmt
+            .query_map(params![collection, embedding_model, limit as i64], |r| {
+                Ok((
+                    r.get::<_, i64>(0)?,
+                    r.get::<_, String>(1)?,
+                    r.get::<_, String>(2)?,
+                    r.get::<_, Option<i64>>(3)?,
+                ))
+            })
+            .map_err(to_pyerr)?;
+        let mut out: Vec<PyObject> = Vec::new();
+        for r in rows {
+            let (id, path, content, updated_at) = r.map_err(to_pyerr)?;
+            let d = PyDict::new(py);
+            d.set_item("id", id)?;
+            d.set_item("path", path)?;
+            d.set_item("content", content)?;
+            d.set_item("updated_at_unix_ms", updated_at)?;
+            out.push(d.into_py(py));
+        }
+        Ok(out)
+    }
+
+    fn stage_embeddings(&self, py: Python<'_>, embedding_model: String, items: Vec<Py<PyAny>>) -> PyResult<u64> {
+        let db = self.db.borrow_mut();
+        let tx = db.unchecked_transaction().map_err(to_pyerr)?;
+        let mut staged = 0u64;
+        for it in items {
+            let any = it.bind(py);
+            let dict: &Bound<'_, PyDict> = any.downcast()?;
+            let id: i64 = dict
+                .get_item("id")?
+                .ok_or_else(|| pyo3::exceptions::PyValueError::new_err("missing id"))?
+                .extract()?;
+            let embedding: Vec<f32> = dict
+                .get_item("embedding")?
+                .ok_or_else(|| pyo3::exceptions::PyValueError::new_err("missing embedding"))?
+                .extract()?;
+            let updated_at: Option<i64> = match dict.get_item("updated_at_unix_ms")? {
+                Some(v) if !v.is_none() => Some(v.extract()?),
+                _ => None,
+            };
+            let n = tx
+                .execute(
+                    r#"
+INSERT OR REPLACE INTO embedding_staging(doc_id, embedding_model, embedding_dim, embedding_dtype, embedding_blob)
+SELECT id, ?2, ?3, ?4, ?5 FROM documents WHERE id=?1 AND updated_at_unix_ms IS ?6
+"#,
+                    params![
+                        id,
+                        embedding_model,
+                        embedding.len() as i64,
+                        EMBEDDING_DTYPE_F32,
+                        encode_f32_le(&embedding),
+                        updated_at
+                    ],
+                )
+                .map_err(to_pyerr)?;
+            staged += n as u64;
+        }
+        tx.commit().map_err(to_pyerr)?;
+        Ok(staged)
+    }
+
+    fn promote_embeddings(&self, collection: String, embedding_model: String) -> PyResult<u64> {
+        let db = self.db.borrow_mut();
+        let tx = db.unchecked_transaction().map_err(to_pyerr)?;
+        let promoted = tx
+            .execute(
+                r#"
+UPDATE documents SET
+  embedding_blob=(SELECT s.embedding_blob FROM embedding_staging s WHERE s.doc_id=documents.id),
+  embedding_dim=(SELECT s.embedding_dim FROM embedding_staging s WHERE s.doc_id=documents.id),
+  embedding_dtype=(SELECT s.embedding_dtype FROM embedding_staging s WHERE s.doc_id=documents.id),
+  embedding_model=?2
+WHERE collection=?1 AND id IN (SELECT doc_id FROM embedding_staging WHERE embedding_model=?2)
+"#,
+                params![collection, embedding_model],
+            )
+            .map_err(to_pyerr)?;
+        let ids: Vec<i64> = {
+            let mut stmt = tx
+                .prepare("SELECT doc_id FROM embedding_staging WHERE embedding_model=?2 AND doc_id IN (SELECT id FROM documents WHERE collection=?1)")
+                .map_err(to_pyerr)?;
+            let rows = stmt
+                .query_map(params![collection, embedding_model], |r| r.get::<_, i64>(0))
+                .map_err(to_pyerr)?;
+            let mut out: Vec<i64> = Vec::new();
+            for r in rows {
+                out.push(r.map_err(to_pyerr)?);
+            }
+            out
+        };
+        requeue_index_tasks(
+            &tx,
+            "collection=?1 AND id IN (SELECT doc_id FROM embedding_staging WHERE embedding_model=?2)",
+            &[&collection, &embedding_model],
+        )
+        .map_err(to_pyerr)?;
+        tx.execute(
+            "DELETE FROM embedding_staging WHERE embedding_model=?2 AND doc_id IN (SELECT id FROM documents WHERE collection=?1)",
+            params![collection, embedding_model],
+        )
+        .map_err(to_pyerr)?;
+        tx.commit().map_err(to_pyerr)?;
+        // Retagged documents still have the previous model's vector in USearch; drop it in the same step
+        // so they are not returned under the new model until sync_index_tasks re-adds them.
+        let vectors = self.vectors.borrow_mut();
+        for id in &ids {
+            let _ = vectors.index.remove(*id as u64);
+        }
+        *self.partitions.borrow_mut() = DocPartitions::load(&db, &vectors).map_err(to_pyerr)?;
+        Ok(promoted as u64)
+    }
+
+    #[pyo3(signature=(collection=None, query_text=None, query_vec=None, top_k=8, embedding_model=None, fields=None, snippet_chars=240, fusion=None, text_weight=0.55, vector_weight=0.45, rrf_k=60.0))]
     fn search(
         &self,
+        py: Python<'_>,
         collection: Option<String>,
         query_text: Option<String>,
         query_vec: Option<Vec<f32>>,
         top_k: usize,
+        embedding_model: Option<String>,
+        fields: Option<Vec<String>>,
+        snippet_chars: usize,
+        fusion: Option<String>,
+        text_weight: f64,
+        vector_weight: f64,
+        rrf_k: f64,
     ) -> PyResult<Vec<PyObject>> {
+        let fusion = fusion.unwrap_or_else(|| "weighted".to_string());
+        if !FUSION_STRATEGIES.contains(&fusion.as_str()) {
+            return Err(pyo3::exceptions::PyValueError::new_err(format!("unknown fusion strategy: {}", fusion)));
+        }
+        if text_weight < 0.0 || vector_weight < 0.0 || rrf_k < 0.0 {
+            return Err(pyo3::exceptions::PyValueError::new_err("fusion weights and rrf_k must be non-negative"));
+        }
+        let fields: Vec<String> = fields.unwrap_or_else(|| DEFAULT_SEARCH_FIELDS.iter().map(|f| f.to_string()).collect());
+        for f in &fields {
+            if !SEARCH_FIELDS.contains(&f.as_str()) {
+                return Err(pyo3::exceptions::PyValueError::new_err(format!("unknown search field: {}", f)));
+            }
+        }
+        let want = |name: &str| fields.iter().any(|f| f == name);
         let db = self.db.borrow();
         let text = self.text.borrow();
         let vectors = self.vectors.borrow();
+        let partitions = self.partitions.borrow();
+
+        let collection_key = match collection.as_ref() {
+            Some(c) => match partitions.lookup(c) {
+                Some(k) => Some(k),
+                None => return Ok(Vec::new()),
+            },
+            None => None,
+        };
+        let model_key: Option<Option<u32>> = embedding_model.as_ref().map(|m| partitions.lookup(m));
+        let fetch = top_k.saturating_mul(4).max(top_k);
 
-        let mut score_map: HashMap<u64, (f64, f64)> = HashMap::new();
+        let mut score_map: HashMap<u64, Signals> = HashMap::new();
+        let searcher = text.reader.searcher();
+        let mut snippets: Option<SnippetGenerator> = None;
 
         if let Some(q) = query_text.as_ref() {
-            let searcher = text.reader.searcher();
             let parser = QueryParser::for_index(&text.index, vec![text.fields.content, text.fields.path]);
-            let query = parser.parse_query(q).map_err(to_pyerr)?;
+            let parsed = parser.parse_query(q).map_err(to_pyerr)?;
+            if want("snippet") {
+                let mut g = SnippetGenerator::create(&searcher, parsed.as_ref(), text.fields.content).map_err(to_pyerr)?;
+                g.set_max_num_chars(snippet_chars);
+                snippets = Some(g);
+            }
+            let query: Box<dyn Query> = match collection.as_ref() {
+                Some(c) => {
+                    let term = Term::from_field_text(text.fields.collection_key, c);
+                    Box::new(BooleanQuery::new(vec![
+                        (Occur::Must, parsed),
+                        (Occur::Must, Box::new(TermQuery::new(term, IndexRecordOption::Basic)) as Box<dyn Query>),
+                    ]))
+                }
+                None => parsed,
+            };
 
             let top_docs = searcher
-                .search(&query, &TopDocs::with_limit(top_k.saturating_mul(4).max(top_k)))
+                .search(query.as_ref(), &TopDocs::with_limit(fetch))
                 .map_err(to_pyerr)?;
 
             let mut max_score = 0.0;
@@ -415,30 +972,44 @@ ON CONFLICT(doc_id) DO UPDATE SET
                 }
             }
             let denom = if max_score <= 0.0 { 1.0 } else { max_score };
-            for (score, addr) in top_docs {
+            for (rank, (score, addr)) in top_docs.into_iter().enumerate() {
                 let doc: TantivyDocument = searcher.doc(addr).map_err(to_pyerr)?;
                 let id = doc
                     .get_first(text.fields.id)
                     .and_then(|v| v.as_u64())
                     .ok_or_else(|| pyo3::exceptions::PyRuntimeError::new_err("tantivy doc missing id"))?;
-                let norm = (score as f64) / denom;
-                let e = score_map.entry(id).or_insert((0.0, 0.0));
-                e.0 = norm;
+                let e = score_map.entry(id).or_default();
+                e.text = (score as f64) / denom;
+                e.text_rank = Some(rank);
             }
         }
 
-        if let Some(vec) = query_vec.as_ref() {
-            if vec.len() != vectors.dim {
-                return Err(pyo3::exceptions::PyValueError::new_err(format!(
-                    "query_vec dim mismatch: expected {}, got {}",
-                    vectors.dim,
-                    vec.len()
-                )));
-            }
-            let matches = vectors
-                .index
-                .search(vec, top_k.saturating_mul(4).max(top_k))
-                .map_err(|e| pyo3::exceptions::PyRuntimeError::new_err(format!("usearch search failed: {:?}", e)))?;
+        // A query embedded by a model with another dimension (e.g. mid-migration) cannot be compared
+        // against this index; serve it text-only instead of failing the whole search.
+        if let Some(vec) = query_vec.as_ref().filter(|v| v.len() == vectors.dim) {
+            let matches = if collection_key.is_none() && model_key.is_none() {
+                vectors
+                    .index
+                    .search(vec, fetch)
+                    .map_err(|e| pyo3::exceptions::PyRuntimeError::new_err(format!("usearch search failed: {:?}", e)))?
+            } else {
+                // Filtered HNSW walks can stop early on small partitions; widen the beam until the
+                // partition is covered or a few rounds have passed.
+                let expected = fetch.min(partitions.vector_count(collection_key));
+                let mut count = fetch;
+                let mut rounds = 0;
+                loop {
+                    let m = vectors
+                        .index
+                        .filtered_search(vec, count, |key: u64| partitions.matches(key, collection_key, model_key))
+                        .map_err(|e| pyo3::exceptions::PyRuntimeError::new_err(format!("usearch search failed: {:?}", e)))?;
+                    rounds += 1;
+                    if m.keys.len() >= expected || rounds >= 4 || count >= vectors.index.size() {
+                        break m;
+                    }
+                    count = count.saturating_mul(4);
+                }
+            };
 
             let mut best = 0.0;
             let mut scored: Vec<(u64, f64)> = Vec::with_capacity(matches.keys.len());
@@ -450,20 +1021,20 @@ ON CONFLICT(doc_id) DO UPDATE SET
                 scored.push((*id, sim));
             }
             let denom = if best <= 0.0 { 1.0 } else { best };
-            for (id, sim) in scored {
-                let norm = sim / denom;
-                let e = score_map.entry(id).or_insert((0.0, 0.0));
-                e.1 = norm;
+            for (rank, (id, sim)) in scored.into_iter().enumerate() {
+                let e = score_map.entry(id).or_default();
+                e.vector = sim / denom;
+                e.vector_rank = Some(rank);
             }
         }
 
         let mut merged: Vec<(u64, f64, String)> = score_map
             .into_iter()
-            .map(|(id, (t, v))| {
-                let score = t * 0.55 + v * 0.45;
-                let source = if t > 0.0 && v > 0.0 {
+            .map(|(id, sig)| {
+                let score = sig.fuse(&fusion, text_weight, vector_weight, rrf_k);
+                let source = if sig.text_rank.is_some() && sig.vector_rank.is_some() {
                     "hybrid"
-                } else if t > 0.0 {
+                } else if sig.text_rank.is_some() {
                     "bm25"
                 } else {
                     "ann"
@@ -475,38 +1046,120 @@ ON CONFLICT(doc_id) DO UPDATE SET
         merged.sort_by(|a, b| b.1.partial_cmp(&a.1).unwrap_or(std::cmp::Ordering::Equal));
         merged.truncate(top_k);
 
-        let mut out: Vec<PyObject> = Vec::with_capacity(merged.len());
-        for (id, score, source) in merged {
-            let (col, path, content): (String, String, String) = db
-                .query_row(
-                    "SELECT collection, path, content FROM documents WHERE id=?1",
-                    params![id as i64],
-                    |row| Ok((row.get(0)?, row.get(1)?, row.get(2)?)),
-                )
+        let need_content = want("content") || want("snippet");
+        let mut rows: HashMap<u64, (String, String, Option<String>)> = HashMap::with_capacity(merged.len());
+        if !merged.is_empty() {
+            let placeholders = vec!["?"; merged.len()].join(",");
+            let sql = format!(
+                "SELECT id, collection, path, {} FROM documents WHERE id IN ({})",
+                if need_content { "content" } else { "NULL" },
+                placeholders
+            );
+            let mut stmt = db.prepare(&sql).map_err(to_pyerr)?;
+            let it = stmt
+                .query_map(rusqlite::params_from_iter(merged.iter().map(|m| m.0 as i64)), |r| {
+                    Ok((
+                        r.get::<_, i64>(0)? as u64,
+                        r.get::<_, String>(1)?,
+                        r.get::<_, String>(2)?,
+                        r.get::<_, Option<String>>(3)?,
+                    ))
+                })
                 .map_err(to_pyerr)?;
-
-            if let Some(filter_col) = collection.as_ref() {
-                if &col != filter_col {
-                    continue;
-                }
+            for r in it {
+                let (id, col, path, content) = r.map_err(to_pyerr)?;
+                rows.insert(id, (col, path, content));
             }
+        }
 
-            Python::with_gil(|py| {
-                let d = PyDict::new(py);
-                d.set_item("id", id).map_err(to_pyerr)?;
-                d.set_item("collection", col).map_err(to_pyerr)?;
-                d.set_item("path", path).map_err(to_pyerr)?;
-                d.set_item("content", content).map_err(to_pyerr)?;
-                d.set_item("score", score).map_err(to_pyerr)?;
-                d.set_item("source", source).map_err(to_pyerr)?;
-                out.push(d.into_py(py));
-                Ok::<(), PyErr>(())
-            })?;
+        let mut out: Vec<PyObject> = Vec::with_capacity(merged.len());
+        for (id, score, source) in merged {
+            let Some((col, path, content)) = rows.remove(&id) else {
+                continue;
+            };
+            let d = PyDict::new(py);
+            if want("id") {
+                d.set_item("id", id)?;
+            }
+            if want("collection") {
+                d.set_item("collection", col)?;
+            }
+            if want("path") {
+                d.set_item("path", path)?;
+            }
+            if want("snippet") {
+                let body = content.as_deref().unwrap_or("");
+                let snippet = match snippets.as_ref() {
+                    Some(g) => g.snippet(body).to_html(),
+                    None => String::new(),
+                };
+                let snippet = if snippet.is_empty() {
+                    html_escape(&body.chars().take(snippet_chars).collect::<String>())
+                } else {
+                    snippet
+                };
+                d.set_item("snippet", snippet)?;
+            }
+            if want("content") {
+                d.set_item("content", content)?;
+            }
+            if want("score") {
+                d.set_item("score", score)?;
+            }
+            if want("source") {
+                d.set_item("source", source)?;
+            }
+            out.push(d.into_py(py));
         }
 
         Ok(out)
     }
 
+    #[pyo3(signature=(collection=None, queries=Vec::new(), query_vecs=None, top_k=8, embedding_model=None, fields=None, snippet_chars=240, fusion=None, text_weight=0.55, vector_weight=0.45, rrf_k=60.0))]
+    fn search_batch(
+        &self,
+        py: Python<'_>,
+        collection: Option<String>,
+        queries: Vec<String>,
+        query_vecs: Option<Vec<Option<Vec<f32>>>>,
+        top_k: usize,
+        embedding_model: Option<String>,
+        fields: Option<Vec<String>>,
+        snippet_chars: usize,
+        fusion: Option<String>,
+        text_weight: f64,
+        vector_weight: f64,
+        rrf_k: f64,
+    ) -> PyResult<Vec<Vec<PyObject>>> {
+        let mut vecs = query_vecs.unwrap_or_default();
+        if vecs.is_empty() {
+            vecs.resize(queries.len(), None);
+        }
+        if vecs.len() != queries.len() {
+            return Err(pyo3::exceptions::PyValueError::new_err("query_vecs must match queries"));
+        }
+        // All queries run under one GIL hold against the already-open readers; this saves the
+        // per-call Python round trip but still walks the indexes once per query.
+        let mut out = Vec::with_capacity(queries.len());
+        for (q, v) in queries.into_iter().zip(vecs.into_iter()) {
+            out.push(self.search(
+                py,
+                collection.clone(),
+                Some(q),
+                v,
+                top_k,
+                embedding_model.clone(),
+                fields.clone(),
+                snippet_chars,
+                fusion.clone(),
+                text_weight,
+                vector_weight,
+                rrf_k,
+            )?);
+        }
+        Ok(out)
+    }
+
     fn base_dir(&self) -> PyResult<String> {
         Ok(self.base_dir.to_string_lossy().to_string())
     }